@@ -1,33 +1,146 @@
-from fastapi import APIRouter
-from nltk.data import retrieve
+import json
+from typing import List
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from pathlib import Path
 
 PROJECT_ROOT=Path(__file__).resolve().parents[3]
 INDEX_PATH=PROJECT_ROOT / "data" / "faiss" / "index.faiss"
-METADATA_PATH=PROJECT_ROOT / "data" / "embeddings" / "metadata.jsonl"
+STORE_PATH=PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
 CHUNKS_PATH=PROJECT_ROOT / "data" / "processed" / "chunks.jsonl"
+SHARD_DIR=PROJECT_ROOT / "data" / "shards"
 PROMPT_PATH=PROJECT_ROOT / "backend" / "app" / "prompts" / "rag_prompt.txt"
 
 from backend.app.services.retrieval import Retrievar
+from backend.app.services.sharding import ShardedRetrievar
 from backend.app.services.rag import RAGService
+from backend.app.services.batching import QueryBatcher
+from backend.app.services.concurrency import AdmissionController, BoundedExecutor, Overloaded
+from backend.app.services.answer_cache import SemanticAnswerCache
+from backend.app.config import settings
 
 router=APIRouter()
-retriever=Retrievar(
-    INDEX_PATH,
-    METADATA_PATH,
-    CHUNKS_PATH
+if settings.RETRIEVAL_SHARDS > 0:
+    retriever=ShardedRetrievar(
+        INDEX_PATH,
+        STORE_PATH,
+        CHUNKS_PATH,
+        shard_dir=SHARD_DIR,
+        n_shards=settings.RETRIEVAL_SHARDS,
+        threads_per_shard=settings.SHARD_THREADS,
+        max_segments=settings.INDEX_MAX_SEGMENTS,
+        hybrid=settings.HYBRID_SEARCH,
+        rrf_k=settings.RRF_K,
+        ce_cache_size=settings.CE_CACHE_SIZE,
+        ce_skip_margin=settings.CE_SKIP_MARGIN,
+        ce_batch_size=settings.CE_BATCH_SIZE or None,
+        rescore_factor=settings.RESCORE_FACTOR
+    )
+else:
+    retriever=Retrievar(
+        INDEX_PATH,
+        STORE_PATH,
+        CHUNKS_PATH,
+        hybrid=settings.HYBRID_SEARCH,
+        rrf_k=settings.RRF_K,
+        ce_cache_size=settings.CE_CACHE_SIZE,
+        ce_skip_margin=settings.CE_SKIP_MARGIN,
+        ce_batch_size=settings.CE_BATCH_SIZE or None,
+        rescore_factor=settings.RESCORE_FACTOR
+    )
+batcher=QueryBatcher(
+    retriever,
+    max_batch_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+    max_pending=settings.RETRIEVAL_QUEUE_SIZE
+)
+retrieval_executor=BoundedExecutor(
+    settings.RETRIEVAL_WORKERS,
+    settings.RETRIEVAL_QUEUE_SIZE,
+    name="retrieval"
+)
+answer_cache=SemanticAnswerCache(
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_s=settings.ANSWER_CACHE_TTL_S
+) if settings.ANSWER_CACHE_ENABLED else None
+rag=RAGService(
+    retriever,
+    PROMPT_PATH,
+    batcher=batcher,
+    executor=retrieval_executor,
+    llm_base_url=settings.GEMINI_BASE_URL,
+    llm_timeout_s=settings.LLM_TIMEOUT_S,
+    llm_stream_idle_s=settings.LLM_STREAM_IDLE_S,
+    llm_max_retries=settings.LLM_MAX_RETRIES,
+    llm_backoff_s=settings.LLM_BACKOFF_S,
+    cache=answer_cache,
+    context_max_tokens=settings.CONTEXT_MAX_TOKENS,
+    context_merge=settings.CONTEXT_MERGE_ADJACENT
 )
-rag=RAGService(retriever,PROMPT_PATH)
+admission=AdmissionController(settings.MAX_INFLIGHT_ASKS)
 
 class AskRequest(BaseModel):
     question: str
     top_k: int=5
 
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+    top_k: int=5
+
 @router.post("/ask")
-def ask(request: AskRequest):
-    ans=rag.answer(request.question,top_k=request.top_k)
+async def ask(request: AskRequest):
+    try:
+        with admission:
+            ans=await rag.answer_async(request.question,top_k=request.top_k)
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code,detail=str(e))
     return {
         "question": request.question,
         "answer": ans
-    }
\ No newline at end of file
+    }
+
+@router.post("/ask/stream")
+async def ask_stream(request: AskRequest):
+    # Checked up front so an overloaded server still answers 429 instead of
+    # opening a stream it cannot serve. The slot itself is taken inside the
+    # generator: a stream whose body never runs (client gone before the
+    # response starts) holds nothing, and one that runs always releases it.
+    try:
+        admission.check()
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code,detail=str(e))
+
+    async def events():
+        try:
+            with admission:
+                async for event,data in rag.answer_stream(request.question,top_k=request.top_k):
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Overloaded as e:
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control":"no-cache","X-Accel-Buffering":"no"}
+    )
+
+@router.post("/ask/batch")
+async def ask_batch(request: AskBatchRequest):
+    if len(request.questions)>settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413,detail=f"At most {settings.BATCH_MAX_QUESTIONS} questions per batch")
+    try:
+        with admission:
+            answers=await rag.answer_batch_async(
+                request.questions,
+                top_k=request.top_k,
+                concurrency=settings.BATCH_LLM_CONCURRENCY
+            )
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code,detail=str(e))
+    return [
+        {"question": q, "answer": a}
+        for q,a in zip(request.questions,answers)
+    ]
@@ -1,20 +1,77 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pathlib import Path
 
 from backend.app.api.ask import retriever
+from backend.app.config import settings
+from backend.app.core.metrics import INDEXING_SECONDS, timed
+from backend.app.services.chunk_store import ChunkStore
+from backend.app.services.compaction import compact, deleted_fraction
 from backend.app.services.incremental_indexing import index_new_pdfs
+from backend.app.services.jobs import IndexingJob, IndexingJobManager
 
 router = APIRouter()
 
 PROJECT_ROOT = Path(__file__).resolve().parents[3]
+RAW_PDF_DIR = PROJECT_ROOT / "data" / "raw_pdfs"
+INDEX_PATH = PROJECT_ROOT / "data" / "faiss" / "index.faiss"
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
+INDEXED_FILES_PATH = PROJECT_ROOT / "data" / "indexed_files.json"
 
-@router.post("/index-new")
-def index_new():
-    msg = index_new_pdfs(
-        raw_pdf_dir=PROJECT_ROOT / "data" / "raw_pdfs",
-        index_path=PROJECT_ROOT / "data" / "faiss" / "index.faiss",
-        metadata_path=PROJECT_ROOT / "data" / "embeddings" / "metadata.jsonl",
-        indexed_files_path=PROJECT_ROOT / "data" / "indexed_files.json",
-    )
+def run_indexing(job: IndexingJob) -> str:
+    with timed(INDEXING_SECONDS, operation="index"):
+        msg = index_new_pdfs(
+            raw_pdf_dir=RAW_PDF_DIR,
+            index_path=INDEX_PATH,
+            store_path=STORE_PATH,
+            indexed_files_path=INDEXED_FILES_PATH,
+            on_start=job.on_start,
+            on_document=job.on_document,
+            on_indexed=lambda records, vectors: job.on_indexed(records),
+            on_deleted=job.on_deleted,
+            max_segments=settings.INDEX_MAX_SEGMENTS,
+        )
+    # Builds the new snapshot off to the side, then swaps it in atomically.
+    # Only the segment files the run added are read; the retriever falls
+    # back to a full reload if segments were merged or the index rebuilt.
+    # With no new vectors this only picks up tombstones (or does nothing).
     retriever.reload()
-    return {"status": msg}
+
+    # Tombstoned rows still cost search time; rewrite once there are enough
+    # (read from disk: a sharded retriever's shards never hold tombstones)
+    if ChunkStore.exists(STORE_PATH) and deleted_fraction(ChunkStore(STORE_PATH)) > settings.COMPACTION_THRESHOLD:
+        jobs.submit("compact")
+    return msg
+
+def run_compaction(job: IndexingJob) -> str:
+    with timed(INDEXING_SECONDS, operation="compact"):
+        msg = compact(INDEX_PATH, STORE_PATH)
+    retriever.reload()
+    return msg
+
+jobs = IndexingJobManager({"index": run_indexing, "compact": run_compaction})
+
+@router.post("/index-new", status_code=202)
+def index_new():
+    job = jobs.submit()
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/index-new")
+def list_jobs():
+    return [job.to_dict() for job in jobs.list()]
+
+@router.get("/index-new/{job_id}")
+def job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job.to_dict()
+
+@router.delete("/documents/{name}", status_code=202)
+def delete_document(name: str):
+    pdf = RAW_PDF_DIR / Path(name).name
+    if not pdf.exists():
+        raise HTTPException(status_code=404, detail="Unknown document")
+    pdf.unlink()
+    # The indexing job notices the file is gone and tombstones its chunks
+    job = jobs.submit()
+    return {"job_id": job.id, "status": job.status}
@@ -0,0 +1,51 @@
+import asyncio
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from backend.app.api.ask import retriever, batcher, retrieval_executor
+from backend.app.services.concurrency import Overloaded
+from backend.app.config import settings
+
+router = APIRouter()
+
+class SearchRequest(BaseModel):
+    question: str
+    top_k: int = 5
+    # None uses the server's HYBRID_SEARCH setting
+    hybrid: Optional[bool] = None
+
+class SearchBatchRequest(BaseModel):
+    questions: List[str]
+    top_k: int = 5
+    hybrid: Optional[bool] = None
+
+@router.post("/search")
+def search(request: SearchRequest):
+    try:
+        results = batcher.search(request.question, top_k=request.top_k, hybrid=request.hybrid)
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {
+        "question": request.question,
+        "results": results
+    }
+
+@router.post("/search/batch")
+async def search_batch(request: SearchBatchRequest):
+    if len(request.questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_QUESTIONS} questions per batch")
+    # On the bounded retrieval pool: a full queue sheds the request instead
+    # of tying up another server thread
+    try:
+        future = retrieval_executor.submit(
+            retriever.search_batch, request.questions, top_k=request.top_k, hybrid=request.hybrid
+        )
+        results = await asyncio.wrap_future(future)
+    except Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return [
+        {"question": q, "results": r}
+        for q, r in zip(request.questions, results)
+    ]
@@ -1,11 +1,27 @@
 from fastapi import APIRouter
 
-from backend.app.api.ask import retriever
+from backend.app.api.ask import retriever, answer_cache
+from backend.app.core.metrics import RERANK_PAIRS
+from backend.app.services.models import loaded_models
 
 router = APIRouter()
 @router.get("/stats")
 def stats():
-    return {
-        "total_vectors":retriever.idx.ntotal,
-        "total_chunks":len(retriever.metadata)
-    }
\ No newline at end of file
+    res = {
+        "total_vectors":0,
+        "total_chunks":0,
+        "deleted_chunks":0,
+        "lexical_chunks":0,
+        "generation":retriever.generation,
+        "index_version":retriever.version,
+        "answer_cache":answer_cache.stats() if answer_cache else None,
+        "rerank_cache":retriever.rerank_cache.stats() if retriever.rerank_cache else None,
+        "rerank_pairs":{o: int(RERANK_PAIRS.value(outcome=o)) for o in ("scored", "cached", "skipped")},
+        "models_loaded":loaded_models()
+    }
+    if retriever.idx is not None:
+        res["total_vectors"]=retriever.idx.ntotal
+        res["total_chunks"]=len(retriever.store)
+        res["deleted_chunks"]=retriever.store.n_deleted
+        res["lexical_chunks"]=len(retriever.lexical or ())
+    return res
\ No newline at end of file
@@ -1,9 +1,115 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     APP_NAME: str = "RAG Search Engine"
+    LOG_LEVEL: str = "INFO"
     DATA_DIR: str = "data"
     RAW_PDF_DIR: str = "data/raw_pdfs"
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    RERANKER_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    # Load both models at startup instead of on the first request
+    WARM_UP_MODELS: bool = False
+    # Inference backend for both models: torch | torch_int8 | onnx | onnx_int8.
+    # The onnx backends need `pip install "sentence-transformers[onnx]"`.
+    INFERENCE_BACKEND: str = "torch"
+    # Intra-op threads for torch / onnxruntime (0 = library default)
+    INFERENCE_THREADS: int = 0
+    # Override the ONNX file inside the model repo (e.g. onnx/model_qint8_avx512.onnx)
+    EMBEDDING_ONNX_FILE: Optional[str] = None
+    RERANKER_ONNX_FILE: Optional[str] = None
+
+    # ANN index used when a new index is built: flat | ivf_flat | ivf_pq | hnsw,
+    # or a scalar-quantized flat scan: fp16 | sq8
+    INDEX_TYPE: str = "flat"
+    IVF_NLIST: int = 1024
+    PQ_M: int = 48
+    HNSW_M: int = 32
+    # Default search knobs baked into new indexes; overridable per query
+    NPROBE: int = 16
+    EF_SEARCH: int = 64
+    # Quantized indexes (fp16 / sq8): shortlist rescore_factor x the candidates
+    # and rank them by exact float32 similarity (0 = off). The float32 vectors
+    # come from the chunk store, which keeps them when STORE_EMBEDDINGS is set
+    # at creation (memory-mapped, so only the rows touched are paged in).
+    RESCORE_FACTOR: int = 0
+    STORE_EMBEDDINGS: bool = False
+    # Each indexing run writes its vectors as a new immutable index segment;
+    # past this many segments the next run merges them into one base file
+    INDEX_MAX_SEGMENTS: int = 8
+
+    # Sharded retrieval: split the corpus by document into this many shards,
+    # each searched by its own worker process (0 = single in-process index)
+    RETRIEVAL_SHARDS: int = 0
+    SHARD_THREADS: int = 1
+
+    # Hybrid retrieval: fuse BM25 (lexical index in the chunk store) with the
+    # dense results by reciprocal rank; RRF_K damps the weight of top ranks
+    HYBRID_SEARCH: bool = True
+    RRF_K: int = 60
+
+    # Cross-encoder reranking: cached (query, chunk) scores, the dense-score
+    # margin above which a query's top-k skips the reranker (unset = never),
+    # and the mini-batch size of the cascade (0 = score the shortlist at once).
+    # The skip margin and the cascade are opt-in heuristics: either can return
+    # a different top-k than scoring the whole shortlist.
+    CE_CACHE_SIZE: int = 50000
+    CE_SKIP_MARGIN: Optional[float] = None
+    CE_BATCH_SIZE: int = 0
+
+    # Reuse embeddings of chunk texts seen before (keyed by model + content hash)
+    EMBEDDING_CACHE_ENABLED: bool = True
+
+    # Compact the index once this fraction of its chunks is tombstoned
+    COMPACTION_THRESHOLD: float = 0.2
+
+    # Chunking: token window size and overlap; across_pages lets chunks span
+    # page breaks, sentence_aware ends windows on sentence boundaries
+    CHUNK_SIZE: int = 500
+    CHUNK_OVERLAP: int = 100
+    CHUNK_ACROSS_PAGES: bool = False
+    CHUNK_SENTENCE_AWARE: bool = False
+
+    # Ingestion pipeline: parser processes (0 = one per core), embedding
+    # batch size and how many parsed documents may wait for the embedder
+    INGEST_WORKERS: int = 0
+    INGEST_BATCH_SIZE: int = 256
+    INGEST_MAX_PENDING_DOCS: int = 8
+
+    # Cross-request query coalescing in front of Retrievar.search
+    BATCH_MAX_SIZE: int = 32
+    BATCH_MAX_WAIT_MS: float = 5.0
+
+    # Async /ask pipeline: retrieval pool, queue bounds and admission control
+    RETRIEVAL_WORKERS: int = 4
+    RETRIEVAL_QUEUE_SIZE: int = 64
+    MAX_INFLIGHT_ASKS: int = 128
+    # /ask/batch and /search/batch: questions per request (larger lists get
+    # 413) and LLM calls in flight per /ask/batch request
+    BATCH_MAX_QUESTIONS: int = 64
+    BATCH_LLM_CONCURRENCY: int = 8
+
+    # LLM client; GEMINI_BASE_URL points the client at another endpoint (e.g. a local fake)
+    GEMINI_BASE_URL: Optional[str] = None
+    LLM_TIMEOUT_S: float = 30.0
+    # /ask/stream: LLM_TIMEOUT_S bounds the wait for the first token; after
+    # that a stream is only cut off when no chunk arrives for this long
+    LLM_STREAM_IDLE_S: float = 15.0
+    LLM_MAX_RETRIES: int = 3
+    LLM_BACKOFF_S: float = 0.5
+
+    # Context sent to the LLM: token budget (cl100k_base; unset = no limit)
+    # and merging of adjacent retrieved chunks with their overlap removed
+    CONTEXT_MAX_TOKENS: Optional[int] = 3000
+    CONTEXT_MERGE_ADJACENT: bool = True
+
+    # Semantic answer cache: near-identical questions reuse a previous answer.
+    # Opt-in: a different question embedded within the threshold gets the
+    # stored answer, and the threshold has not been tuned on real query pairs.
+    ANSWER_CACHE_ENABLED: bool = False
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_MAX_ENTRIES: int = 1024
+    ANSWER_CACHE_TTL_S: float = 3600.0
 
 settings = Settings()
@@ -1,8 +1,12 @@
 import logging
 
+from backend.app.config import settings
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s | %(levelname)s | %(message)s",
 )
 
-logger = logging.getLogger(__name__)
\ No newline at end of file
+logger = logging.getLogger(__name__)
+# DEBUG adds per-stage timing spans and the context sent to the LLM
+logger.setLevel(settings.LOG_LEVEL.upper())
\ No newline at end of file
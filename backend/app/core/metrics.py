@@ -0,0 +1,148 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from backend.app.core.logger import logger
+
+# Seconds; request stages span sub-millisecond lookups to multi-second LLM calls
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Prompt sizes in (cl100k_base) tokens
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+# Indexing jobs and reloads run from milliseconds (a delta reload) to minutes
+INDEXING_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+REGISTRY: list = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus sense, one series per label set.
+    observe() is thread-safe; render() emits the text exposition format.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (non-cumulative) + overflow, sum, count]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(s[0]), s[1], s[2]) for key, s in sorted(self._series.items())]
+        for key, counts, total, count in series:
+            labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for le, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f'{self.name}_bucket{{{prefix}le="{float(le)!r}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total!r}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label set."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each request stage (one observation per batch for batched stages).",
+    ("stage",),
+    STAGE_BUCKETS,
+)
+INDEXING_SECONDS = Histogram(
+    "rag_indexing_duration_seconds",
+    "Duration of indexing jobs, compactions and retriever reloads.",
+    ("operation",),
+    INDEXING_BUCKETS,
+)
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_tokens",
+    "Prompt size per request with every retrieved chunk in full (raw) and after context assembly (assembled).",
+    ("context",),
+    TOKEN_BUCKETS,
+)
+RERANK_PAIRS = Counter(
+    "rag_rerank_pairs_total",
+    "Cross-encoder (query, chunk) pairs by outcome: scored by the model, served from the score cache, "
+    "or skipped by the confidence check or early exit.",
+    ("outcome",),
+)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Time the block into histogram and log the span at debug level."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span %s %s %.2f ms", histogram.name, " ".join(f"{k}={v}" for k, v in labels.items()), elapsed * 1000)
+
+
+def span(stage: str):
+    """Request stage span: encode, faiss_search, bm25, mmr, rerank, prompt_build, llm."""
+    return timed(STAGE_SECONDS, stage=stage)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,21 +1,39 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 from backend.app.api.upload import router as upload_router
-from backend.app.api.ask import router as ask_router
+from backend.app.api.ask import router as ask_router, retriever
 from backend.app.api.health import router as health_router
 from backend.app.api.index_new import router as index_new
+from backend.app.api.metrics import router as metrics_router
+from backend.app.api.search import router as search_router
+from backend.app.api.stats import router as stats_router
+from backend.app.config import settings
+from backend.app.services.models import warm_up
 
-app = FastAPI(title="RAG Search Engine")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models otherwise load lazily on the first search or indexing job
+    if settings.WARM_UP_MODELS:
+        warm_up()
+    yield
+    # Stops shard worker processes when retrieval is sharded
+    retriever.close()
+
+app = FastAPI(title="RAG Search Engine", lifespan=lifespan)
 
 BASE_DIR=Path(__file__).resolve().parent
 app.mount("/static",StaticFiles(directory=BASE_DIR/"static"),name="static")
 
 app.include_router(health_router)
+app.include_router(stats_router)
+app.include_router(metrics_router)
 app.include_router(index_new)
 app.include_router(ask_router)
+app.include_router(search_router)
 app.include_router(upload_router)
 
 @app.get("/",response_class=HTMLResponse)
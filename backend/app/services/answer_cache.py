@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+import faiss
+import numpy as np
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    top_k: int
+    answer: str
+    sources: List[dict]
+    created: float
+    latency_s: float
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed on the normalised question embedding.
+
+    A lookup is a hit when a cached question with the same top_k lies above
+    `threshold` cosine similarity. Entries live in a small in-memory FAISS
+    index, evicted LRU beyond max_entries and lazily after ttl_s seconds.
+    The whole cache is dropped when the corpus generation changes.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1024, ttl_s: float = 3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+
+        self._index = None
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+        self._generation = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_latency_s = 0.0
+
+    def _check_generation(self, generation: int):
+        if generation != self._generation:
+            self._generation = generation
+            self._entries.clear()
+            if self._index is not None:
+                self._index.reset()
+
+    def _remove(self, ids: List[int]):
+        for i in ids:
+            self._entries.pop(i, None)
+        self._index.remove_ids(np.asarray(ids, dtype=np.int64))
+
+    def get(self, query_vec: np.ndarray, top_k: int, generation: int) -> Optional[CachedAnswer]:
+        with self._lock:
+            self._check_generation(generation)
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+
+            scores, ids = self._index.search(
+                query_vec.reshape(1, -1).astype(np.float32),
+                min(8, self._index.ntotal)
+            )
+            now = time.monotonic()
+            expired = []
+            hit = None
+            for score, i in zip(scores[0], ids[0]):
+                if i < 0 or score < self.threshold:
+                    break
+                entry = self._entries[int(i)]
+                if now - entry.created > self.ttl_s:
+                    expired.append(int(i))
+                elif entry.top_k == top_k:
+                    hit = int(i)
+                    break
+            if expired:
+                self._remove(expired)
+
+            if hit is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(hit)
+            entry = self._entries[hit]
+            self.hits += 1
+            self.saved_latency_s += entry.latency_s
+            return entry
+
+    def put(
+            self,
+            query_vec: np.ndarray,
+            question: str,
+            top_k: int,
+            answer: str,
+            sources: List[dict],
+            latency_s: float,
+            generation: int
+    ):
+        with self._lock:
+            self._check_generation(generation)
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(query_vec.shape[-1]))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(
+                query_vec.reshape(1, -1).astype(np.float32),
+                np.array([entry_id], dtype=np.int64)
+            )
+            self._entries[entry_id] = CachedAnswer(
+                question=question,
+                top_k=top_k,
+                answer=answer,
+                sources=sources,
+                created=time.monotonic(),
+                latency_s=latency_s,
+            )
+
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self._remove(list(self._entries)[:overflow])
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_latency_s": round(self.saved_latency_s, 3),
+            }
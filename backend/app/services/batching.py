@@ -0,0 +1,88 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+import numpy as np
+
+from backend.app.services.retrieval import Retrievar
+from backend.app.services.concurrency import QueueFull
+
+
+class QueryBatcher:
+    """
+    Coalesces concurrent Retrievar.search calls into search_batch calls.
+
+    A single background thread waits for the first query, then keeps
+    collecting until max_batch_size queries are queued or max_wait_ms has
+    passed. Queries with identical search options are run as one batch.
+    submit() raises QueueFull once max_pending queries are waiting
+    (0 means unbounded).
+    """
+
+    def __init__(
+            self,
+            retriever: Retrievar,
+            max_batch_size: int = 32,
+            max_wait_ms: float = 5.0,
+            max_pending: int = 0
+    ):
+        self.retriever = retriever
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str, query_vec: np.ndarray = None, **options) -> Future:
+        future = Future()
+        try:
+            self._queue.put_nowait((query, query_vec, options, future))
+        except queue.Full:
+            raise QueueFull("Search queue is full")
+        return future
+
+    def search(self, query: str, query_vec: np.ndarray = None, **options) -> List[dict]:
+        return self.submit(query, query_vec=query_vec, **options).result()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            groups = {}
+            for query, query_vec, options, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                key = tuple(sorted(options.items()))
+                groups.setdefault(key, []).append((query, query_vec, future))
+
+            for key, items in groups.items():
+                # Reuse caller-supplied embeddings only when every query has one
+                vecs = [v for _, v, _ in items]
+                query_vecs = None if any(v is None for v in vecs) else np.stack(vecs)
+                try:
+                    results = self.retriever.search_batch(
+                        [q for q, _, _ in items],
+                        query_vecs=query_vecs,
+                        **dict(key)
+                    )
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), res in zip(items, results):
+                    future.set_result(res)
@@ -0,0 +1,394 @@
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+META_FILE = "meta.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+TEXT_FILE = "text.bin"
+OFFSETS_FILE = "text_offsets.i64"
+DOC_IDS_FILE = "doc_ids.i32"
+PAGES_FILE = "pages.i32"
+PAGE_ENDS_FILE = "page_ends.i32"
+CHUNK_IDS_FILE = "chunk_ids.i32"
+# Stores committed before tombstone bitmaps were versioned use this name
+DELETED_FILE = "deleted.bits"
+
+FORMAT_VERSION = 1
+
+
+def _read_deleted(path: Path, count: int, name: Optional[str] = DELETED_FILE) -> np.ndarray:
+    # Tombstone bitmap; rows past its end (or a missing file) are live
+    deleted = np.zeros(count, dtype=bool)
+    file_path = path / name if name else None
+    if file_path is not None and file_path.exists():
+        bits = np.unpackbits(np.fromfile(file_path, dtype=np.uint8), bitorder="little")[:count]
+        deleted[:len(bits)] = bits.astype(bool)
+    return deleted
+
+
+def fsync_path(path: Path):
+    # Files and (on POSIX) directories alike
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_meta(path: Path) -> dict:
+    return json.loads((path / META_FILE).read_text(encoding="utf-8"))
+
+
+def _open_column(path: Path, dtype, shape: tuple) -> np.ndarray:
+    # np.memmap refuses zero-length mappings, so empty columns get a plain array
+    if int(np.prod(shape)) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped columnar chunk store.
+
+    Layout of a store directory:
+        meta.json          count, embedding dim, the doc name table, the
+                           commit id and the current tombstone bitmap
+        embeddings.f32     float32 matrix, count x dim (optional)
+        text.bin           utf-8 chunk texts, back to back
+        text_offsets.i64   count + 1 byte offsets into text.bin
+        doc_ids.i32        index into meta["docs"]
+        pages.i32
+        page_ends.i32      last page of chunks that span pages (optional)
+        chunk_ids.i32
+        deleted.<commit>.bits
+                           tombstone bitmap, one bit per row (optional)
+
+    Opening a store only maps the files; rows are read on access.
+    Stores written without embeddings rely on the FAISS index for vectors.
+    Deleted rows keep their position (row i is FAISS id i) until compaction.
+
+    count and deleted_file pin the view to an earlier commit (as recorded
+    in the index manifest): rows appended after it are not visible and the
+    tombstones are read from that commit's bitmap.
+    """
+
+    def __init__(self, path: Path, count: Optional[int] = None, deleted_file: Optional[str] = None):
+        self.path = path
+        meta = read_meta(path)
+        if count is not None and count > meta["count"]:
+            raise RuntimeError(f"Chunk store {path} has {meta['count']} committed rows, expected {count}")
+        self.count: int = meta["count"] if count is None else count
+        self.commit_id: Optional[str] = meta.get("commit")
+        self.dim: Optional[int] = meta["dim"]
+        self.docs: List[str] = meta["docs"]
+        self.has_embeddings: bool = meta.get("embeddings", True)
+
+        n = self.count
+        self._offsets = _open_column(path / OFFSETS_FILE, np.int64, (n + 1,))
+        self._text = _open_column(path / TEXT_FILE, np.uint8, (int(self._offsets[n]),))
+        self._doc_ids = _open_column(path / DOC_IDS_FILE, np.int32, (n,))
+        self._pages = _open_column(path / PAGES_FILE, np.int32, (n,))
+        self._chunk_ids = _open_column(path / CHUNK_IDS_FILE, np.int32, (n,))
+        # Stores written before chunks could span pages end where they start
+        self._page_ends = self._pages
+        if (path / PAGE_ENDS_FILE).exists():
+            self._page_ends = _open_column(path / PAGE_ENDS_FILE, np.int32, (n,))
+        self._embeddings = None
+        if self.has_embeddings:
+            self._embeddings = _open_column(path / EMBEDDINGS_FILE, np.float32, (n, self.dim or 0))
+
+        if count is None:
+            deleted_file = meta.get("deleted_file", DELETED_FILE)
+        self.deleted = _read_deleted(path, n, deleted_file)
+        self.n_deleted = int(self.deleted.sum())
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        return (path / META_FILE).exists()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def text(self, i: int) -> str:
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return self._text[start:end].tobytes().decode("utf-8")
+
+    def embeddings(self, ids: Iterable[int]) -> np.ndarray:
+        if self._embeddings is None:
+            raise RuntimeError(f"Chunk store {self.path} was written without embeddings")
+        return np.array(self._embeddings[np.asarray(ids, dtype=np.int64)], dtype=np.float32)
+
+    def doc_rows(self, names: Iterable[str]) -> np.ndarray:
+        """Row ids (= FAISS ids) of every chunk of the given documents."""
+        names = set(names)
+        doc_ids = [i for i, name in enumerate(self.docs) if name in names]
+        return np.flatnonzero(np.isin(self._doc_ids, doc_ids))
+
+    def __getitem__(self, i: int) -> dict:
+        return {
+            "text": self.text(i),
+            "doc_id": self.docs[self._doc_ids[i]],
+            "page": int(self._pages[i]),
+            "page_end": int(self._page_ends[i]),
+            "chunk_id": int(self._chunk_ids[i]),
+        }
+
+
+class ChunkStoreWriter:
+    """
+    Append-only writer for a ChunkStore directory.
+
+    Rows written with append() are invisible to readers until commit()
+    rewrites meta.json. Anything past the committed count (e.g. from a
+    crashed run) is truncated when the writer is opened.
+
+    with_embeddings only applies when the store is created; an existing
+    store keeps whatever layout it was created with.
+
+    delete_docs() and delete_rows() tombstone rows in memory; commit()
+    writes them to a new bitmap file named after the commit, so meta.json
+    switches rows and tombstones over in one rename. The previous bitmap is kept for readers
+    still pinned to the last commit; older ones are removed.
+    """
+
+    def __init__(self, path: Path, dim: Optional[int] = None, with_embeddings: bool = True):
+        self.path = path
+        path.mkdir(parents=True, exist_ok=True)
+
+        if ChunkStore.exists(path):
+            meta = read_meta(path)
+        else:
+            meta = {
+                "version": FORMAT_VERSION,
+                "dim": dim,
+                "count": 0,
+                "docs": [],
+                "embeddings": with_embeddings,
+                "deleted_file": None,
+            }
+
+        if meta["dim"] is None:
+            meta["dim"] = dim
+        elif dim is not None and meta["dim"] != dim:
+            raise RuntimeError(
+                f"Embedding dimension mismatch: store has {meta['dim']}, got {dim}"
+            )
+
+        self.dim: Optional[int] = meta["dim"]
+        self.count: int = meta["count"]
+        self.docs: List[str] = meta["docs"]
+        self.with_embeddings: bool = meta.get("embeddings", True)
+        self._doc_index = {name: i for i, name in enumerate(self.docs)}
+        self._deleted_file: Optional[str] = meta.get("deleted_file", DELETED_FILE)
+        self._deleted = _read_deleted(path, self.count, self._deleted_file)
+        self._deleted_dirty = False
+
+        offsets_path = path / OFFSETS_FILE
+        if not offsets_path.exists() or offsets_path.stat().st_size == 0:
+            np.zeros(1, dtype=np.int64).tofile(offsets_path)
+        offsets = np.fromfile(offsets_path, dtype=np.int64, count=self.count + 1)
+        self._text_end = int(offsets[self.count])
+
+        self._truncate(OFFSETS_FILE, (self.count + 1) * 8)
+        self._truncate(TEXT_FILE, self._text_end)
+        self._truncate(DOC_IDS_FILE, self.count * 4)
+        self._truncate(PAGES_FILE, self.count * 4)
+        self._truncate(CHUNK_IDS_FILE, self.count * 4)
+        if not (path / PAGE_ENDS_FILE).exists():
+            # Backfill for stores created before the column existed
+            pages = np.fromfile(path / PAGES_FILE, dtype=np.int32, count=self.count)
+            pages.tofile(path / PAGE_ENDS_FILE)
+        self._truncate(PAGE_ENDS_FILE, self.count * 4)
+
+        columns = [TEXT_FILE, OFFSETS_FILE, DOC_IDS_FILE, PAGES_FILE, PAGE_ENDS_FILE, CHUNK_IDS_FILE]
+        if self.with_embeddings:
+            self._truncate(EMBEDDINGS_FILE, self.count * (self.dim or 0) * 4)
+            columns.append(EMBEDDINGS_FILE)
+        self._files = {name: (path / name).open("ab") for name in columns}
+
+    def _truncate(self, name: str, size: int):
+        file_path = self.path / name
+        if not file_path.exists():
+            file_path.touch()
+        if file_path.stat().st_size > size:
+            os.truncate(file_path, size)
+
+    def _doc_id(self, name: str) -> int:
+        if name not in self._doc_index:
+            self._doc_index[name] = len(self.docs)
+            self.docs.append(name)
+        return self._doc_index[name]
+
+    @property
+    def n_deleted(self) -> int:
+        self._sync_deleted()
+        return int(self._deleted.sum())
+
+    def delete_docs(self, names: Iterable[str]) -> int:
+        """Tombstone every committed or appended row of the given documents."""
+        doc_ids = [self._doc_index[name] for name in names if name in self._doc_index]
+        if not doc_ids:
+            return 0
+        self._sync_deleted()
+        self._files[DOC_IDS_FILE].flush()
+        rows = np.fromfile(self.path / DOC_IDS_FILE, dtype=np.int32, count=self.count)
+        hit = np.isin(rows, doc_ids) & ~self._deleted
+        self._deleted |= hit
+        self._deleted_dirty = self._deleted_dirty or bool(hit.any())
+        return int(hit.sum())
+
+    def delete_rows(self, rows: Iterable[int]) -> int:
+        """Tombstone the given committed or appended rows; returns how many were live."""
+        self._sync_deleted()
+        rows = np.asarray(rows, dtype=np.int64)
+        hit = rows[~self._deleted[rows]]
+        self._deleted[hit] = True
+        self._deleted_dirty = self._deleted_dirty or bool(len(hit))
+        return int(len(hit))
+
+    def append(self, records: List[dict], embeddings: Optional[np.ndarray] = None):
+        if not records:
+            return
+
+        if self.with_embeddings:
+            if embeddings is None or len(records) != len(embeddings):
+                raise ValueError("records and embeddings must have the same length")
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+            if embeddings.shape[1] != self.dim:
+                raise RuntimeError("Embedding dimension mismatch")
+            self._files[EMBEDDINGS_FILE].write(embeddings.tobytes())
+
+        encoded = [r["text"].encode("utf-8") for r in records]
+        offsets = self._text_end + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        self._text_end = int(offsets[-1])
+
+        self._files[TEXT_FILE].write(b"".join(encoded))
+        self._files[OFFSETS_FILE].write(offsets.tobytes())
+        self._files[DOC_IDS_FILE].write(
+            np.array([self._doc_id(r["doc_id"]) for r in records], dtype=np.int32).tobytes()
+        )
+        self._files[PAGES_FILE].write(
+            np.array([r["page"] for r in records], dtype=np.int32).tobytes()
+        )
+        self._files[PAGE_ENDS_FILE].write(
+            np.array([r.get("page_end", r["page"]) for r in records], dtype=np.int32).tobytes()
+        )
+        self._files[CHUNK_IDS_FILE].write(
+            np.array([r["chunk_id"] for r in records], dtype=np.int32).tobytes()
+        )
+        self.count += len(records)
+
+    def _sync_deleted(self):
+        # Rows appended since the bitmap was last sized are live
+        if len(self._deleted) < self.count:
+            self._deleted = np.concatenate([self._deleted, np.zeros(self.count - len(self._deleted), dtype=bool)])
+
+    def commit(self, commit_id: Optional[str] = None) -> str:
+        """
+        Make the appended rows and new tombstones visible. commit_id (a
+        fresh one by default) is recorded in meta.json, so a caller that
+        announced it beforehand can tell later whether the commit landed.
+        """
+        commit_id = commit_id or uuid.uuid4().hex
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._sync_deleted()
+        previous = self._deleted_file
+        if self._deleted_dirty:
+            name = f"deleted.{commit_id}.bits"
+            tmp = self.path / (name + ".tmp")
+            np.packbits(self._deleted, bitorder="little").tofile(tmp)
+            fsync_path(tmp)
+            os.replace(tmp, self.path / name)
+            self._deleted_file = name
+            self._deleted_dirty = False
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "dim": self.dim,
+            "count": self.count,
+            "docs": self.docs,
+            "embeddings": self.with_embeddings,
+            "deleted": self.n_deleted,
+            "deleted_file": self._deleted_file,
+            "commit": commit_id,
+        }
+        tmp = self.path / (META_FILE + ".tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        fsync_path(tmp)
+        os.replace(tmp, self.path / META_FILE)
+
+        for old in self.path.glob("deleted*.bits"):
+            if old.name not in (self._deleted_file, previous):
+                old.unlink(missing_ok=True)
+        return commit_id
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert_jsonl(
+        jsonl_path: Path,
+        store_path: Path,
+        vectors_path: Optional[Path] = None,
+        batch_size: int = 4096,
+        with_embeddings: bool = True,
+) -> int:
+    """
+    One-shot conversion of a metadata.jsonl file into a ChunkStore.
+
+    Embeddings are taken from each record's "embedding" field, or by row
+    from vectors_path (a .npy file) when the records do not carry them.
+    With with_embeddings=False they are dropped and only text/ids are kept.
+    """
+    if ChunkStore.exists(store_path):
+        raise RuntimeError(f"{store_path} already contains a chunk store")
+
+    vectors = None
+    if with_embeddings and vectors_path:
+        vectors = np.load(vectors_path, mmap_mode="r")
+
+    with ChunkStoreWriter(store_path, with_embeddings=with_embeddings) as writer, \
+            jsonl_path.open("r", encoding="utf-8") as f:
+        records, embeddings = [], []
+
+        def flush():
+            if not with_embeddings:
+                batch = None
+            elif vectors is not None:
+                start = writer.count
+                batch = vectors[start:start + len(records)]
+            else:
+                batch = np.array(embeddings, dtype=np.float32)
+            writer.append(records, batch)
+            records.clear()
+            embeddings.clear()
+
+        for line in f:
+            record = json.loads(line)
+            embedding = record.pop("embedding", None)
+            if with_embeddings and vectors is None:
+                embeddings.append(embedding)
+            records.append(record)
+            if len(records) >= batch_size:
+                flush()
+        if records:
+            flush()
+
+        writer.commit()
+        return writer.count
@@ -0,0 +1,80 @@
+import shutil
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from backend.app.services.chunk_store import ChunkStore, ChunkStoreWriter
+from backend.app.services.index import SegmentedIndex, new_epoch
+from backend.app.services.lexical_index import update_lexical_index
+from backend.app.services.manifest import (
+    finish_commit,
+    load_index,
+    next_manifest,
+    open_store,
+    prepare_commit,
+    recover,
+    swap_in_store,
+    write_segment,
+)
+
+
+def deleted_fraction(store: ChunkStore) -> float:
+    return store.n_deleted / len(store) if len(store) else 0.0
+
+
+def compact(index_path: Path, store_path: Path, batch_size: int = 65536) -> str:
+    """
+    Rewrite the index and chunk store without tombstoned rows.
+
+    The new index is a reset clone of the old one, so IVF/PQ training is
+    reused and only the live vectors are re-added (read back from the
+    index, or from the store when it keeps its own copy). The index is
+    written as a new single segment and the store next to the original;
+    the store is swapped in between writing the next manifest ahead and
+    committing it, with a new epoch so running retrievers do a full reload.
+    """
+    manifest = recover(index_path, store_path)
+    if manifest is None or not manifest["segments"]:
+        return "Nothing to compact."
+    store = open_store(store_path, manifest)
+    if not store.n_deleted:
+        return "Nothing to compact."
+
+    index = load_index(index_path, manifest)
+    if index.ntotal != len(store):
+        raise RuntimeError(f"FAISS index ({index.ntotal}) != chunk store records ({len(store)})")
+
+    live = np.flatnonzero(~store.deleted)
+    compacted = faiss.clone_index(index.base if isinstance(index, SegmentedIndex) else index)
+    compacted.reset()
+
+    tmp_store = store_path.with_name(store_path.name + ".compact")
+    if tmp_store.exists():
+        shutil.rmtree(tmp_store)
+
+    with ChunkStoreWriter(tmp_store, dim=store.dim, with_embeddings=store.has_embeddings) as writer:
+        for start in range(0, len(live), batch_size):
+            ids = live[start:start + batch_size]
+            if store.has_embeddings:
+                vectors = store.embeddings(ids)
+            else:
+                vectors = index.reconstruct_batch(ids)
+            compacted.add(vectors)
+            writer.append([store[int(i)] for i in ids], vectors)
+
+        version = manifest["version"] + 1
+        segment = write_segment(index_path, compacted, version)
+        commit_id = prepare_commit(
+            index_path,
+            next_manifest(manifest, version=version, epoch=new_epoch(), segments=[segment])
+        )
+        writer.commit(commit_id)
+    # Row ids shift, so the lexical index is rebuilt inside the new store
+    update_lexical_index(tmp_store)
+
+    # Open memory maps keep the old files alive for in-flight searches
+    swap_in_store(store_path, tmp_store)
+    finish_commit(index_path, store_path)
+
+    return f"Compacted {len(store)} -> {compacted.ntotal} chunks ({store.n_deleted} tombstones dropped)"
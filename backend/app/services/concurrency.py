@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of queued. Carries the HTTP status to return."""
+    status_code = 503
+
+
+class QueueFull(Overloaded):
+    status_code = 503
+
+
+class TooManyRequests(Overloaded):
+    status_code = 429
+
+
+class BoundedExecutor:
+    """
+    ThreadPoolExecutor with a cap on queued work. submit() fails fast with
+    QueueFull once max_workers + max_queue tasks are pending.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, name: str = "worker"):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull("Retrieval queue is full")
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+class AdmissionController:
+    """
+    Caps the number of requests in flight. Use as a context manager around
+    request handling; acquiring raises TooManyRequests at the cap. A request
+    that outlives its handler (streaming) takes its slot in the code that
+    runs the body, so the slot is released however the body ends, and may
+    check() up front to be shed before the response starts.
+    """
+
+    def __init__(self, max_inflight: int):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raise TooManyRequests if a request arriving now would be shed; reserves nothing."""
+        with self._lock:
+            if self.inflight >= self.max_inflight:
+                raise TooManyRequests("Too many requests in flight")
+
+    def acquire(self):
+        with self._lock:
+            if self.inflight >= self.max_inflight:
+                raise TooManyRequests("Too many requests in flight")
+            self.inflight += 1
+
+    def release(self):
+        with self._lock:
+            self.inflight -= 1
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,152 @@
+from dataclasses import dataclass, replace
+from typing import List
+
+from backend.app.utils.chunking import PAGE_SEPARATOR, tokenizer
+
+# Prefix of the next chunk searched for in the previous one's tail
+OVERLAP_PROBE_CHARS = 32
+BLOCK_SEPARATOR = "\n\n"
+
+
+@dataclass
+class ContextBlock:
+    doc_id: str
+    page: int
+    page_end: int
+    chunk_ids: List[int]
+    text: str
+    # Position of the best-ranked chunk in the block within the results
+    rank: int
+
+
+@dataclass
+class AssembledContext:
+    text: str
+    blocks: List[ContextBlock]
+    # cl100k_base counts (the chunker's tokenizer, not Gemini's)
+    tokens_before: int
+    tokens_after: int
+    # Search results whose text made it into the context
+    chunks_used: int
+
+
+def format_pages(page: int, page_end: int) -> str:
+    return f"page {page}" if page_end == page else f"pages {page}-{page_end}"
+
+
+def _format_block(block: ContextBlock) -> str:
+    return f"[Source: {block.doc_id} | {format_pages(block.page, block.page_end)}]\n{block.text}"
+
+
+def count_tokens(text: str) -> int:
+    return len(tokenizer.encode_ordinary(text))
+
+
+def _overlap(a: str, b: str) -> int:
+    """
+    Length of the longest suffix of a that is also a prefix of b. In
+    periodic text (rows of a repeated table line) that can be longer than
+    the real overlap, dropping a few repeats.
+    """
+    probe = b[:OVERLAP_PROBE_CHARS]
+    pos = a.find(probe, max(0, len(a) - len(b))) if probe else -1
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(probe, pos + 1)
+    # Overlaps shorter than the probe (sentence-aware windows can start late)
+    for n in range(min(len(probe) - 1, len(a)), 0, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+
+def _single(r: dict, rank: int) -> ContextBlock:
+    return ContextBlock(r["doc_id"], r["page"], r.get("page_end", r["page"]), [r["chunk_id"]], r.get("text", ""), rank)
+
+
+def _join(a: dict, b: dict) -> str:
+    # Consecutive chunks are consecutive windows of the document: b starts
+    # a new page (chunks not spanning pages) or inside / right after a
+    if b["page"] > a.get("page_end", a["page"]):
+        return PAGE_SEPARATOR + b["text"]
+    return b["text"][_overlap(a["text"], b["text"]):]
+
+
+def merge_adjacent(results: List[dict]) -> List[ContextBlock]:
+    """
+    One block per run of consecutive chunk_ids of a document, overlap
+    removed, ordered by the best rank in each run. Blocks whose text is
+    contained in a better-ranked block (duplicate documents, or a chunk
+    already inside a merged run) are dropped.
+    """
+    ranks = {}
+    by_doc = {}
+    for rank, r in enumerate(results):
+        key = (r["doc_id"], r["chunk_id"])
+        if key not in ranks:
+            ranks[key] = rank
+            by_doc.setdefault(r["doc_id"], []).append(r)
+
+    blocks = []
+    for doc_id, chunks in by_doc.items():
+        chunks.sort(key=lambda r: r["chunk_id"])
+        run = [chunks[0]]
+        for r in chunks[1:] + [None]:
+            if r is not None and r["chunk_id"] == run[-1]["chunk_id"] + 1:
+                run.append(r)
+                continue
+            parts = [run[0]["text"]] + [_join(prev, cur) for prev, cur in zip(run, run[1:])]
+            blocks.append(ContextBlock(
+                doc_id=doc_id,
+                page=run[0]["page"],
+                page_end=max(c.get("page_end", c["page"]) for c in run),
+                chunk_ids=[c["chunk_id"] for c in run],
+                text="".join(parts),
+                rank=min(ranks[(doc_id, c["chunk_id"])] for c in run),
+            ))
+            run = [r]
+
+    blocks.sort(key=lambda b: b.rank)
+    unique, kept = [], []
+    for block in blocks:
+        key = " ".join(block.text.split())
+        if not any(key in other for other in kept):
+            kept.append(key)
+            unique.append(block)
+    return unique
+
+
+def assemble_context(results: List[dict], max_tokens: int = None, merge: bool = True) -> AssembledContext:
+    """
+    Context for the prompt from ranked search results: adjacent chunks
+    merged (when merge), then whole blocks packed in rank order while they
+    fit into max_tokens. A block that does not fit is skipped so a smaller,
+    lower-ranked one can still use the space; only when nothing fits is
+    the best block cut at a token boundary.
+    """
+    singles = [_single(r, rank) for rank, r in enumerate(results)]
+    tokens_before = count_tokens(BLOCK_SEPARATOR.join(_format_block(b) for b in singles))
+    blocks = merge_adjacent(results) if merge else singles
+
+    separator_tokens = count_tokens(BLOCK_SEPARATOR)
+    packed, used = [], 0
+    for block in blocks:
+        cost = count_tokens(_format_block(block)) + (separator_tokens if packed else 0)
+        if max_tokens is None or used + cost <= max_tokens:
+            packed.append(block)
+            used += cost
+
+    if not packed and blocks and max_tokens:
+        block = blocks[0]
+        budget = max(max_tokens - count_tokens(_format_block(replace(block, text=""))), 0)
+        packed.append(replace(block, text=tokenizer.decode(tokenizer.encode_ordinary(block.text)[:budget])))
+
+    text = BLOCK_SEPARATOR.join(_format_block(b) for b in packed)
+    return AssembledContext(
+        text=text,
+        blocks=packed,
+        tokens_before=tokens_before,
+        tokens_after=count_tokens(text),
+        chunks_used=sum(len(b.chunk_ids) for b in packed),
+    )
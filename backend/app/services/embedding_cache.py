@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+META_FILE = "meta.json"
+KEYS_FILE = "keys.bin"
+VECTORS_FILE = "vectors.f32"
+
+KEY_SIZE = 16
+FORMAT_VERSION = 1
+
+
+def text_key(text: str) -> bytes:
+    """128-bit content hash of a chunk text."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, append-only embedding cache for one model.
+
+    Layout of a cache directory (one per model and inference backend):
+        meta.json      committed row count and dim
+        keys.bin       16-byte blake2b digests of the chunk texts, back to back
+        vectors.f32    float32 matrix, count x dim, row-aligned with keys.bin
+
+    The keys are loaded into a dict on open; vectors stay memory-mapped.
+    Rows are only trusted up to the committed count, anything past it
+    (a crashed write) is truncated on open. One writer process at a time.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.mkdir(parents=True, exist_ok=True)
+
+        meta = {"version": FORMAT_VERSION, "count": 0, "dim": None}
+        if (path / META_FILE).exists():
+            meta = json.loads((path / META_FILE).read_text(encoding="utf-8"))
+        self.count: int = meta["count"]
+        self.dim: Optional[int] = meta["dim"]
+
+        self._truncate(KEYS_FILE, self.count * KEY_SIZE)
+        self._truncate(VECTORS_FILE, self.count * (self.dim or 0) * 4)
+
+        keys = (path / KEYS_FILE).read_bytes()
+        self._rows: Dict[bytes, int] = {
+            keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i for i in range(self.count)
+        }
+        self._vectors = self._map()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _truncate(self, name: str, size: int):
+        file_path = self.path / name
+        if not file_path.exists():
+            file_path.touch()
+        if file_path.stat().st_size > size:
+            os.truncate(file_path, size)
+
+    def _map(self) -> np.ndarray:
+        if not self.count:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self.path / VECTORS_FILE, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, keys: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (hit mask, vectors of the hits in order)."""
+        with self._lock:
+            rows = np.array([self._rows.get(k, -1) for k in keys], dtype=np.int64)
+            hit = rows >= 0
+            vectors = np.array(self._vectors[rows[hit]], dtype=np.float32)
+            n_hits = int(hit.sum())
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+            return hit, vectors
+
+    def put(self, keys: List[bytes], vectors: np.ndarray):
+        """Append new entries and commit them; keys already cached are skipped."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise RuntimeError(f"Embedding dimension mismatch: cache has {self.dim}, got {vectors.shape[1]}")
+
+            new, seen = [], set()
+            for i, k in enumerate(keys):
+                if k not in self._rows and k not in seen:
+                    seen.add(k)
+                    new.append(i)
+            if not new:
+                return
+
+            with (self.path / KEYS_FILE).open("ab") as kf, (self.path / VECTORS_FILE).open("ab") as vf:
+                kf.write(b"".join(keys[i] for i in new))
+                vf.write(vectors[new].tobytes())
+                for f in (kf, vf):
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            for i in new:
+                self._rows[keys[i]] = self.count
+                self.count += 1
+
+            meta = {"version": FORMAT_VERSION, "count": self.count, "dim": self.dim}
+            tmp = self.path / (META_FILE + ".tmp")
+            tmp.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp, self.path / META_FILE)
+            self._vectors = self._map()
+
+
+_caches: Dict[Path, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(cache_dir: Path, model_key: str) -> EmbeddingCache:
+    """Process-wide cache instance for model_key under cache_dir."""
+    path = cache_dir / re.sub(r"[^A-Za-z0-9._-]+", "_", model_key)
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = EmbeddingCache(path)
+        return _caches[path]
@@ -1,18 +1,69 @@
+from pathlib import Path
 from typing import List
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from backend.app.config import settings
+from backend.app.services.embedding_cache import get_embedding_cache, text_key
+from backend.app.services.models import get_embedder
 
 
 class EmbeddingsService:
-    def __init__(self,model_name:str="all-MiniLM-L6-v2"):
-        self.model=SentenceTransformer(model_name)
+    def __init__(self,model_name:str=None,cache_dir:Path=None):
+        # Shared, lazily loaded instance from the model registry
+        self.model_name=model_name
+
+        # Chunks embedded in earlier runs are looked up by content hash
+        self.cache=None
+        if cache_dir is not None and settings.EMBEDDING_CACHE_ENABLED:
+            model_key=f"{model_name or settings.EMBEDDING_MODEL}-{settings.INFERENCE_BACKEND}"
+            self.cache=get_embedding_cache(cache_dir,model_key)
+        self.cache_hits=0
+        self.cache_misses=0
 
-    def embed_text(self,text:List[str]) -> np.ndarray:
-        embeddings = self.model.encode(
+    @property
+    def model(self):
+        return get_embedder(self.model_name)
+
+    def _encode(self,text:List[str],show_progress:bool) -> np.ndarray:
+        return self.model.encode(
             text,
-            show_progress_bar=True,
+            show_progress_bar=show_progress,
             convert_to_numpy=True,
             normalize_embeddings=True
         )
-        return embeddings
\ No newline at end of file
+
+    def embed_text(self,text:List[str],show_progress:bool=True) -> np.ndarray:
+        if self.cache is None or not text:
+            return self._encode(text,show_progress)
+
+        keys=[text_key(t) for t in text]
+        hit,cached=self.cache.get(keys)
+        misses=np.flatnonzero(~hit)
+        self.cache_hits+=len(text)-len(misses)
+        self.cache_misses+=len(misses)
+        if not len(misses):
+            return cached
+
+        # Only the misses go through the model; repeated texts are embedded once
+        first={}
+        for i in misses:
+            first.setdefault(keys[i],i)
+        computed=self._encode([text[i] for i in first.values()],show_progress).astype(np.float32)
+        self.cache.put(list(first),computed)
+
+        row={key:j for j,key in enumerate(first)}
+        embeddings=np.empty((len(text),computed.shape[1]),dtype=np.float32)
+        if hit.any():
+            embeddings[hit]=cached
+        embeddings[misses]=computed[[row[keys[i]] for i in misses]]
+        return embeddings
+
+    def cache_summary(self) -> str:
+        total=self.cache_hits+self.cache_misses
+        if self.cache is None or not total:
+            return "embedding cache: off" if self.cache is None else "embedding cache: unused"
+        return (
+            f"embedding cache: {self.cache_hits} hits / {self.cache_misses} misses "
+            f"({self.cache_hits / total:.0%} hit rate)"
+        )
\ No newline at end of file
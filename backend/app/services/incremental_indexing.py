@@ -1,72 +1,221 @@
+import hashlib
 import json
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List
 
 import faiss
 import numpy as np
 
-from backend.app.services.ingestion import extract_from_pdf
-from backend.app.utils.chunking import chunk_txt
 from backend.app.services.embeddings import EmbeddingsService
+from backend.app.services.chunk_store import ChunkStoreWriter
+from backend.app.services.index import SQ8_TRAIN_SIZE, FaissIndexService, merge_indexes, new_epoch
+from backend.app.services.lexical_index import update_lexical_index
+from backend.app.services.manifest import (
+    finish_commit,
+    load_segments,
+    next_manifest,
+    prepare_commit,
+    recover,
+    write_manifest,
+    write_segment,
+)
+from backend.app.services.pipeline import run_pipeline
+from backend.app.config import settings
+
+def _new_index_service(dim: int) -> FaissIndexService:
+    return FaissIndexService(
+        dim,
+        index_type=settings.INDEX_TYPE,
+        nlist=settings.IVF_NLIST,
+        pq_m=settings.PQ_M,
+        hnsw_m=settings.HNSW_M,
+        nprobe=settings.NPROBE,
+        ef_search=settings.EF_SEARCH,
+    )
+
+def _file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _fingerprint(pdf: Path, previous: dict) -> dict:
+    stat = pdf.stat()
+    # Same size and mtime as last time: trust the recorded hash instead of re-reading the file
+    if previous.get("sha256") and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+        return previous
+    return {"sha256": _file_hash(pdf), "size": stat.st_size, "mtime": stat.st_mtime}
+
+def load_indexed_files(indexed_files_path: Path) -> Dict[str, dict]:
+    """
+    indexed_files.json maps each indexed document to {sha256, size, mtime}.
+    Older versions stored a plain list of names; those entries carry no
+    hash and are adopted as unchanged on the next run. Fingerprints now
+    live in the index manifest; this file is only read until the first
+    manifest records them.
+    """
+    if not indexed_files_path.exists():
+        return {}
+    data = json.loads(indexed_files_path.read_text())
+    if isinstance(data, list):
+        return {name: {} for name in data}
+    return data
 
 def index_new_pdfs(
     raw_pdf_dir: Path,
     index_path: Path,
-    metadata_path: Path,
+    store_path: Path,
     indexed_files_path: Path,
+    on_start: Callable[[List[str]], None] = None,
+    on_document: Callable[[str, int], None] = None,
+    on_indexed: Callable[[List[dict], np.ndarray], None] = None,
+    on_deleted: Callable[[List[str]], None] = None,
+    max_segments: int = 8,
 ):
-    indexed_files = set()
-    if indexed_files_path.exists():
-        indexed_files = set(json.loads(indexed_files_path.read_text()))
+    """
+    Bring the index in line with raw_pdf_dir. PDFs without a fingerprint
+    in the manifest are added; PDFs whose content hash changed have
+    their old chunks tombstoned and are re-indexed; PDFs that disappeared
+    are tombstoned. Unchanged documents cost nothing.
+
+    The optional hooks report progress: on_start with the names to index,
+    on_deleted with the names removed, on_document once a document is
+    parsed (with its chunk count) and on_indexed after each batch of
+    records and vectors has been added.
+
+    Nothing readers may have open is rewritten. The run's vectors go into
+    a new immutable segment file next to the index (a reset clone of its
+    last segment, so the same layout and training); once max_segments
+    exist, they are merged with the new vectors into a fresh base file.
+    Then, in order: the next manifest is written ahead with the chunk
+    store commit id it expects, the store commits, the BM25 index catches
+    up, and the manifest (segments, store state, document fingerprints)
+    is renamed into place. A run cut short at any point is completed or
+    rolled back at the start of the next one (see manifest.recover). The epoch is kept across appends and merges since
+    row ids do not move; a freshly created index gets a new one.
+    """
+    manifest = recover(index_path, store_path)
+    known = manifest.get("files") if manifest else None
+    if known is None:
+        known = load_indexed_files(indexed_files_path)
+    current = {pdf.name: pdf for pdf in sorted(raw_pdf_dir.glob("*.pdf"))}
+    fingerprints = {name: _fingerprint(pdf, known.get(name, {})) for name, pdf in current.items()}
+
+    new_pdfs = [pdf for name, pdf in current.items() if name not in known]
+    changed_pdfs = [
+        pdf for name, pdf in current.items()
+        if known.get(name, {}).get("sha256") not in (None, fingerprints[name]["sha256"])
+    ]
+    removed = [name for name in known if name not in current]
 
-    new_pdfs = [pdf for pdf in raw_pdf_dir.glob("*.pdf") if pdf.name not in indexed_files]
-    if not new_pdfs:
+    to_index = new_pdfs + changed_pdfs
+    if not to_index and not removed:
+        if fingerprints != known:
+            write_manifest(index_path, next_manifest(manifest, files=fingerprints))
         return "No new documents to index."
 
-    new_chunks: List[str] = []
-    new_metadata: List[dict] = []
-
-    for pdf in new_pdfs:
-        pages = extract_from_pdf(pdf)
-        chunk_id = 0
-        for page in pages:
-            for chunk in chunk_txt(page["text"]):
-                new_chunks.append(chunk)
-                new_metadata.append({
-                    "doc_id": pdf.name,
-                    "page": page["page"],
-                    "chunk_id": chunk_id,
-                    "text": chunk,
-                })
-                chunk_id += 1
-
-    embedder = EmbeddingsService()
-    new_vectors = embedder.embed_text(new_chunks).astype("float32")
-    faiss.normalize_L2(new_vectors)
-
-    if index_path.exists():
-        index = faiss.read_index(str(index_path))
-        if index.d != new_vectors.shape[1]:
-            raise RuntimeError("Embedding dimension mismatch")
-        index.add(new_vectors)
+    if on_start is not None:
+        on_start([pdf.name for pdf in to_index])
+    if on_deleted is not None and removed:
+        on_deleted(removed)
+
+    embedder = EmbeddingsService(cache_dir=store_path.parent / "embedding_cache")
+    service = None
+    segments = list(manifest["segments"]) if manifest else []
+    # The last segment has the base's layout and training and is usually small
+    template = load_segments(index_path, segments[-1:])[0] if segments else None
+    epoch = manifest["epoch"] if template is not None and manifest["epoch"] else new_epoch()
+    # This run's vectors
+    segment = None
+
+    # A brand-new IVF or sq8 index is trained once enough vectors have arrived;
+    # until then batches are held back (bounded by the training size)
+    pending: List[np.ndarray] = []
+    if settings.INDEX_TYPE.startswith("ivf"):
+        train_size = settings.IVF_NLIST * 39
+    elif settings.INDEX_TYPE == "sq8":
+        train_size = SQ8_TRAIN_SIZE
     else:
-        index = faiss.IndexFlatIP(new_vectors.shape[1])
-        index.add(new_vectors)
+        train_size = 0
+
+    def flush_pending():
+        nonlocal segment
+        vectors = np.concatenate(pending)
+        pending.clear()
+        service.train(vectors)
+        service.add(vectors)
+        segment = service.index
+
+    with ChunkStoreWriter(store_path, with_embeddings=settings.STORE_EMBEDDINGS) as writer:
+        # Old versions of changed documents go first, so their new chunks stay live
+        deleted = writer.delete_docs(removed + [pdf.name for pdf in changed_pdfs])
+
+        def on_batch(records: List[dict], vectors: np.ndarray):
+            nonlocal service, segment
+            if template is not None:
+                if template.d != vectors.shape[1]:
+                    raise RuntimeError("Embedding dimension mismatch")
+                if segment is None:
+                    segment = faiss.clone_index(template)
+                    segment.reset()
+                segment.add(vectors)
+            else:
+                service = service or _new_index_service(vectors.shape[1])
+                pending.append(vectors)
+                if sum(len(v) for v in pending) >= train_size:
+                    flush_pending()
+
+            # 🔹 Append chunks to the columnar store; vectors live only in FAISS
+            # unless the store keeps a float32 copy for rescoring
+            writer.append(records, vectors)
+            if on_indexed is not None:
+                on_indexed(records, vectors)
 
-    index_path.parent.mkdir(parents=True, exist_ok=True)
-    faiss.write_index(index, str(index_path))
+        stats = {"chunks": 0, "seconds": 0.0}
+        if to_index:
+            stats = run_pipeline(
+                to_index,
+                embedder,
+                on_batch,
+                batch_size=settings.INGEST_BATCH_SIZE,
+                workers=settings.INGEST_WORKERS or None,
+                max_pending_docs=settings.INGEST_MAX_PENDING_DOCS,
+                on_document=(lambda pdf, n: on_document(pdf.name, n)) if on_document else None,
+            )
+        if pending:
+            flush_pending()
 
-    # 🔹 Write metadata ONCE (with embeddings)
-    metadata_path.parent.mkdir(parents=True, exist_ok=True)
-    with metadata_path.open("a", encoding="utf-8") as f:
-        for record, emb in zip(new_metadata, new_vectors):
-            record["embedding"] = emb.tolist()
-            f.write(json.dumps(record) + "\n")
+        # Deletes alone leave the vectors untouched; only the tombstones change
+        version = manifest["version"] + 1 if manifest else 1
+        if segment is not None and segment.ntotal:
+            if len(segments) >= max_segments:
+                segment = merge_indexes(load_segments(index_path, segments) + [segment])
+                segments = []
+            segments.append(write_segment(index_path, segment, version))
+        ntotal = sum(s["ntotal"] for s in segments)
+        if ntotal != writer.count:
+            raise RuntimeError(f"FAISS index ({ntotal}) != chunk store records ({writer.count})")
 
-    indexed_files.update(pdf.name for pdf in new_pdfs)
-    indexed_files_path.write_text(json.dumps(sorted(indexed_files), indent=2))
+        commit_id = prepare_commit(
+            index_path,
+            next_manifest(manifest, version=version, epoch=epoch, segments=segments, files=fingerprints)
+        )
+        writer.commit(commit_id)
+        # Postings for the rows just committed (or the whole store, the first time)
+        update_lexical_index(store_path)
+        finish_commit(index_path, store_path)
+        live = writer.count - writer.n_deleted
 
-    assert index.ntotal == sum(1 for _ in metadata_path.open()), \
-        "FAISS and metadata out of sync"
+    summary = (
+        f"Indexed {len(new_pdfs)} new and {len(changed_pdfs)} changed document(s), "
+        f"removed {len(removed)} ({deleted} chunks tombstoned)."
+    )
+    if not segments:
+        return f"{summary} No text found."
 
-    return f"Indexed {len(new_pdfs)} new document(s). Total chunks: {index.ntotal}"
+    return (
+        f"{summary} Live chunks: {live} "
+        f"({stats['chunks'] / max(stats['seconds'], 1e-9):.0f} chunks/s, "
+        f"{embedder.cache_summary()})"
+    )
@@ -1,17 +1,264 @@
+import math
+import uuid
+from typing import List, Optional
+
 import faiss
 import numpy as np
 from pathlib import Path
 
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "fp16", "sq8")
+# Built up front; the rest depend on the training set size
+_FIXED_LAYOUTS = ("flat", "hnsw", "fp16", "sq8")
+# Vectors sq8 learns its per-dimension ranges from
+SQ8_TRAIN_SIZE = 8192
+
+
+def _pq_subquantizers(dim: int, pq_m: int) -> int:
+    # PQ needs m to divide the dimension; take the largest divisor <= pq_m
+    for m in range(min(pq_m, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def factory_string(
+        index_type: str,
+        dim: int,
+        n_train: int,
+        nlist: int = 1024,
+        pq_m: int = 48,
+        hnsw_m: int = 32,
+) -> str:
+    """
+    faiss.index_factory spec for index_type. nlist and the PQ code size are
+    clamped to what n_train vectors can actually train, so small corpora
+    still produce a usable (if coarse) index.
+    """
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m},Flat"
+    # Exhaustive scalar-quantized scans: 2 bytes or 1 byte per dimension
+    # (sq8 learns a per-dimension range in train())
+    if index_type == "fp16":
+        return "SQfp16"
+    if index_type == "sq8":
+        return "SQ8"
+
+    # faiss wants ~39 training points per centroid
+    nlist = max(1, min(nlist, n_train // 39))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        nbits = max(1, min(8, int(math.log2(max(n_train, 2)))))
+        return f"IVF{nlist},PQ{_pq_subquantizers(dim, pq_m)}x{nbits}"
+
+    raise ValueError(f"Unknown index type: {index_type}. Expected one of {INDEX_TYPES}")
+
+
+def id_filter(keep: np.ndarray):
+    """IDSelector admitting the ids i where keep[i] is True."""
+    bits = np.packbits(keep, bitorder="little")
+    sel = faiss.IDSelectorBitmap(len(keep), faiss.swig_ptr(bits))
+    # The selector only points at the bitmap; keep it alive alongside
+    sel.bits_ref = bits
+    return sel
+
+
+def search_params(index, nprobe: int = None, ef_search: int = None, sel=None):
+    """Per-call search parameters, or None to use the index's own defaults."""
+    if isinstance(index, SegmentedIndex):
+        index = index.base
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and (nprobe is not None or sel is not None):
+        return faiss.SearchParametersIVF(nprobe=nprobe or ivf.nprobe, sel=sel)
+    if isinstance(index, faiss.IndexHNSW) and (ef_search is not None or sel is not None):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or index.hnsw.efSearch, sel=sel)
+    if sel is not None:
+        return faiss.SearchParameters(sel=sel)
+    return None
+
+
+def search_index(index, x: np.ndarray, k: int, nprobe: int = None, ef_search: int = None, keep: np.ndarray = None):
+    """
+    Search a FAISS index or SegmentedIndex. nprobe applies to IVF indexes,
+    ef_search to HNSW; ids where keep is False (deleted chunks) are skipped.
+    """
+    if isinstance(index, SegmentedIndex):
+        return index.search(x, k, nprobe=nprobe, ef_search=ef_search, keep=keep)
+    sel = id_filter(keep) if keep is not None else None
+    return index.search(x, k, params=search_params(index, nprobe, ef_search, sel=sel))
+
+
 class FaissIndexService:
-    def __init__(self,dim:int):
-        self.index=faiss.IndexFlatIP(dim)
+    def __init__(
+            self,
+            dim: int,
+            index_type: str = "flat",
+            nlist: int = 1024,
+            pq_m: int = 48,
+            hnsw_m: int = 32,
+            nprobe: int = 16,
+            ef_search: int = 64,
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}. Expected one of {INDEX_TYPES}")
+
+        self.dim = dim
+        self.index_type = index_type
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+
+        # IVF layouts depend on the training set size, so they are created in train()
+        self.index = None
+        if index_type in _FIXED_LAYOUTS:
+            self.index = self._create(n_train=0)
+
+    def _create(self, n_train: int):
+        spec = factory_string(
+            self.index_type, self.dim, n_train,
+            nlist=self.nlist, pq_m=self.pq_m, hnsw_m=self.hnsw_m,
+        )
+        index = faiss.index_factory(self.dim, spec, faiss.METRIC_INNER_PRODUCT)
+
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = self.ef_search
+        return index
 
-    def add(self,vector:np.ndarray):
+    def train(self, vectors: np.ndarray):
+        if self.index is None:
+            self.index = self._create(n_train=len(vectors))
+        if not self.index.is_trained:
+            self.index.train(vectors)
+        _enable_reconstruct(self.index)
+
+    def add(self, vector: np.ndarray):
+        if self.index is None or not self.index.is_trained:
+            self.train(vector)
         self.index.add(vector)
 
-    def save(self,path:Path):
-        faiss.write_index(self.index,str(path))
+    def save(self, path: Path):
+        faiss.write_index(self.index, str(path))
 
     @staticmethod
-    def load(path:Path):
-        return faiss.read_index(str(path))
\ No newline at end of file
+    def load(path: Path, mmap: bool = False):
+        """
+        Read an index from disk. With mmap the vector and list storage is
+        mapped from the file instead of copied, so processes serving the
+        same file share one copy in the page cache.
+        """
+        if mmap:
+            try:
+                index = faiss.read_index(str(path), faiss.IO_FLAG_MMAP_IFC)
+            except RuntimeError:
+                # Layouts FAISS cannot map are read normally
+                index = faiss.read_index(str(path))
+        else:
+            index = faiss.read_index(str(path))
+        _enable_reconstruct(index)
+        return index
+
+
+def _enable_reconstruct(index):
+    # IVF indexes need a direct map for reconstruct_batch; it is not persisted
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+
+
+class SegmentedIndex:
+    """
+    Read-only view over a base FAISS index plus the segments appended after
+    it (reset clones of the base, so the same layout and training). Ids are
+    global: segment i covers [offsets[i], offsets[i+1]). extend() returns a
+    new view and never mutates the old one, so searches running against
+    the previous view are unaffected.
+    """
+
+    def __init__(self, segments: List):
+        self.segments = tuple(segments)
+        self.offsets = np.cumsum([0] + [seg.ntotal for seg in self.segments])
+        self.d = self.segments[0].d
+        self.ntotal = int(self.offsets[-1])
+
+    @property
+    def base(self):
+        return self.segments[0]
+
+    def extend(self, segments: List) -> "SegmentedIndex":
+        return SegmentedIndex(self.segments + tuple(segments))
+
+    def search(self, x: np.ndarray, k: int, nprobe: int = None, ef_search: int = None, keep: np.ndarray = None):
+        all_scores, all_ids = [], []
+        for i, segment in enumerate(self.segments):
+            if segment.ntotal == 0:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            sel = id_filter(keep[start:end]) if keep is not None else None
+            params = search_params(segment, nprobe, ef_search, sel=sel)
+            scores, ids = segment.search(x, min(k, segment.ntotal), params=params)
+            all_scores.append(scores)
+            all_ids.append(np.where(ids >= 0, ids + self.offsets[i], -1))
+
+        return merge_topk(all_scores, all_ids, k)
+
+    def reconstruct_batch(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        which = np.searchsorted(self.offsets, ids, side="right") - 1
+        out = np.empty((len(ids), self.d), dtype=np.float32)
+        for seg in np.unique(which):
+            mask = which == seg
+            out[mask] = self.segments[seg].reconstruct_batch(ids[mask] - self.offsets[seg])
+        return out
+
+
+def merge_indexes(indexes: List):
+    """
+    Append the vectors of indexes[1:] to indexes[0] (reset clones of it) and
+    return it. Flat, scalar-quantized and IVF layouts move their codes over
+    unchanged; HNSW re-adds the (exactly reconstructed) vectors.
+    """
+    merged = indexes[0]
+    for other in indexes[1:]:
+        if isinstance(merged, faiss.IndexHNSW):
+            merged.add(other.reconstruct_n(0, other.ntotal))
+            continue
+        ivf = faiss.try_extract_index_ivf(merged)
+        if ivf is None:
+            merged.merge_from(other)
+            continue
+        # IVF merges refuse indexes carrying a direct map; it is rebuilt below
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+        faiss.extract_index_ivf(other).set_direct_map_type(faiss.DirectMap.NoMap)
+        merged.merge_from(other, merged.ntotal)
+    _enable_reconstruct(merged)
+    return merged
+
+
+def merge_topk(all_scores: List[np.ndarray], all_ids: List[np.ndarray], k: int):
+    """
+    Merge per-part (scores, global ids) results into one (B, k) top-k,
+    padded with -1 ids like a FAISS search.
+    """
+    scores = np.concatenate(all_scores, axis=1)
+    ids = np.concatenate(all_ids, axis=1)
+    scores[ids < 0] = -np.inf
+
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    scores = np.take_along_axis(scores, order, axis=1)
+    ids = np.take_along_axis(ids, order, axis=1)
+    if ids.shape[1] < k:
+        pad = k - ids.shape[1]
+        scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+        ids = np.pad(ids, ((0, 0), (0, pad)), constant_values=-1)
+    return scores, ids
+
+
+def new_epoch() -> str:
+    return uuid.uuid4().hex
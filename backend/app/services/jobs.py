@@ -0,0 +1,117 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from backend.app.core.logger import logger
+
+
+@dataclass
+class IndexingJob:
+    id: str
+    kind: str = "index"             # index | compact
+    status: str = "queued"          # queued | running | succeeded | failed
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    documents: Dict[str, dict] = field(default_factory=dict)
+    chunks_indexed: int = 0
+    message: Optional[str] = None
+    error: Optional[str] = None
+
+    # Progress hooks handed to index_new_pdfs
+
+    def on_start(self, names: List[str]):
+        for name in names:
+            self.documents[name] = {"status": "pending", "chunks": 0, "indexed": 0}
+
+    def on_document(self, name: str, n_chunks: int):
+        doc = self.documents.setdefault(name, {"status": "pending", "chunks": 0, "indexed": 0})
+        doc["status"] = "parsed" if n_chunks else "indexed"
+        doc["chunks"] = n_chunks
+
+    def on_deleted(self, names: List[str]):
+        for name in names:
+            self.documents[name] = {"status": "deleted", "chunks": 0, "indexed": 0}
+
+    def on_indexed(self, records: List[dict]):
+        for r in records:
+            doc = self.documents[r["doc_id"]]
+            doc["indexed"] += 1
+            if doc["indexed"] >= doc["chunks"]:
+                doc["status"] = "indexed"
+        self.chunks_indexed += len(records)
+
+    def to_dict(self) -> dict:
+        end = self.finished or time.time()
+        elapsed = end - self.started if self.started else 0.0
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "message": self.message,
+            "error": self.error,
+            "elapsed_s": round(elapsed, 2),
+            "chunks_indexed": self.chunks_indexed,
+            "chunks_per_s": round(self.chunks_indexed / elapsed, 1) if elapsed else 0.0,
+            "documents": self.documents,
+        }
+
+
+class IndexingJobManager:
+    """
+    Runs indexing jobs one at a time on a single background thread, so
+    there is never more than one writer. `runners` maps each job kind to
+    the function that runs it. Submitting while a job of the same kind is
+    still queued returns that job instead of queuing a duplicate.
+    """
+
+    def __init__(self, runners: Dict[str, Callable[[IndexingJob], str]], max_history: int = 50):
+        self._runners = runners
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indexer")
+        self._jobs: "OrderedDict[str, IndexingJob]" = OrderedDict()
+        self._max_history = max_history
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str = "index") -> IndexingJob:
+        if kind not in self._runners:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind == kind and job.status == "queued":
+                    return job
+
+            job = IndexingJob(id=uuid.uuid4().hex, kind=kind)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._max_history:
+                oldest = next(iter(self._jobs))
+                if self._jobs[oldest].status in ("queued", "running"):
+                    break
+                self._jobs.pop(oldest)
+
+        self._pool.submit(self._execute, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IndexingJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[IndexingJob]:
+        return list(self._jobs.values())
+
+    def _execute(self, job: IndexingJob):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            job.message = self._runners[job.kind](job)
+            job.status = "succeeded"
+        except Exception as e:
+            logger.error("Indexing job %s failed:\n%s", job.id, traceback.format_exc())
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
@@ -0,0 +1,326 @@
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from backend.app.services.chunk_store import ChunkStore
+
+# Lives inside the chunk store directory: postings hold store row ids, so
+# the two are rewritten together by compaction
+LEXICAL_DIR = "lexical"
+
+META_FILE = "meta.json"
+DOC_LENS_FILE = "doc_lens.i32"
+TERMS_FILE = "terms.i64"
+TERM_OFFSETS_FILE = "term_offsets.i64"
+ROWS_FILE = "rows.i32"
+TFS_FILE = "tfs.u16"
+
+FORMAT_VERSION = 1
+
+# Okapi BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in into is it its of on or "
+    "that the their there these this to was were which with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _term_ids(terms: Iterable[str], cache: Dict[str, int]) -> List[int]:
+    # Terms are stored as 64-bit hashes, so no vocabulary has to be loaded
+    ids = []
+    for t in terms:
+        h = cache.get(t)
+        if h is None:
+            h = int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+            cache[t] = h
+        ids.append(h)
+    return ids
+
+
+def _open_column(path: Path, dtype, count: int) -> np.ndarray:
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+class _Segment:
+    def __init__(self, path: Path):
+        n_terms = (path / TERMS_FILE).stat().st_size // 8
+        n_postings = (path / ROWS_FILE).stat().st_size // 4
+        self.terms = _open_column(path / TERMS_FILE, np.int64, n_terms)
+        self.offsets = np.fromfile(path / TERM_OFFSETS_FILE, dtype=np.int64)
+        self.rows = _open_column(path / ROWS_FILE, np.int32, n_postings)
+        self.tfs = _open_column(path / TFS_FILE, np.uint16, n_postings)
+
+    def postings(self, term: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        i = int(np.searchsorted(self.terms, term))
+        if i == len(self.terms) or self.terms[i] != term:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.rows[start:end], self.tfs[start:end]
+
+
+def _write_segment(path: Path, terms: np.ndarray, rows: np.ndarray, tfs: np.ndarray):
+    # Postings sorted by term, then row; one offsets entry per distinct term
+    order = np.lexsort((rows, terms))
+    terms, rows, tfs = terms[order], rows[order], tfs[order]
+    uniq, starts = np.unique(terms, return_index=True)
+    path.mkdir(parents=True)
+    uniq.astype(np.int64).tofile(path / TERMS_FILE)
+    np.append(starts, len(terms)).astype(np.int64).tofile(path / TERM_OFFSETS_FILE)
+    rows.astype(np.int32).tofile(path / ROWS_FILE)
+    tfs.astype(np.uint16).tofile(path / TFS_FILE)
+
+
+class BM25Stats(NamedTuple):
+    """Collection statistics BM25 scores with; term ids are the 64-bit term hashes."""
+    count: int
+    avgdl: float
+    doc_freqs: Dict[int, int]
+
+
+class LexicalIndex:
+    """
+    Read-only BM25 inverted index over the rows of a chunk store.
+
+    Layout of an index directory:
+        meta.json          covered row count, total token count, segment list
+        doc_lens.i32       tokens per row
+        seg_NNNNNN/        one immutable segment per commit:
+            terms.i64          sorted 64-bit term hashes
+            term_offsets.i64   len(terms) + 1 offsets into the postings
+            rows.i32           postings: store row ids, ascending per term
+            tfs.u16            term frequency of each posting
+
+    Everything is memory-mapped; a lookup is one binary search per
+    segment. Tombstoned rows keep their postings (and count towards the
+    document frequencies) until compaction; search() drops them via keep.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        meta = json.loads((path / META_FILE).read_text(encoding="utf-8"))
+        self.count: int = meta["count"]
+        self.total_len: int = meta["total_len"]
+        self.doc_lens = _open_column(path / DOC_LENS_FILE, np.int32, self.count)
+        self.segments = [_Segment(path / s["name"]) for s in meta["segments"]]
+        self.avgdl = self.total_len / self.count if self.count else 0.0
+        self._term_cache: Dict[str, int] = {}
+
+    @staticmethod
+    def exists(path: Path) -> bool:
+        return (path / META_FILE).exists()
+
+    @classmethod
+    def for_store(cls, store_path: Path) -> Optional["LexicalIndex"]:
+        path = store_path / LEXICAL_DIR
+        return cls(path) if cls.exists(path) else None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def term_ids(self, query: str) -> List[int]:
+        return _term_ids(set(tokenize(query)), self._term_cache)
+
+    def _postings(self, term: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        return [p for p in (seg.postings(term) for seg in self.segments) if p is not None]
+
+    def doc_freqs(self, terms: Iterable[int]) -> Dict[int, int]:
+        return {term: sum(len(r) for r, _ in self._postings(term)) for term in terms}
+
+    def search(
+            self,
+            query: str,
+            k: int,
+            keep: np.ndarray = None,
+            stats: Optional[BM25Stats] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 top k as (row ids, scores), best first. keep masks out deleted
+        rows. stats replaces this index's own collection statistics, so
+        indexes over parts of a corpus score like one index over all of it.
+        """
+        terms = self.term_ids(query)
+        count, avgdl = (stats.count, stats.avgdl) if stats is not None else (self.count, self.avgdl)
+        rows, contribs = [], []
+        for term in terms:
+            postings = self._postings(term)
+            if not postings:
+                continue
+            df = stats.doc_freqs[term] if stats is not None else sum(len(r) for r, _ in postings)
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for r, tf in postings:
+                tf = tf.astype(np.float32)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens[r] / avgdl)
+                rows.append(r)
+                contribs.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        uniq, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contribs)).astype(np.float32)
+        if keep is not None:
+            live = uniq < len(keep)
+            live[live] = keep[uniq[live]]
+            uniq, scores = uniq[live], scores[live]
+
+        if len(uniq) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            uniq, scores = uniq[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return uniq[order].astype(np.int64), scores[order]
+
+    def search_batch(self, queries: List[str], k: int, keep: np.ndarray = None) -> List[List[int]]:
+        return [self.search(q, k, keep)[0].tolist() for q in queries]
+
+
+class LexicalIndexWriter:
+    """
+    Append-only writer for a LexicalIndex directory.
+
+    Rows must be appended in store order. Appended postings are buffered
+    and written as a new segment on commit() (or once max_buffered
+    postings have piled up); meta.json is replaced last, so readers never
+    see a partial segment. Past max_segments, commit() merges all segments
+    into one. Doc lengths or segments past the committed meta (a crashed
+    run) are dropped when the writer is opened.
+    """
+
+    def __init__(self, path: Path, max_segments: int = 8, max_buffered: int = 1 << 24):
+        self.path = path
+        self.max_segments = max_segments
+        self.max_buffered = max_buffered
+        path.mkdir(parents=True, exist_ok=True)
+
+        meta = {"version": FORMAT_VERSION, "count": 0, "total_len": 0, "segments": [], "next_segment": 0}
+        if LexicalIndex.exists(path):
+            meta = json.loads((path / META_FILE).read_text(encoding="utf-8"))
+        self.count: int = meta["count"]
+        self.total_len: int = meta["total_len"]
+        self.segments: List[dict] = meta["segments"]
+        self._next_segment: int = meta["next_segment"]
+
+        lens_path = path / DOC_LENS_FILE
+        if not lens_path.exists():
+            lens_path.touch()
+        if lens_path.stat().st_size > self.count * 4:
+            os.truncate(lens_path, self.count * 4)
+
+        committed = {s["name"] for s in self.segments}
+        for seg in path.glob("seg_*"):
+            if seg.name not in committed:
+                shutil.rmtree(seg)
+
+        self._term_cache: Dict[str, int] = {}
+        self._terms: List[np.ndarray] = []
+        self._rows: List[np.ndarray] = []
+        self._tfs: List[np.ndarray] = []
+        self._lens: List[int] = []
+        self._buffered = 0
+
+    def append(self, texts: List[str]):
+        for text in texts:
+            counts = Counter(tokenize(text))
+            row = self.count + len(self._lens)
+            self._terms.append(np.array(_term_ids(counts.keys(), self._term_cache), dtype=np.int64))
+            self._rows.append(np.full(len(counts), row, dtype=np.int32))
+            self._tfs.append(np.minimum(np.fromiter(counts.values(), dtype=np.int64, count=len(counts)), 65535))
+            self._lens.append(sum(counts.values()))
+            self._buffered += len(counts)
+        if self._buffered >= self.max_buffered:
+            self._flush()
+
+    def _new_segment(self) -> str:
+        name = f"seg_{self._next_segment:06d}"
+        self._next_segment += 1
+        return name
+
+    def _flush(self):
+        if not self._lens:
+            return
+        name = self._new_segment()
+        if self._buffered:
+            _write_segment(
+                self.path / name,
+                np.concatenate(self._terms),
+                np.concatenate(self._rows),
+                np.concatenate(self._tfs),
+            )
+            self.segments.append({"name": name, "start": self.count, "count": len(self._lens)})
+
+        with (self.path / DOC_LENS_FILE).open("ab") as f:
+            f.write(np.array(self._lens, dtype=np.int32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self.count += len(self._lens)
+        self.total_len += sum(self._lens)
+        self._terms, self._rows, self._tfs, self._lens = [], [], [], []
+        self._buffered = 0
+
+    def _merge(self) -> List[str]:
+        # Concatenating in row order keeps each term's postings ascending
+        # after the stable re-sort in _write_segment
+        terms, rows, tfs = [], [], []
+        for s in self.segments:
+            seg = _Segment(self.path / s["name"])
+            terms.append(np.repeat(np.asarray(seg.terms), np.diff(seg.offsets)))
+            rows.append(np.asarray(seg.rows))
+            tfs.append(np.asarray(seg.tfs))
+        name = self._new_segment()
+        _write_segment(self.path / name, np.concatenate(terms), np.concatenate(rows), np.concatenate(tfs))
+
+        old = [s["name"] for s in self.segments]
+        self.segments = [{"name": name, "start": 0, "count": self.count}]
+        return old
+
+    def commit(self):
+        self._flush()
+        obsolete = self._merge() if len(self.segments) > self.max_segments else []
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "count": self.count,
+            "total_len": self.total_len,
+            "segments": self.segments,
+            "next_segment": self._next_segment,
+        }
+        tmp = self.path / (META_FILE + ".tmp")
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, self.path / META_FILE)
+
+        # Open readers keep their memory maps of merged-away segments
+        for name in obsolete:
+            shutil.rmtree(self.path / name, ignore_errors=True)
+
+
+def update_lexical_index(store_path: Path, batch_size: int = 4096) -> int:
+    """
+    Index every chunk store row the lexical index does not cover yet and
+    return how many were added. Builds the index from scratch for a store
+    that has none, and catches up after a crash between the two commits.
+    """
+    store = ChunkStore(store_path)
+    writer = LexicalIndexWriter(store_path / LEXICAL_DIR)
+    start = writer.count
+    if start > len(store):
+        raise RuntimeError(f"Lexical index ({start}) is ahead of the chunk store ({len(store)})")
+    for batch in range(start, len(store), batch_size):
+        writer.append([store.text(i) for i in range(batch, min(batch + batch_size, len(store)))])
+    writer.commit()
+    return len(store) - start
@@ -0,0 +1,259 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional
+
+import faiss
+
+from backend.app.core.logger import logger
+from backend.app.services.chunk_store import ChunkStore, fsync_path, read_meta
+from backend.app.services.index import FaissIndexService, SegmentedIndex, new_epoch
+from backend.app.services.lexical_index import update_lexical_index
+
+FORMAT_VERSION = 1
+
+# The manifest of data/faiss/index.faiss is data/faiss/index.manifest.json:
+#   version   bumped by every commit
+#   epoch     kept while row ids stay put (appends, segment merges); a new
+#             or compacted index gets a new one
+#   segments  [{file, ntotal}] in row order; immutable once written
+#   ntotal    sum over the segments
+#   store     chunk store commit the segments belong to: {commit, count,
+#             deleted, deleted_file}, or None to read the store as it is
+#   files     fingerprints of the indexed documents (None: not tracked)
+
+
+def manifest_path(index_path: Path) -> Path:
+    return index_path.with_name(index_path.stem + ".manifest.json")
+
+
+def _pending_path(index_path: Path) -> Path:
+    return index_path.with_name(index_path.stem + ".manifest.pending.json")
+
+
+def _legacy_state_path(index_path: Path) -> Path:
+    return index_path.with_name(index_path.stem + ".state.json")
+
+
+def _aside_path(store_path: Path) -> Path:
+    return store_path.with_name(store_path.name + ".old")
+
+
+def _write_json(path: Path, data: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    fsync_path(tmp)
+    os.replace(tmp, path)
+    fsync_path(path.parent)
+
+
+def read_manifest(index_path: Path) -> Optional[dict]:
+    """
+    The last committed manifest of the index at index_path, or None if
+    there is no index. An index written before manifests existed (a lone
+    index.faiss, maybe with an {epoch, ntotal} index.state.json) is
+    described as a single segment; its epoch is only trusted if the state
+    file matches the index.
+    """
+    path = manifest_path(index_path)
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    if not index_path.exists():
+        return None
+
+    ntotal = FaissIndexService.load(index_path, mmap=True).ntotal
+    state_path = _legacy_state_path(index_path)
+    state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+    return {
+        "format": FORMAT_VERSION,
+        "version": 0,
+        "epoch": state.get("epoch") if state.get("ntotal") == ntotal else None,
+        "segments": [{"file": index_path.name, "ntotal": ntotal}],
+        "ntotal": ntotal,
+        "store": None,
+        "files": None,
+    }
+
+
+def next_manifest(previous: Optional[dict], **changes) -> dict:
+    """The manifest following previous (None for the first), with changes applied."""
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": previous["version"] + 1 if previous else 1,
+        "epoch": previous["epoch"] if previous and previous["epoch"] else new_epoch(),
+        "segments": list(previous["segments"]) if previous else [],
+        "store": previous["store"] if previous else None,
+        "files": previous["files"] if previous else None,
+    }
+    manifest.update(changes)
+    manifest["ntotal"] = sum(segment["ntotal"] for segment in manifest["segments"])
+    return manifest
+
+
+def write_manifest(index_path: Path, manifest: dict):
+    """Commit manifest (an atomic rename) and delete the files it no longer references."""
+    _write_json(manifest_path(index_path), manifest)
+    collect_garbage(index_path, manifest)
+
+
+def write_index_state(index_path: Path, epoch: str, ntotal: int):
+    """
+    Commit a manifest for an index written in one piece to index_path
+    (offline builds and benchmarks). The chunk store is read as it is;
+    document fingerprints from the previous manifest are kept.
+    """
+    previous = read_manifest(index_path) if manifest_path(index_path).exists() else None
+    write_manifest(index_path, next_manifest(
+        previous,
+        epoch=epoch,
+        segments=[{"file": index_path.name, "ntotal": ntotal}],
+        store=None,
+    ))
+
+
+def write_segment(index_path: Path, index, version: int) -> dict:
+    """Write index as the immutable segment file of manifest version `version`."""
+    name = f"{index_path.stem}.{version:06d}.faiss"
+    path = index_path.with_name(name)
+    tmp = path.with_name(name + ".tmp")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    faiss.write_index(index, str(tmp))
+    fsync_path(tmp)
+    os.replace(tmp, path)
+    return {"file": name, "ntotal": int(index.ntotal)}
+
+
+def load_segments(index_path: Path, segments: List[dict], mmap: bool = False) -> List:
+    indexes = []
+    for segment in segments:
+        index = FaissIndexService.load(index_path.with_name(segment["file"]), mmap=mmap)
+        if index.ntotal != segment["ntotal"]:
+            raise RuntimeError(f"{segment['file']} holds {index.ntotal} vectors, the manifest says {segment['ntotal']}")
+        indexes.append(index)
+    return indexes
+
+
+def load_index(index_path: Path, manifest: dict, mmap: bool = False):
+    """The manifest's segments as one index (a SegmentedIndex if there are several)."""
+    indexes = load_segments(index_path, manifest["segments"], mmap=mmap)
+    if not indexes:
+        raise RuntimeError(f"Index manifest version {manifest['version']} has no segments")
+    return indexes[0] if len(indexes) == 1 else SegmentedIndex(indexes)
+
+
+def open_store(store_path: Path, manifest: Optional[dict]) -> ChunkStore:
+    """The chunk store as of the manifest's commit (rows appended since are hidden)."""
+    state = manifest.get("store") if manifest else None
+    if not state:
+        return ChunkStore(store_path)
+    return ChunkStore(store_path, count=state["count"], deleted_file=state["deleted_file"])
+
+
+def prepare_commit(index_path: Path, manifest: dict) -> str:
+    """
+    Write manifest ahead of a chunk store commit. It is kept as the pending
+    manifest together with a fresh store commit id, which the caller passes
+    to ChunkStoreWriter.commit(); finish_commit() then makes it current.
+    Every file the manifest names must already be on disk.
+    """
+    commit_id = new_epoch()
+    _write_json(_pending_path(index_path), dict(manifest, store={"commit": commit_id}))
+    return commit_id
+
+
+def finish_commit(index_path: Path, store_path: Path) -> dict:
+    """Commit the pending manifest, pinned to the chunk store commit it announced."""
+    pending_path = _pending_path(index_path)
+    manifest = json.loads(pending_path.read_text(encoding="utf-8"))
+    meta = read_meta(store_path)
+    if meta.get("commit") != manifest["store"]["commit"]:
+        raise RuntimeError(f"Chunk store {store_path} is not at commit {manifest['store']['commit']}")
+    if meta["count"] != manifest["ntotal"]:
+        raise RuntimeError(f"FAISS index ({manifest['ntotal']}) != chunk store records ({meta['count']})")
+
+    manifest["store"] = {
+        "commit": meta["commit"],
+        "count": meta["count"],
+        "deleted": meta.get("deleted", 0),
+        "deleted_file": meta.get("deleted_file"),
+    }
+    write_manifest(index_path, manifest)
+    pending_path.unlink()
+    shutil.rmtree(_aside_path(store_path), ignore_errors=True)
+    return manifest
+
+
+def swap_in_store(store_path: Path, new_store_path: Path):
+    """
+    Replace the chunk store at store_path with the one at new_store_path.
+    The old store is moved aside until the next commit finishes; readers
+    with open memory maps keep its files.
+    """
+    aside = _aside_path(store_path)
+    if aside.exists():
+        shutil.rmtree(aside)
+    store_path.rename(aside)
+    new_store_path.rename(store_path)
+
+
+def _restore_store(store_path: Path, commit_id: str):
+    # A swap_in_store() cut short between its two renames: move in the new
+    # store if it is the one the pending manifest expects, else the old one
+    if store_path.exists():
+        return
+    for candidate in sorted(store_path.parent.glob(store_path.name + ".*")):
+        if ChunkStore.exists(candidate) and read_meta(candidate).get("commit") == commit_id:
+            candidate.rename(store_path)
+            return
+    aside = _aside_path(store_path)
+    if ChunkStore.exists(aside):
+        aside.rename(store_path)
+
+
+def recover(index_path: Path, store_path: Path) -> Optional[dict]:
+    """
+    Settle a commit that was cut short, then return the current manifest.
+
+    If the chunk store reached the commit the pending manifest announced,
+    the rest of the commit is redone (BM25 catch-up, manifest rename);
+    otherwise the pending manifest is dropped and the store's uncommitted
+    rows are truncated by the next writer. Nothing committed is rebuilt:
+    a rolled-back run's documents are simply indexed again, with their
+    vectors served from the embedding cache. Segment files no manifest
+    references are deleted.
+    """
+    pending_path = _pending_path(index_path)
+    if pending_path.exists():
+        pending = json.loads(pending_path.read_text(encoding="utf-8"))
+        commit_id = pending["store"]["commit"]
+        _restore_store(store_path, commit_id)
+        if ChunkStore.exists(store_path) and read_meta(store_path).get("commit") == commit_id:
+            logger.warning("Completing interrupted index commit (manifest version %d)", pending["version"])
+            update_lexical_index(store_path)
+            finish_commit(index_path, store_path)
+        else:
+            logger.warning("Rolling back interrupted index commit (manifest version %d)", pending["version"])
+            pending_path.unlink()
+
+    manifest = read_manifest(index_path)
+    if manifest is not None and manifest_path(index_path).exists():
+        collect_garbage(index_path, manifest)
+    return manifest
+
+
+def collect_garbage(index_path: Path, manifest: dict):
+    """Delete segment files (and leftovers) that manifest does not reference."""
+    keep = {segment["file"] for segment in manifest["segments"]}
+    candidates = list(index_path.parent.glob(f"{index_path.stem}.*.faiss*"))
+    candidates += [index_path, _legacy_state_path(index_path), manifest_path(index_path).with_suffix(".json.tmp")]
+    for path in candidates:
+        if path.name not in keep and path.exists():
+            path.unlink()
+
+
+def drop_index(index_path: Path):
+    """Delete the index at index_path: manifests, segments and legacy files."""
+    for path in [manifest_path(index_path), _pending_path(index_path)]:
+        path.unlink(missing_ok=True)
+    collect_garbage(index_path, {"segments": []})
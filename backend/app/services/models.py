@@ -0,0 +1,110 @@
+import threading
+import time
+from typing import Dict, Tuple
+
+from backend.app.config import settings
+from backend.app.core.logger import logger
+
+BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+
+# Quantized exports published in the sentence-transformers / cross-encoder
+# hub repos; AVX2 runs on any recent x86 CPU
+_ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx_int8": "onnx/model_qint8_avx2.onnx",
+}
+
+# One copy of each model per process, shared by retrieval and indexing.
+# sentence_transformers (and torch) are imported on first use, not at app import.
+_models: Dict[Tuple[str, str, str], object] = {}
+_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def _get(kind: str, name: str, backend: str, factory):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}. Expected one of {BACKENDS}")
+
+    key = (kind, name, backend)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    # Per-model lock: concurrent callers wait for a single load, while a
+    # different model can load at the same time
+    with lock:
+        model = _models.get(key)
+        if model is None:
+            start = time.perf_counter()
+            model = factory(name, backend)
+            _models[key] = model
+            logger.info("Loaded %s model %s (%s) in %.2fs", kind, name, backend, time.perf_counter() - start)
+    return model
+
+
+def _backend_kwargs(backend: str, onnx_file: str = None) -> dict:
+    threads = settings.INFERENCE_THREADS
+    if not backend.startswith("onnx"):
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        return {}
+
+    # Needs the onnx extra: pip install "sentence-transformers[onnx]"
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    if threads > 0:
+        options.intra_op_num_threads = threads
+    return {
+        "backend": "onnx",
+        "model_kwargs": {
+            "file_name": onnx_file or _ONNX_FILES[backend],
+            "provider": "CPUExecutionProvider",
+            "session_options": options,
+        },
+    }
+
+
+def _quantize_int8(module):
+    # Dynamic int8 quantization of the Linear layers; weights are quantized
+    # once here, activations per batch
+    import torch
+    torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _sentence_transformer(name: str, backend: str):
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(name, device="cpu" if backend != "torch" else None,
+                                **_backend_kwargs(backend, settings.EMBEDDING_ONNX_FILE))
+    if backend == "torch_int8":
+        _quantize_int8(model)
+    return model
+
+
+def _cross_encoder(name: str, backend: str):
+    from sentence_transformers import CrossEncoder
+    model = CrossEncoder(name, device="cpu" if backend != "torch" else None,
+                         **_backend_kwargs(backend, settings.RERANKER_ONNX_FILE))
+    if backend == "torch_int8":
+        _quantize_int8(model.model)
+    return model
+
+
+def get_embedder(name: str = None, backend: str = None):
+    return _get("embedder", name or settings.EMBEDDING_MODEL, backend or settings.INFERENCE_BACKEND, _sentence_transformer)
+
+
+def get_reranker(name: str = None, backend: str = None):
+    return _get("reranker", name or settings.RERANKER_MODEL, backend or settings.INFERENCE_BACKEND, _cross_encoder)
+
+
+def warm_up():
+    """Load the default models and run one tiny inference so the first request does not pay for it."""
+    get_embedder().encode(["warm up"], convert_to_numpy=True)
+    get_reranker().predict([("warm up", "warm up")])
+
+
+def loaded_models() -> list:
+    return [f"{kind}:{name}:{backend}" for kind, name, backend in _models]
@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from backend.app.config import settings
+from backend.app.services.embeddings import EmbeddingsService
+from backend.app.services.ingestion import extract_from_pdf
+from backend.app.utils.chunking import chunk_pages
+
+_DONE = object()
+
+
+def parse_pdf(pdf_path: Path) -> List[dict]:
+    """Extract and chunk one PDF. Runs inside a worker process."""
+    chunks = chunk_pages(
+        extract_from_pdf(pdf_path),
+        chunksize=settings.CHUNK_SIZE,
+        overlap=settings.CHUNK_OVERLAP,
+        across_pages=settings.CHUNK_ACROSS_PAGES,
+        sentence_aware=settings.CHUNK_SENTENCE_AWARE,
+    )
+    return [
+        {
+            "doc_id": pdf_path.name,
+            "page": chunk["page"],
+            "page_end": chunk["page_end"],
+            "chunk_id": chunk_id,
+            "text": chunk["text"],
+        }
+        for chunk_id, chunk in enumerate(chunks)
+    ]
+
+
+def iter_parsed_pdfs(
+        pdfs: Iterable[Path],
+        workers: Optional[int] = None,
+        max_pending: int = 8,
+) -> Iterator[Tuple[Path, List[dict]]]:
+    """
+    Parse PDFs in a process pool, yielding (pdf, records) in input order.
+    At most max_pending documents are parsed ahead of the consumer.
+    """
+    pdfs = iter(pdfs)
+    # spawn: the API runs this from a job thread of a process that already
+    # runs FAISS/torch, batcher and executor threads; forking it can deadlock
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=ctx) as pool:
+        pending = deque()
+        for pdf in pdfs:
+            pending.append((pdf, pool.submit(parse_pdf, pdf)))
+            if len(pending) >= max_pending:
+                break
+
+        while pending:
+            pdf, future = pending.popleft()
+            nxt = next(pdfs, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(parse_pdf, nxt)))
+            yield pdf, future.result()
+
+
+def run_pipeline(
+        pdfs: List[Path],
+        embedder: EmbeddingsService,
+        on_batch: Callable[[List[dict], np.ndarray], None],
+        batch_size: int = 256,
+        workers: Optional[int] = None,
+        max_pending_docs: int = 8,
+        on_document: Callable[[Path, int], None] = None,
+) -> dict:
+    """
+    Staged ingestion: a process pool parses and chunks PDFs, a bounded queue
+    hands parsed documents to the caller's thread, which embeds them in
+    fixed-size batches and passes each (records, normalised vectors) batch
+    to on_batch. Peak memory is bounded by batch_size and max_pending_docs,
+    not by the number or size of the PDFs.
+    """
+    docs: "queue.Queue" = queue.Queue(maxsize=max_pending_docs)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Give up instead of blocking forever if the consumer has failed
+        while not stop.is_set():
+            try:
+                docs.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for pdf, records in iter_parsed_pdfs(pdfs, workers=workers, max_pending=max_pending_docs):
+                if not put((pdf, records)):
+                    return
+        except BaseException as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, name="pdf-parser", daemon=True)
+    producer.start()
+
+    stats = {"documents": 0, "chunks": 0, "batches": 0}
+    start = time.perf_counter()
+    buffer: List[dict] = []
+
+    def emit(batch: List[dict]):
+        vectors = embedder.embed_text([r["text"] for r in batch], show_progress=False).astype("float32")
+        faiss.normalize_L2(vectors)
+        on_batch(batch, vectors)
+        stats["chunks"] += len(batch)
+        stats["batches"] += 1
+
+    try:
+        while True:
+            item = docs.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+
+            pdf, records = item
+            stats["documents"] += 1
+            if on_document is not None:
+                on_document(pdf, len(records))
+
+            buffer.extend(records)
+            while len(buffer) >= batch_size:
+                emit(buffer[:batch_size])
+                buffer = buffer[batch_size:]
+
+        if buffer:
+            emit(buffer)
+    finally:
+        stop.set()
+        producer.join()
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
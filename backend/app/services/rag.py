@@ -1,25 +1,69 @@
+import asyncio
 import os
+import random
 import time
 from pathlib import Path
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
+import httpx
 from google import genai
 from google.genai.errors import ServerError
 
 PROJECT_ROOT=Path(__file__).resolve().parents[3]
 
+from backend.app.core.logger import logger
+from backend.app.core.metrics import PROMPT_TOKENS, span
+from backend.app.services.context import assemble_context, count_tokens
 from backend.app.services.retrieval import Retrievar
+from backend.app.services.batching import QueryBatcher
+from backend.app.services.concurrency import BoundedExecutor
+from backend.app.services.answer_cache import SemanticAnswerCache
+
+NO_RESULTS_MESSAGE = "No relevant information found in the documents."
+OVERLOADED_MESSAGE = (
+    "The language model is temporarily overloaded. "
+    "Please try again in a few moments."
+)
+TRUNCATED_MESSAGE = "\n\n[Answer truncated: the language model stopped responding.]"
+GENERATION_CONFIG = {
+    "temperature": 0.1,
+    "max_output_tokens": 1024
+}
 
 class RAGService:
     def __init__(
             self,
             retriever: Retrievar,
             prompt_path: Path,
-            model:str="gemini-2.5-flash"
+            model:str="gemini-2.5-flash",
+            batcher: QueryBatcher = None,
+            executor: BoundedExecutor = None,
+            llm_base_url: Optional[str] = None,
+            llm_timeout_s: float = 30.0,
+            llm_stream_idle_s: float = 15.0,
+            llm_max_retries: int = 3,
+            llm_backoff_s: float = 0.5,
+            cache: SemanticAnswerCache = None,
+            context_max_tokens: Optional[int] = None,
+            context_merge: bool = True
     ):
         self.retriever = retriever
+        # When set, single-question retrieval is coalesced with concurrent requests
+        self.batcher = batcher
+        # Sized pool for CPU-bound retrieval on the async path (used when there is no batcher)
+        self.executor = executor
         self.prompt_template=prompt_path.read_text(encoding="utf-8")
-        self.client = genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+        http_options = {"base_url": llm_base_url} if llm_base_url else None
+        self.client = genai.Client(api_key=os.environ["GEMINI_API_KEY"], http_options=http_options)
         self.model_name=model
+        self.llm_timeout_s = llm_timeout_s
+        self.llm_stream_idle_s = llm_stream_idle_s
+        self.llm_max_retries = llm_max_retries
+        self.llm_backoff_s = llm_backoff_s
+        self.cache = cache
+        # Token budget for the retrieved context (None = everything retrieved),
+        # and whether adjacent chunks are merged with their overlap removed
+        self.context_max_tokens = context_max_tokens
+        self.context_merge = context_merge
 
     def _build_prompt(self, context: str, question: str) -> str:
         return f"""
@@ -36,47 +80,306 @@ class RAGService:
     Answer (with citations):
     """
 
-    def _build_context(self,res:List[dict])->str:
-        context=[]
-        for r in res:
-            block=(
-                f"[Source: {r['doc_id']} | page {r['page']}]\n"
-                f"{r.get('text', '')}"
-            )
-            context.append(block)
+    @staticmethod
+    def _sources(results: List[dict]) -> List[dict]:
+        return [
+            {
+                "doc_id": r["doc_id"],
+                "page": r["page"],
+                "page_end": r.get("page_end", r["page"]),
+                "chunk_id": r["chunk_id"]
+            }
+            for r in results
+        ]
+
+    async def _run_cpu(self, fn, *args, **kwargs):
+        if self.executor is not None:
+            return await asyncio.wrap_future(self.executor.submit(fn, *args, **kwargs))
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def _retrieve(self, question: str, top_k: int, query_vec=None) -> List[dict]:
+        if self.batcher is not None:
+            return self.batcher.search(question, query_vec=query_vec, top_k=top_k)
+        return self.retriever.search(question, top_k=top_k, query_vec=query_vec)
+
+    async def _retrieve_async(self, question: str, top_k: int, query_vec=None) -> List[dict]:
+        if self.batcher is not None:
+            future = self.batcher.submit(question, query_vec=query_vec, top_k=top_k)
+            return await asyncio.wrap_future(future)
+        return await self._run_cpu(self.retriever.search, question, top_k=top_k, query_vec=query_vec)
+
+    def _cache_enabled(self) -> bool:
+        return self.cache is not None and self.retriever.idx is not None
 
-        return "\n\n".join(context)
+    def _cache_get(self, query_vec, top_k: int, generation: int):
+        if query_vec is None:
+            return None
+        return self.cache.get(query_vec, top_k, generation=generation)
+
+    def _cache_put(
+            self, query_vec, question: str, top_k: int, answer: str, results: List[dict], start: float, generation: int
+    ):
+        # Only real answers are worth replaying; failures, empty retrievals and
+        # responses without text (response.text is None, e.g. a safety block) are not
+        if (
+            query_vec is None or not results or not answer
+            or answer == OVERLOADED_MESSAGE or answer.endswith(TRUNCATED_MESSAGE)
+        ):
+            return
+        # `generation` was read before retrieval; if the corpus was reloaded
+        # while the LLM was answering, the answer is built from the old one
+        if generation != self.retriever.generation:
+            return
+        self.cache.put(
+            query_vec,
+            question,
+            top_k,
+            answer,
+            self._sources(results),
+            latency_s=time.perf_counter() - start,
+            generation=generation
+        )
 
     def answer(self, question: str, top_k: int = 5) -> str:
-        results = self.retriever.search(question, top_k=top_k)
+        start = time.perf_counter()
+        generation = self.retriever.generation
+        query_vec = self.retriever.encode([question])[0] if self._cache_enabled() else None
+        cached = self._cache_get(query_vec, top_k, generation)
+        if cached is not None:
+            return cached.answer
+
+        results = self._retrieve(question, top_k, query_vec)
+        answer = self._generate(question, results)
+        self._cache_put(query_vec, question, top_k, answer, results, start, generation)
+        return answer
+
+    async def _encode_for_cache(self, question: str):
+        if not self._cache_enabled():
+            return None
+        return (await self._run_cpu(self.retriever.encode, [question]))[0]
+
+    async def answer_async(self, question: str, top_k: int = 5) -> str:
+        start = time.perf_counter()
+        generation = self.retriever.generation
+        query_vec = await self._encode_for_cache(question)
+        cached = self._cache_get(query_vec, top_k, generation)
+        if cached is not None:
+            return cached.answer
+
+        results = await self._retrieve_async(question, top_k, query_vec)
+        answer = await self.generate_async(question, results)
+        self._cache_put(query_vec, question, top_k, answer, results, start, generation)
+        return answer
+
+    async def generate_async(self, question: str, results: List[dict]) -> str:
+        """Answer from results retrieved elsewhere (e.g. a batch job's search_batch)."""
+        prompt = self._prepare_prompt(question, results)
+        if prompt is None:
+            return NO_RESULTS_MESSAGE
+        return await self._call_llm_async(prompt)
+
+    async def answer_stream(self, question: str, top_k: int = 5) -> AsyncIterator[Tuple[str, object]]:
+        """
+        Yields (event, data) pairs: one "sources" event as soon as retrieval
+        is done, then "token" events as the LLM produces text, then "done".
+        """
+        start = time.perf_counter()
+        generation = self.retriever.generation
+        query_vec = await self._encode_for_cache(question)
+        cached = self._cache_get(query_vec, top_k, generation)
+        if cached is not None:
+            yield "sources", cached.sources
+            yield "token", cached.answer
+            yield "done", None
+            return
+
+        results = await self._retrieve_async(question, top_k, query_vec)
+        yield "sources", self._sources(results)
+
+        prompt = self._prepare_prompt(question, results)
+        if prompt is None:
+            yield "token", NO_RESULTS_MESSAGE
+        else:
+            tokens = []
+            # Includes the time the client takes to consume each token
+            with span("llm"):
+                async for token in self._stream_llm_async(prompt):
+                    tokens.append(token)
+                    yield "token", token
+            self._cache_put(query_vec, question, top_k, "".join(tokens), results, start, generation)
+        yield "done", None
+
+    async def answer_batch_async(self, questions: List[str], top_k: int = 5, concurrency: int = 8) -> List[str]:
+        """
+        Answers in request order. All questions are encoded in one call; those
+        the answer cache cannot serve are searched as one batch, then answered
+        concurrently with at most `concurrency` LLM calls in flight.
+        """
+        if self.retriever.idx is None:
+            return [NO_RESULTS_MESSAGE] * len(questions)
+        start = time.perf_counter()
+        generation = self.retriever.generation
+        query_vecs = await self._run_cpu(self.retriever.encode, questions)
+        answers: List[Optional[str]] = [None] * len(questions)
+        if self._cache_enabled():
+            for i, query_vec in enumerate(query_vecs):
+                cached = self._cache_get(query_vec, top_k, generation)
+                if cached is not None:
+                    answers[i] = cached.answer
+
+        misses = [i for i, answer in enumerate(answers) if answer is None]
+        if not misses:
+            return answers
+        results = await self._run_cpu(
+            self.retriever.search_batch,
+            [questions[i] for i in misses],
+            top_k=top_k,
+            query_vecs=query_vecs[misses]
+        )
+
+        slots = asyncio.Semaphore(concurrency)
+
+        async def generate(i: int, question_results: List[dict]):
+            async with slots:
+                answers[i] = await self.generate_async(questions[i], question_results)
+            if self._cache_enabled():
+                self._cache_put(query_vecs[i], questions[i], top_k, answers[i], question_results, start, generation)
 
+        await asyncio.gather(*(generate(i, r) for i, r in zip(misses, results)))
+        return answers
+
+    def _generate(self, question: str, results: List[dict]) -> str:
+        prompt = self._prepare_prompt(question, results)
+        if prompt is None:
+            return NO_RESULTS_MESSAGE
+        return self._call_llm(prompt)
+
+    def _prepare_prompt(self, question: str, results: List[dict]) -> Optional[str]:
         if not results:
-            return "No relevant information found in the documents."
+            return None
+
+        with span("prompt_build"):
+            context = assemble_context(results, self.context_max_tokens, self.context_merge)
+            prompt = self._build_prompt(context.text, question)
+            prompt_tokens = count_tokens(prompt)
 
-        context = self._build_context(results)
-        prompt = self._build_prompt(context, question)
+        # The raw count is what the prompt would be with every chunk in full
+        raw_tokens = prompt_tokens - context.tokens_after + context.tokens_before
+        PROMPT_TOKENS.observe(raw_tokens, context="raw")
+        PROMPT_TOKENS.observe(prompt_tokens, context="assembled")
+        logger.debug(
+            "Prompt %d tokens (%d raw): %d of %d chunks in %d blocks\n%s",
+            prompt_tokens, raw_tokens, context.chunks_used, len(results), len(context.blocks), context.text[:1500]
+        )
+        return prompt
 
-        print("----- CONTEXT SENT TO LLM -----")
-        print(context[:1500])
-        print("----- END CONTEXT -----")
+    def _backoff_delay(self, attempt: int) -> float:
+        # Exponential backoff with jitter so retries from many requests spread out
+        return self.llm_backoff_s * (2 ** attempt) * random.uniform(0.5, 1.5)
 
-        for attempt in range(3):
+    def _call_llm(self, prompt: str) -> str:
+        with span("llm"):
+            return self._call_llm_with_retries(prompt)
+
+    def _call_llm_with_retries(self, prompt: str) -> str:
+        deadline = time.monotonic() + self.llm_timeout_s
+        for attempt in range(self.llm_max_retries):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
             try:
+                # Per-call HTTP timeout (milliseconds), so a hung request
+                # cannot outlive the deadline
                 response = self.client.models.generate_content(
-                    model="gemini-2.5-flash",
+                    model=self.model_name,
                     contents=prompt,
-                    config={
-                        "temperature": 0.1,
-                        "max_output_tokens": 1024
-                    }
+                    config={**GENERATION_CONFIG, "http_options": {"timeout": max(int(remaining * 1000), 1)}}
                 )
                 return response.text
 
-            except ServerError as e:
-                print(f"Gemini overloaded (attempt {attempt + 1}/3)")
-                time.sleep(2)
+            except (ServerError, httpx.TimeoutException):
+                logger.warning("Gemini overloaded or slow (attempt %d/%d)", attempt + 1, self.llm_max_retries)
+
+            delay = self._backoff_delay(attempt)
+            if time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+
+        return OVERLOADED_MESSAGE
+
+    async def _call_llm_async(self, prompt: str) -> str:
+        with span("llm"):
+            return await self._call_llm_async_with_retries(prompt)
+
+    async def _call_llm_async_with_retries(self, prompt: str) -> str:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.llm_timeout_s
+        for attempt in range(self.llm_max_retries):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                response = await asyncio.wait_for(
+                    self.client.aio.models.generate_content(
+                        model=self.model_name,
+                        contents=prompt,
+                        config=GENERATION_CONFIG
+                    ),
+                    timeout=remaining
+                )
+                return response.text
+
+            except (ServerError, asyncio.TimeoutError):
+                logger.warning("Gemini overloaded or slow (attempt %d/%d)", attempt + 1, self.llm_max_retries)
+
+            delay = self._backoff_delay(attempt)
+            if loop.time() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
+
+        return OVERLOADED_MESSAGE
+
+    async def _stream_llm_async(self, prompt: str) -> AsyncIterator[str]:
+        # Retries only happen before the first token; once text has been
+        # sent to the client a failure ends the stream. The deadline bounds
+        # the wait for the first token; after it only the gap between chunks
+        # is bounded, so a long answer that keeps arriving is not cut off.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.llm_timeout_s
+        for attempt in range(self.llm_max_retries):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            started = False
+            try:
+                stream = await asyncio.wait_for(
+                    self.client.aio.models.generate_content_stream(
+                        model=self.model_name,
+                        contents=prompt,
+                        config=GENERATION_CONFIG
+                    ),
+                    timeout=remaining
+                )
+                chunks = stream.__aiter__()
+                while True:
+                    timeout = self.llm_stream_idle_s if started else max(deadline - loop.time(), 0)
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                    except StopAsyncIteration:
+                        return
+                    if chunk.text:
+                        started = True
+                        yield chunk.text
+
+            except (ServerError, asyncio.TimeoutError):
+                logger.warning("Gemini overloaded or slow (attempt %d/%d)", attempt + 1, self.llm_max_retries)
+                if started:
+                    yield TRUNCATED_MESSAGE
+                    return
+
+            delay = self._backoff_delay(attempt)
+            if loop.time() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
 
-        return (
-            "The language model is temporarily overloaded. "
-            "Please try again in a few moments."
-        )
\ No newline at end of file
+        yield OVERLOADED_MESSAGE
@@ -0,0 +1,66 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class RerankScoreCache:
+    """
+    Cross-encoder scores keyed on (query hash, chunk store row).
+
+    Row ids only identify the same chunk text within one index epoch
+    (the store is append-only until compaction or a rebuild starts a new
+    one), so the whole cache is dropped when the corpus key changes.
+    Entries are evicted LRU beyond max_entries.
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[Tuple[bytes, int], float]" = OrderedDict()
+        self._corpus = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def query_key(query: str) -> bytes:
+        return hashlib.blake2b(query.encode("utf-8"), digest_size=16).digest()
+
+    def _check_corpus(self, corpus: Hashable):
+        if corpus != self._corpus:
+            self._corpus = corpus
+            self._scores.clear()
+
+    def get_many(self, keys: List[Tuple[bytes, int]], corpus: Hashable) -> List[Optional[float]]:
+        with self._lock:
+            self._check_corpus(corpus)
+            found = []
+            for key in keys:
+                score = self._scores.get(key)
+                if score is not None:
+                    self._scores.move_to_end(key)
+                found.append(score)
+            hits = sum(s is not None for s in found)
+            self.hits += hits
+            self.misses += len(found) - hits
+            return found
+
+    def put_many(self, scores: Dict[Tuple[bytes, int], float], corpus: Hashable):
+        with self._lock:
+            self._check_corpus(corpus)
+            self._scores.update(scores)
+            for key in scores:
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._scores),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
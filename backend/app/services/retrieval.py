@@ -1,123 +1,479 @@
-import json
 from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sentence_transformers import CrossEncoder
+
+from backend.app.core.logger import logger
+from backend.app.core.metrics import INDEXING_SECONDS, RERANK_PAIRS, span, timed
+from backend.app.services.chunk_store import ChunkStore
+from backend.app.services.index import SegmentedIndex, search_index
+from backend.app.services.lexical_index import LexicalIndex
+from backend.app.services.manifest import load_index, load_segments, open_store, read_manifest
+from backend.app.services.models import get_embedder, get_reranker
+from backend.app.services.rerank_cache import RerankScoreCache
+
+
+class Snapshot(NamedTuple):
+    """
+    An index and the chunk store it was built with, swapped in as one unit:
+    a point-in-time view of one manifest version. Segment files are
+    immutable and the store is pinned to the manifest's commit, so later
+    index runs never change what a snapshot sees.
+    """
+    idx: Optional[object]
+    store: Optional[ChunkStore]
+    generation: int
+    # Epoch of the on-disk index this snapshot descends from (None if unknown)
+    epoch: Optional[str] = None
+    # Live-row mask passed to FAISS as a selector; None when nothing is deleted
+    keep: Optional[np.ndarray] = None
+    # BM25 index stored with the chunk store (None if it has not been built)
+    lexical: Optional[LexicalIndex] = None
+    # Manifest version and the segment files idx was loaded from
+    version: Optional[int] = None
+    segments: Tuple[str, ...] = ()
+
+
+def _make_snapshot(idx, store: ChunkStore, generation: int, manifest: dict) -> Snapshot:
+    keep = ~store.deleted if store.n_deleted else None
+    return Snapshot(
+        idx, store, generation, manifest["epoch"], keep, LexicalIndex.for_store(store.path),
+        manifest["version"], tuple(segment["file"] for segment in manifest["segments"])
+    )
+
+
+def _has_index(manifest: Optional[dict]) -> bool:
+    return manifest is not None and bool(manifest["segments"])
+
+
+def reciprocal_rank_fusion(rankings: List[list], limit: int, k: int = 60) -> Tuple[list, list]:
+    """
+    Fuse ranked id lists: each id scores sum(1 / (k + rank)) over the
+    lists it appears in. Returns the top `limit` ids and their scores.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            scores[i] = scores.get(i, 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:limit]
+    return [i for i, _ in fused], [s for _, s in fused]
 
 
 class Retrievar:
-    def __init__(self, idx_path: Path, metadata_path: Path, chunks_path: Path):
+    def __init__(
+            self,
+            idx_path: Path,
+            store_path: Path,
+            chunks_path: Path,
+            vector_source: str = "index",
+            hybrid: bool = True,
+            rrf_k: int = 60,
+            ce_cache_size: int = 50000,
+            ce_skip_margin: Optional[float] = None,
+            ce_batch_size: Optional[int] = None,
+            rescore_factor: int = 0,
+            model=None,
+            reranker=None
+    ):
+        if vector_source not in ("index", "store"):
+            raise ValueError(f"Unknown vector_source: {vector_source}")
+
         self.idx_path = idx_path
-        self.metadata_path = metadata_path
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
-        self.reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-
-        if not idx_path.exists() or not metadata_path.exists():
-            print("No FAISS index found yet. Retriever disabled.")
-            self.idx = None
-            self.metadata = []
+        self.store_path = store_path
+        # Where MMR reads candidate vectors from: the FAISS index itself
+        # ("index") or the chunk store's parallel float32 matrix ("store")
+        self.vector_source = vector_source
+        # Fuse BM25 with the dense results (when a lexical index exists);
+        # rrf_k damps the weight of top ranks in reciprocal-rank fusion
+        self.hybrid = hybrid
+        self.rrf_k = rrf_k
+        # Cross-encoder: scores are cached per (query, chunk). Two opt-in
+        # heuristics score fewer pairs at the risk of a different top-k: a
+        # query whose dense top-k leads the next candidate by ce_skip_margin
+        # keeps the dense order, and with ce_batch_size the shortlist is
+        # scored in mini-batches until one no longer changes the top-k
+        self.rerank_cache = RerankScoreCache(ce_cache_size) if ce_cache_size else None
+        self.ce_skip_margin = ce_skip_margin
+        self.ce_batch_size = ce_batch_size
+        # With a quantized (fp16 / sq8) index: fetch rescore_factor times the
+        # candidates and rank them by exact inner product with the chunk
+        # store's memory-mapped float32 vectors (when the store keeps them)
+        self.rescore_factor = rescore_factor
+        self._snapshot = Snapshot(None, None, 0)
+        # None means the shared registry models, loaded on first use
+        self._model = model
+        self._reranker = reranker
+
+        if not _has_index(read_manifest(idx_path)) or not ChunkStore.exists(store_path):
+            logger.info("No FAISS index found yet. Retriever disabled.")
             return
 
-        self.idx = faiss.read_index(str(idx_path))
-        self.metadata = []
-
-        with metadata_path.open(mode="r", encoding="utf-8") as f:
-            for line in f:
-                self.metadata.append(json.loads(line))
-
-        print("FAISS vectors:", self.idx.ntotal)
-        print("Metadata records:", len(self.metadata))
-
-        assert self.idx.ntotal == len(self.metadata), (
-            f"FAISS index ({self.idx.ntotal}) "
-            f"!= metadata records ({len(self.metadata)})"
-        )
+        self._load()
+
+        logger.info("FAISS vectors: %d, chunk store records: %d", self.idx.ntotal, len(self.store))
+        if rescore_factor > 1 and not self.store.has_embeddings:
+            logger.warning("Rescoring needs a chunk store with embeddings (STORE_EMBEDDINGS); searching without it")
+
+    @property
+    def model(self):
+        return self._model or get_embedder()
+
+    @property
+    def reranker(self):
+        return self._reranker or get_reranker()
+
+    @property
+    def idx(self):
+        return self._snapshot.idx
+
+    @property
+    def store(self) -> Optional[ChunkStore]:
+        return self._snapshot.store
+
+    @property
+    def lexical(self) -> Optional[LexicalIndex]:
+        return self._snapshot.lexical
+
+    @property
+    def generation(self) -> int:
+        return self._snapshot.generation
+
+    @property
+    def version(self) -> Optional[int]:
+        """Manifest version of the index being served."""
+        return self._snapshot.version
+
+    def _load(self):
+        manifest = read_manifest(self.idx_path)
+        idx = load_index(self.idx_path, manifest)
+        store = open_store(self.store_path, manifest)
+
+        if idx.ntotal != len(store):
+            raise RuntimeError(f"FAISS index ({idx.ntotal}) != chunk store records ({len(store)})")
+
+        # Single reference assignment: in-flight searches keep the snapshot
+        # they started with. The generation lets corpus-keyed caches invalidate.
+        self._snapshot = _make_snapshot(idx, store, self.generation + 1, manifest)
+
+    def _new_segments(self, snap: Snapshot, manifest: dict) -> Optional[List[dict]]:
+        """
+        Segments the manifest lists after those snap was loaded from, or
+        None when the index was rebuilt, compacted or merged and only a
+        full reload is safe.
+        """
+        if snap.idx is None or snap.epoch is None or manifest["epoch"] != snap.epoch:
+            return None
+        files = [segment["file"] for segment in manifest["segments"]]
+        if tuple(files[:len(snap.segments)]) != snap.segments:
+            return None
+        return manifest["segments"][len(snap.segments):]
 
     def reload(self):
-        print("Reloading retriever...")
-        self.idx = faiss.read_index(str(self.idx_path))
-        self.metadata = []
-
-        with self.metadata_path.open(mode="r", encoding="utf-8") as f:
-            for line in f:
-                self.metadata.append(json.loads(line))
+        """
+        Move to the latest committed manifest. When the indexer only added
+        segments, just those files are read and searched next to the live
+        index, so the cost scales with the size of the change; tombstones
+        come with the reopened (memory-mapped) store. A rebuilt, compacted
+        or merged index is loaded in full.
+        """
+        with timed(INDEXING_SECONDS, operation="reload"):
+            self._reload()
+
+    def _reload(self):
+        snap = self._snapshot
+        manifest = read_manifest(self.idx_path)
+        if not _has_index(manifest) or not ChunkStore.exists(self.store_path):
+            logger.info("No FAISS index found yet. Retriever disabled.")
+            return
+        if (manifest["version"], manifest["epoch"]) == (snap.version, snap.epoch):
+            logger.info("Retriever already up to date")
+            return
 
-        assert self.idx.ntotal == len(self.metadata), (
-            f"FAISS index ({self.idx.ntotal}) "
-            f"!= metadata records ({len(self.metadata)})"
+        new = self._new_segments(snap, manifest)
+        if new is not None:
+            store = open_store(self.store_path, manifest)
+            idx = snap.idx
+            if new:
+                idx = idx if isinstance(idx, SegmentedIndex) else SegmentedIndex([idx])
+                idx = idx.extend(load_segments(self.idx_path, new))
+            if idx.ntotal == len(store):
+                self._snapshot = _make_snapshot(idx, store, snap.generation + 1, manifest)
+                logger.info(
+                    "Manifest version %d: %d vectors appended, %d chunks deleted",
+                    manifest["version"], idx.ntotal - snap.idx.ntotal, store.n_deleted
+                )
+                return
+
+        logger.info("Reloading retriever...")
+        self._load()
+        logger.info("Loaded %d vectors", self.idx.ntotal)
+
+    def close(self):
+        """Release resources held outside this object; nothing for the in-process retriever."""
+
+    def _dense_search(self, snap: Snapshot, query_vecs: np.ndarray, k: int, nprobe: int, ef_search: int):
+        # nprobe applies to IVF indexes, ef_search to HNSW; ignored otherwise.
+        # Deleted chunks are filtered inside FAISS, so k stays full.
+        return search_index(
+            snap.idx,
+            query_vecs,
+            k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            keep=snap.keep
         )
-        print(f"Loaded {self.idx.ntotal} vectors")
-
-    def search(self, query: str, top_k: int = 5, use_mmr: bool = True,use_ce:bool=True,ce_top_n:int=30):
-
-        if self.idx is None or not self.metadata:
-            return []
 
-        query_vec = self.model.encode(
-            query,
+    def _rescore(self, snap: Snapshot, query_vecs: np.ndarray, indices: np.ndarray, k: int):
+        """Exact top k of each row of a (B, n) first-pass shortlist, padded with -1 like FAISS."""
+        valid = (indices >= 0) & (indices < len(snap.store))
+        vectors = snap.store.embeddings(np.where(valid, indices, 0).ravel())
+        exact = np.einsum("bnd,bd->bn", vectors.reshape(*indices.shape, -1), query_vecs.astype(np.float32))
+        exact[~valid] = -np.inf
+        order = np.argsort(-exact, axis=1, kind="stable")[:, :k]
+        ids = np.take_along_axis(np.where(valid, indices, -1), order, axis=1)
+        return np.take_along_axis(exact, order, axis=1), ids
+
+    def _candidate_vectors(self, snap: Snapshot, ids: list) -> np.ndarray:
+        # Both sources hold vectors normalised at indexing time
+        if self.vector_source == "store" and snap.store.has_embeddings:
+            return snap.store.embeddings(ids)
+        return snap.idx.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+
+    def encode(self, queries: List[str]) -> np.ndarray:
+        return self.model.encode(
+            list(queries),
             convert_to_numpy=True,
             normalize_embeddings=True
         )
 
+    def search(
+            self,
+            query: str,
+            top_k: int = 5,
+            use_mmr: bool = True,
+            use_ce:bool=True,
+            ce_top_n:int=30,
+            nprobe: int = None,
+            ef_search: int = None,
+            hybrid: bool = None,
+            query_vec: np.ndarray = None
+    ):
+        return self.search_batch(
+            [query],
+            top_k=top_k,
+            use_mmr=use_mmr,
+            use_ce=use_ce,
+            ce_top_n=ce_top_n,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            hybrid=hybrid,
+            query_vecs=None if query_vec is None else query_vec.reshape(1, -1)
+        )[0]
+
+    def search_batch(
+            self,
+            queries: List[str],
+            top_k: int = 5,
+            use_mmr: bool = True,
+            use_ce:bool=True,
+            ce_top_n:int=30,
+            nprobe: int = None,
+            ef_search: int = None,
+            hybrid: bool = None,
+            query_vecs: np.ndarray = None
+    ) -> List[List[dict]]:
+        """
+        Search several queries at once: one encode call, one FAISS search,
+        one batched MMR pass and batched cross-encoder predicts for all of
+        them. query_vecs skips the encode step when the caller already has them.
+
+        The cross-encoder reorders MMR's top_k, or without MMR picks the
+        top_k of the first ce_top_n dense (or fused) candidates.
+
+        With hybrid (default: self.hybrid) the BM25 top candidate_k is fused
+        with the dense top candidate_k by reciprocal rank. The fused list is
+        the candidate set and its order; MMR still weighs each candidate by
+        its dense similarity, on the same scale as the diversity term.
+        """
+        snap = self._snapshot
+        if snap.idx is None or not snap.store:
+            return [[] for _ in queries]
+
+        if query_vecs is None:
+            with span("encode"):
+                query_vecs = self.encode(queries)
+
         if use_mmr:
             candidate_k = max(top_k * 4, 20)
+        elif use_ce:
+            candidate_k = max(top_k, ce_top_n)
         else:
             candidate_k = top_k
 
-        scores, indices = self.idx.search(
-            query_vec.reshape(1, -1),
-            candidate_k
-        )
-
-        valid_indices = [i for i in indices[0] if i >= 0 and i < len(self.metadata)]
-
-        if not valid_indices:
-            return []
-
-        if use_mmr:
-            # Extract embeddings from METADATA (not FAISS!)
-            candidate_embeddings = np.array(
-                [self.metadata[i]["embedding"] for i in valid_indices],
-                dtype=np.float32
+        rescore = self.rescore_factor > 1 and snap.store.has_embeddings
+        with span("faiss_search"):
+            scores, indices = self._dense_search(
+                snap, query_vecs, candidate_k * self.rescore_factor if rescore else candidate_k, nprobe, ef_search
             )
+        if rescore:
+            with span("rescore"):
+                scores, indices = self._rescore(snap, query_vecs, indices, candidate_k)
+
+        valid = (indices >= 0) & (indices < len(snap.store))
+        valid_indices = [[int(i) for i in row[ok]] for row, ok in zip(indices, valid)]
+        # Dense similarities line up with the candidates until fusion or MMR reorders them
+        prior_scores = [row[ok] for row, ok in zip(scores, valid)]
+
+        if (self.hybrid if hybrid is None else hybrid) and snap.lexical is not None:
+            with span("bm25"):
+                lexical_indices = snap.lexical.search_batch(queries, candidate_k, keep=snap.keep)
+            fused = [
+                reciprocal_rank_fusion(
+                    [dense, [i for i in lexical if i < len(snap.store)]],
+                    candidate_k,
+                    k=self.rrf_k
+                )
+                for dense, lexical in zip(valid_indices, lexical_indices)
+            ]
+            valid_indices = [ids for ids, _ in fused]
+            prior_scores = None
 
-            # Normalize for cosine similarity
-            faiss.normalize_L2(candidate_embeddings)
-
-            # Apply MMR reranking
-            selected = mmr(
-                query_vec,
-                candidate_embeddings,
-                lambda_param=0.7,
-                top_k=top_k
-            )
-            ordered = [valid_indices[i] for i in selected]
+        if use_mmr:
+            with span("mmr"):
+                ordered = self._mmr_batch(snap, query_vecs, valid_indices, top_k)
+            prior_scores = None
+        elif use_ce:
+            ordered = [row[:ce_top_n] for row in valid_indices]
         else:
-            ordered = valid_indices[:top_k]
+            ordered = [row[:top_k] for row in valid_indices]
 
         if use_ce:
-            shortlist=ordered[: min(ce_top_n,len(ordered))]
-            pairs=[(query,self.metadata[i]["text"]) for i in shortlist]
-            ce_scores=self.reranker.predict(pairs)
-            shortlist=[doc_id for _,doc_id in sorted(zip(ce_scores,shortlist),key=lambda x:x[0],reverse=True)]
-            final_indices=shortlist[:top_k]
+            with span("rerank"):
+                final_indices = self._rerank_batch(snap, queries, ordered, top_k, ce_top_n, prior_scores)
         else:
-            final_indices=ordered[:top_k]
+            final_indices = [row[:top_k] for row in ordered]
 
         # Build results (no embedding in output)
-        res = []
-        for i in final_indices:
-            rec = self.metadata[i]
-            res.append({
-                "text": rec["text"],
-                "doc_id": rec["doc_id"],
-                "page": rec["page"],
-                "chunk_id": rec["chunk_id"]
-            })
-
-        return res
+        return [[snap.store[i] for i in row] for row in final_indices]
+
+    def _mmr_batch(self, snap: Snapshot, query_vecs: np.ndarray, valid_indices: List[list], top_k: int) -> List[list]:
+        # Pad every query's candidates to a common length and fetch all
+        # candidate vectors in one call
+        width = max((len(row) for row in valid_indices), default=0)
+        if width == 0:
+            return [[] for _ in valid_indices]
+
+        flat_ids = [i for row in valid_indices for i in row]
+        flat_vecs = self._candidate_vectors(snap, flat_ids)
+
+        candidates = np.zeros((len(valid_indices), width, flat_vecs.shape[1]), dtype=np.float32)
+        mask = np.zeros((len(valid_indices), width), dtype=bool)
+        pos = 0
+        for b, row in enumerate(valid_indices):
+            candidates[b, :len(row)] = flat_vecs[pos:pos + len(row)]
+            mask[b, :len(row)] = True
+            pos += len(row)
+
+        selected = mmr_batch(query_vecs, candidates, lambda_param=0.7, top_k=top_k, mask=mask)
+        return [[row[i] for i in sel] for row, sel in zip(valid_indices, selected)]
+
+    def _ce_scores(self, snap: Snapshot, queries: List[str], wanted: Dict[int, list]) -> Dict[int, np.ndarray]:
+        """Cross-encoder scores for {query position: rows}, through the score cache."""
+        keys = {b: [(RerankScoreCache.query_key(queries[b]), i) for i in rows] for b, rows in wanted.items()}
+        # Row ids are stable for as long as the snapshot epoch is (the index
+        # epoch, or the shard layout for a sharded snapshot)
+        corpus = snap.epoch if snap.epoch is not None else ("generation", snap.generation)
+        known = {}
+        if self.rerank_cache is not None:
+            flat = [key for row in keys.values() for key in row]
+            known = {k: s for k, s in zip(flat, self.rerank_cache.get_many(flat, corpus)) if s is not None}
+
+        # Identical (query, row) pairs across the batch are scored once
+        missing = {}
+        for b, rows in wanted.items():
+            for key, i in zip(keys[b], rows):
+                if key not in known and key not in missing:
+                    missing[key] = (queries[b], snap.store.text(i))
+        if missing:
+            fresh = dict(zip(missing, (float(s) for s in self.reranker.predict(list(missing.values())))))
+            if self.rerank_cache is not None:
+                self.rerank_cache.put_many(fresh, corpus)
+            known.update(fresh)
+
+        RERANK_PAIRS.inc(len(missing), outcome="scored")
+        RERANK_PAIRS.inc(sum(len(row) for row in keys.values()) - len(missing), outcome="cached")
+        return {b: np.array([known[key] for key in row], dtype=np.float32) for b, row in keys.items()}
+
+    def _rerank_batch(
+            self,
+            snap: Snapshot,
+            queries: List[str],
+            ordered: List[list],
+            top_k: int,
+            ce_top_n: int,
+            prior_scores: List[np.ndarray] = None
+    ) -> List[list]:
+        """
+        Cross-encoder top_k of each query's first ce_top_n candidates.
+
+        Shortlists are scored in rounds of ce_batch_size pairs per query
+        (the first round covers at least top_k), all queries of a round in
+        one predict call. A query leaves the cascade once a round adds
+        nothing to its top-k. That is a heuristic, not a bound: cross-encoder
+        scores of the unscored candidates are unbounded, so one of them may
+        still belong in the top-k. With prior_scores (dense similarities in
+        candidate order), a query whose top-k already leads the next
+        candidate by ce_skip_margin is not scored at all, also a heuristic.
+        Without ce_batch_size and ce_skip_margin every shortlisted pair is
+        scored in one round.
+        """
+        shortlists = [row[: min(ce_top_n, len(row))] for row in ordered]
+        final_indices: List[Optional[list]] = [None] * len(shortlists)
+        scored = [([], []) for _ in shortlists]  # rows, CE scores in scoring order
+        step = self.ce_batch_size or max(ce_top_n, 1)
+
+        active = []
+        for b, shortlist in enumerate(shortlists):
+            if (
+                self.ce_skip_margin is not None
+                and prior_scores is not None
+                and len(shortlist) > top_k > 0
+                and prior_scores[b][top_k - 1] - prior_scores[b][top_k] >= self.ce_skip_margin
+            ):
+                final_indices[b] = shortlist[:top_k]
+            elif shortlist:
+                active.append(b)
+            else:
+                final_indices[b] = []
+
+        while active:
+            wanted = {}
+            for b in active:
+                start = len(scored[b][0])
+                size = max(step, top_k) if start == 0 else step
+                wanted[b] = shortlists[b][start:start + size]
+            new_scores = self._ce_scores(snap, queries, wanted)
+
+            still_active = []
+            for b in active:
+                rows, row_scores = scored[b]
+                first_round = not rows
+                rows.extend(wanted[b])
+                row_scores.extend(new_scores[b].tolist())
+                if len(rows) == len(shortlists[b]):
+                    continue
+                # Did anything from this round make the current top-k?
+                kth = sorted(row_scores, reverse=True)[min(top_k, len(row_scores)) - 1]
+                if first_round or max(new_scores[b]) >= kth:
+                    still_active.append(b)
+            active = still_active
+
+        for b, (rows, row_scores) in enumerate(scored):
+            if final_indices[b] is None:
+                ranked = sorted(zip(row_scores, rows), key=lambda x: x[0], reverse=True)
+                final_indices[b] = [i for _, i in ranked[:top_k]]
+        RERANK_PAIRS.inc(sum(len(s) for s in shortlists) - sum(len(rows) for rows, _ in scored), outcome="skipped")
+        return final_indices
 
 
 def mmr(
@@ -126,35 +482,59 @@ def mmr(
         lambda_param: float = 0.7,
         top_k: int = 5
 ):
-    selected = []
-    candidates = list(range(len(doc_embeddings)))
-
-    # Compute relevance scores (cosine similarity)
-    relevance_scores = doc_embeddings @ query_embedding
-
-    # Select most relevant first
-    first = int(np.argmax(relevance_scores))
-    selected.append(first)
-    candidates.remove(first)
-
-    # Iteratively select balancing relevance and diversity
-    while len(selected) < top_k and candidates:
-        mmr_scores = []
-        for c in candidates:
-            relevance = relevance_scores[c]
-
-            # Max similarity to already selected
-            diversity = max(
-                doc_embeddings[c] @ doc_embeddings[s]
-                for s in selected
-            )
+    return mmr_batch(
+        query_embedding[None, :],
+        doc_embeddings[None, :, :],
+        lambda_param=lambda_param,
+        top_k=top_k
+    )[0]
+
 
+def mmr_batch(
+        query_embeddings: np.ndarray,
+        doc_embeddings: np.ndarray,
+        lambda_param: float = 0.7,
+        top_k: int = 5,
+        mask: np.ndarray = None
+):
+    """
+    MMR over a batch of queries.
+
+    query_embeddings: (B, d), doc_embeddings: (B, n, d). mask (B, n) marks
+    real candidates when rows are padded to a common n. Returns one list
+    of selected candidate positions per query, in selection order.
+    """
+    queries = np.asarray(query_embeddings, dtype=np.float32)
+    docs = np.asarray(doc_embeddings, dtype=np.float32)
+    b, n, _ = docs.shape
+    available = np.ones((b, n), dtype=bool) if mask is None else mask.astype(bool)
+
+    # Relevance to the query and candidate x candidate similarity, computed once
+    relevance = np.matmul(docs, queries[:, :, None])[:, :, 0]
+    similarity = np.matmul(docs, docs.transpose(0, 2, 1))
+    weighted_relevance = lambda_param * relevance
+
+    rows = np.arange(b)
+    steps = min(top_k, n)
+    picks = np.full((b, steps), -1, dtype=np.int64)
+    max_sim = None
+
+    for step in range(steps):
+        if max_sim is None:
+            # Select most relevant first
+            scores = relevance.copy()
+        else:
             # MMR: high relevance, low redundancy
-            mmr_score = lambda_param * relevance - (1 - lambda_param) * diversity
-            mmr_scores.append((mmr_score, c))
+            scores = weighted_relevance - (1 - lambda_param) * max_sim
+        scores[~available] = -np.inf
+
+        best = np.argmax(scores, axis=1)
+        active = available[rows, best]
+        picks[active, step] = best[active]
+        available[rows, best] = False
 
-        _, best = max(mmr_scores, key=lambda x: x[0])
-        selected.append(best)
-        candidates.remove(best)
+        # Running max similarity of every candidate to the selected set
+        picked_sim = similarity[rows, best]
+        max_sim = picked_sim if max_sim is None else np.maximum(max_sim, picked_sim)
 
-    return selected
+    return [[int(i) for i in row if i >= 0] for row in picks]
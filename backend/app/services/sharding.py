@@ -0,0 +1,592 @@
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from backend.app.core.logger import logger
+from backend.app.core.metrics import INDEXING_SECONDS, timed
+from backend.app.services.chunk_store import ChunkStore, ChunkStoreWriter, fsync_path, read_meta
+from backend.app.services.index import SegmentedIndex, merge_indexes, merge_topk, new_epoch, search_index
+from backend.app.services.lexical_index import BM25Stats, LexicalIndex, update_lexical_index
+from backend.app.services.manifest import load_index, load_segments, open_store, read_manifest, write_segment
+from backend.app.services.retrieval import Retrievar, Snapshot
+
+SHARDS_FILE = "shards.json"
+SHARDS_FORMAT = 2
+# Stem of each shard's segment files (index.NNNNNN.faiss)
+SHARD_INDEX_FILE = "index.faiss"
+SHARD_STORE_DIR = "chunk_store"
+# Source row id of every shard row (int64, in shard row order)
+SHARD_ROWS_FILE = "source_rows.i64"
+# Empty clone of the source index; every shard segment starts from it
+TEMPLATE_FILE = "template.faiss"
+
+# shards.json:
+#   format     SHARDS_FORMAT; anything else is re-split
+#   n_shards
+#   layout     new whenever a global row id (a position in the concatenated
+#              shard stores) may point at another chunk: every split, and
+#              every update that appends rows
+#   shards     [{name, segments: [{file, ntotal}], store: {commit, count,
+#              deleted, deleted_file}}]; like the index manifest, readers
+#              open each shard store pinned to that commit
+#   source     state of the index and chunk store the shards are built from
+
+
+def shard_of(doc_id: str, n_shards: int) -> int:
+    """Stable document -> shard assignment; all chunks of a document share a shard."""
+    digest = hashlib.blake2b(doc_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % n_shards
+
+
+def _source_state(manifest: Optional[dict], store: ChunkStore) -> dict:
+    return {
+        "epoch": manifest["epoch"] if manifest else None,
+        "version": manifest["version"] if manifest else None,
+        "ntotal": len(store),
+        "deleted": store.n_deleted,
+    }
+
+
+def source_state(index_path: Path, store_path: Path) -> dict:
+    # What the shards were built from; any change means they are stale
+    manifest = read_manifest(index_path)
+    return _source_state(manifest, open_store(store_path, manifest))
+
+
+def read_shards(shard_dir: Path) -> Optional[dict]:
+    path = shard_dir / SHARDS_FILE
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_shards(shard_dir: Path, meta: dict):
+    tmp = shard_dir / (SHARDS_FILE + ".tmp")
+    tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    fsync_path(tmp)
+    os.replace(tmp, shard_dir / SHARDS_FILE)
+
+
+def _shard_entry(name: str, segments: List[dict], store_path: Path) -> dict:
+    meta = read_meta(store_path)
+    return {
+        "name": name,
+        "segments": segments,
+        "store": {
+            "commit": meta["commit"],
+            "count": meta["count"],
+            "deleted": meta.get("deleted", 0),
+            "deleted_file": meta.get("deleted_file"),
+        },
+    }
+
+
+def _open_shard_store(shard_dir: Path, shard: dict) -> ChunkStore:
+    state = shard["store"]
+    return ChunkStore(shard_dir / shard["name"] / SHARD_STORE_DIR, count=state["count"], deleted_file=state["deleted_file"])
+
+
+def _docs_by_shard(docs: List[str], n_shards: int) -> List[List[str]]:
+    by_shard = [[] for _ in range(n_shards)]
+    for name in docs:
+        by_shard[shard_of(name, n_shards)].append(name)
+    return by_shard
+
+
+def split_into_shards(
+        index_path: Path,
+        store_path: Path,
+        shard_dir: Path,
+        n_shards: int,
+        batch_size: int = 65536
+) -> dict:
+    """
+    Partition the index and chunk store by document into n_shards
+    index + chunk store (+ lexical index) pairs under shard_dir.
+
+    Each shard index is a reset clone of the source, so IVF/PQ training is
+    shared; tombstoned rows are left out. The shards are built next to
+    shard_dir and swapped in, and shards.json records the source state
+    they were split from. This rewrites the whole corpus; later changes
+    to the source are applied by update_shards.
+    """
+    manifest = read_manifest(index_path)
+    store = open_store(store_path, manifest)
+    index = load_index(index_path, manifest)
+    if index.ntotal != len(store):
+        raise RuntimeError(f"FAISS index ({index.ntotal}) != chunk store records ({len(store)})")
+    source = _source_state(manifest, store)
+
+    tmp = shard_dir.with_name(shard_dir.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    template = faiss.clone_index(index.base if isinstance(index, SegmentedIndex) else index)
+    template.reset()
+    faiss.write_index(template, str(tmp / TEMPLATE_FILE))
+
+    shards = []
+    for s, names in enumerate(_docs_by_shard(store.docs, n_shards)):
+        rows = store.doc_rows(names)
+        rows = rows[~store.deleted[rows]]
+
+        name = f"shard_{s:03d}"
+        shard_index = faiss.clone_index(template)
+        with ChunkStoreWriter(tmp / name / SHARD_STORE_DIR, dim=store.dim, with_embeddings=store.has_embeddings) as writer:
+            for start in range(0, len(rows), batch_size):
+                ids = rows[start:start + batch_size]
+                if store.has_embeddings:
+                    vectors = store.embeddings(ids)
+                else:
+                    vectors = index.reconstruct_batch(ids)
+                shard_index.add(vectors)
+                writer.append([store[int(i)] for i in ids], vectors)
+            writer.commit()
+        update_lexical_index(tmp / name / SHARD_STORE_DIR)
+        rows.astype(np.int64).tofile(tmp / name / SHARD_ROWS_FILE)
+        segment = write_segment(tmp / name / SHARD_INDEX_FILE, shard_index, source["version"] or 0)
+        shards.append(_shard_entry(name, [segment], tmp / name / SHARD_STORE_DIR))
+
+    meta = {"format": SHARDS_FORMAT, "n_shards": n_shards, "layout": new_epoch(), "shards": shards, "source": source}
+    _write_shards(tmp, meta)
+
+    # Workers serving the old shards keep their memory maps
+    old = shard_dir.with_name(shard_dir.name + ".old")
+    if old.exists():
+        shutil.rmtree(old)
+    if shard_dir.exists():
+        shard_dir.rename(old)
+    tmp.rename(shard_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+
+def _source_reader(index_path: Path, manifest: dict, store: ChunkStore, start: int):
+    """Vectors of source rows >= start: from the store, or the index segments holding them."""
+    if store.has_embeddings:
+        return store.embeddings
+    offset, covering = 0, []
+    for segment in manifest["segments"]:
+        if covering or offset + segment["ntotal"] > start:
+            covering.append(segment)
+        else:
+            offset += segment["ntotal"]
+    index = load_index(index_path, dict(manifest, segments=covering), mmap=True)
+    return lambda ids: index.reconstruct_batch(np.asarray(ids, dtype=np.int64) - offset)
+
+
+def update_shards(
+        index_path: Path,
+        store_path: Path,
+        shard_dir: Path,
+        meta: dict,
+        max_segments: int = 8,
+        batch_size: int = 65536
+) -> Optional[dict]:
+    """
+    Apply what changed in the source since meta was written, in time
+    proportional to the change. Source rows appended since go to the shard
+    of their document: a new segment per shard (a reset clone of the
+    template; past max_segments a shard's segments are merged), appended to
+    its chunk store, lexical index and row map. Source rows tombstoned
+    since are tombstoned in their shard. Then shards.json is replaced and
+    unreferenced segment files are deleted.
+
+    Returns the new shards.json contents, or None when the shards cannot be
+    updated and need a full split: the source epoch changed (a rebuild or
+    compaction renumbers rows), or a shard store moved past the commit
+    shards.json records (an update cut short).
+    """
+    manifest = read_manifest(index_path)
+    store = open_store(store_path, manifest)
+    source = _source_state(manifest, store)
+    previous = meta["source"]
+    if source["epoch"] is None or source["epoch"] != previous["epoch"] or source["ntotal"] < previous["ntotal"]:
+        return None
+    for shard in meta["shards"]:
+        if read_meta(shard_dir / shard["name"] / SHARD_STORE_DIR).get("commit") != shard["store"]["commit"]:
+            return None
+
+    # Rows appended and deleted again before this update are skipped, as in a split
+    new_rows = np.arange(previous["ntotal"], len(store), dtype=np.int64)
+    new_rows = new_rows[~store.deleted[new_rows]]
+    routed = [
+        np.intersect1d(store.doc_rows(names), new_rows)
+        for names in _docs_by_shard(store.docs, meta["n_shards"])
+    ]
+    vectors_of = _source_reader(index_path, manifest, store, int(new_rows[0])) if len(new_rows) else None
+    template = faiss.read_index(str(shard_dir / TEMPLATE_FILE))
+
+    shards, appended, deleted = [], 0, 0
+    for shard, added in zip(meta["shards"], routed):
+        path = shard_dir / shard["name"]
+        shard_store = _open_shard_store(shard_dir, shard)
+        source_rows = np.fromfile(path / SHARD_ROWS_FILE, dtype=np.int64, count=len(shard_store))
+        dead = np.flatnonzero(store.deleted[source_rows] & ~shard_store.deleted)
+        if not len(dead) and not len(added):
+            shards.append(shard)
+            continue
+
+        segments = list(shard["segments"])
+        with ChunkStoreWriter(path / SHARD_STORE_DIR) as writer:
+            deleted += writer.delete_rows(dead)
+            if len(added):
+                delta = faiss.clone_index(template)
+                for start in range(0, len(added), batch_size):
+                    ids = added[start:start + batch_size]
+                    vectors = vectors_of(ids)
+                    delta.add(vectors)
+                    writer.append([store[int(i)] for i in ids], vectors)
+                if len(segments) >= max_segments:
+                    delta = merge_indexes(load_segments(path / SHARD_INDEX_FILE, segments) + [delta])
+                    segments = []
+                segments.append(write_segment(path / SHARD_INDEX_FILE, delta, manifest["version"]))
+                # Anything past the recorded count is left over from an update cut short
+                with (path / SHARD_ROWS_FILE).open("r+b") as f:
+                    f.truncate(len(shard_store) * 8)
+                    f.seek(0, os.SEEK_END)
+                    f.write(added.astype(np.int64).tobytes())
+                appended += len(added)
+            writer.commit()
+        update_lexical_index(path / SHARD_STORE_DIR)
+        shards.append(_shard_entry(shard["name"], segments, path / SHARD_STORE_DIR))
+
+    # Tombstones keep row ids; appends shift the global ids of later shards
+    layout = new_epoch() if appended else meta["layout"]
+    meta = dict(meta, layout=layout, shards=shards, source=source)
+    _write_shards(shard_dir, meta)
+    for shard in shards:
+        keep = {segment["file"] for segment in shard["segments"]}
+        for path in (shard_dir / shard["name"]).glob(f"{Path(SHARD_INDEX_FILE).stem}.*.faiss*"):
+            if path.name not in keep:
+                path.unlink()
+    logger.info("Updated shards: %d rows appended, %d tombstoned", appended, deleted)
+    return meta
+
+
+def _serve_shard(conn, shard_dir: str, shard: dict, threads: int):
+    # Shard worker process: owns one shard's memory-mapped segments (and its
+    # tombstones, filtered inside FAISS) and answers (request id, op, args)
+    # messages until the pipe closes
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    faiss.omp_set_num_threads(threads)
+    path = Path(shard_dir) / shard["name"]
+    index = load_index(path / SHARD_INDEX_FILE, {"version": None, "segments": shard["segments"]}, mmap=True)
+    store = _open_shard_store(Path(shard_dir), shard)
+    keep = ~store.deleted if store.n_deleted else None
+    conn.send((index.ntotal, index.d))
+
+    while True:
+        try:
+            req_id, op, args = conn.recv()
+        except EOFError:
+            return
+        if op == "close":
+            return
+        try:
+            if op == "search":
+                x, k, nprobe, ef_search = args
+                if index.ntotal == 0:
+                    result = (np.full((len(x), k), -np.inf, dtype=np.float32), np.full((len(x), k), -1, dtype=np.int64))
+                else:
+                    result = search_index(index, x, min(k, index.ntotal), nprobe=nprobe, ef_search=ef_search, keep=keep)
+            elif op == "reconstruct":
+                result = index.reconstruct_batch(args)
+            else:
+                raise ValueError(f"Unknown shard op: {op}")
+            conn.send((req_id, None, result))
+        except Exception as e:
+            conn.send((req_id, repr(e), None))
+
+
+class _ShardClient:
+    """Parent-side handle of one shard worker; requests are pipelined and matched by id."""
+
+    def __init__(self, ctx, shard_dir: Path, shard: dict, threads: int, name: str):
+        self._conn, child = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_serve_shard, args=(child, str(shard_dir), shard, threads), name=name, daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.ntotal = self.d = None
+        self._pending: Dict[int, Future] = {}
+        self._send_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._reader = None
+
+    def wait_ready(self):
+        try:
+            self.ntotal, self.d = self._conn.recv()
+        except EOFError:
+            raise RuntimeError(f"Shard worker {self.process.name} exited during startup (exit code {self.process.exitcode})")
+        self._reader = threading.Thread(target=self._read, name=f"{self.process.name}-reader", daemon=True)
+        self._reader.start()
+
+    def submit(self, op: str, args) -> Future:
+        future = Future()
+        with self._send_lock:
+            req_id = next(self._ids)
+            self._pending[req_id] = future
+            self._conn.send((req_id, op, args))
+        return future
+
+    def _read(self):
+        while True:
+            try:
+                req_id, error, result = self._conn.recv()
+            except (EOFError, OSError):
+                with self._send_lock:
+                    pending, self._pending = self._pending, {}
+                for future in pending.values():
+                    future.set_exception(RuntimeError(f"Shard worker {self.process.name} exited"))
+                return
+            future = self._pending.pop(req_id)
+            if error is not None:
+                future.set_exception(RuntimeError(f"Shard worker {self.process.name}: {error}"))
+            else:
+                future.set_result(result)
+
+    def close(self):
+        try:
+            with self._send_lock:
+                self._conn.send((None, "close", None))
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self._conn.close()
+
+
+class ShardPool:
+    """
+    One worker process per shard (an entry of shards.json), each loading
+    the shard's segments with memory-mapped storage. search() fans a query
+    batch out to every shard and merges the per-shard top k; ids are
+    global, shard i covering [offsets[i], offsets[i+1]). Exposes the
+    ntotal / d / search / reconstruct_batch surface Retrievar uses from an
+    index.
+    """
+
+    def __init__(self, shard_dir: Path, shards: List[dict], threads_per_shard: int = 1):
+        # spawn: forking a process that already runs threads (and maybe torch) is unsafe
+        ctx = multiprocessing.get_context("spawn")
+        self.shards = [
+            _ShardClient(ctx, shard_dir, shard, threads_per_shard, name=f"shard-{i}")
+            for i, shard in enumerate(shards)
+        ]
+        for shard in self.shards:
+            shard.wait_ready()
+        self.offsets = np.cumsum([0] + [shard.ntotal for shard in self.shards])
+        self.ntotal = int(self.offsets[-1])
+        self.d = self.shards[0].d
+
+    def search(self, x: np.ndarray, k: int, nprobe: int = None, ef_search: int = None):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        futures = [shard.submit("search", (x, k, nprobe, ef_search)) for shard in self.shards]
+        all_scores, all_ids = [], []
+        for offset, future in zip(self.offsets, futures):
+            scores, ids = future.result()
+            all_scores.append(scores)
+            all_ids.append(np.where(ids >= 0, ids + offset, -1))
+        return merge_topk(all_scores, all_ids, k)
+
+    def reconstruct_batch(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        which = np.searchsorted(self.offsets, ids, side="right") - 1
+        futures = {
+            int(s): self.shards[s].submit("reconstruct", ids[which == s] - self.offsets[s])
+            for s in np.unique(which)
+        }
+        out = np.empty((len(ids), self.d), dtype=np.float32)
+        for s, future in futures.items():
+            out[which == s] = future.result()
+        return out
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+class ShardedChunkStore:
+    """Read-only view over the shards' chunk stores, addressed by global row id."""
+
+    def __init__(self, stores: List[ChunkStore]):
+        self.stores = stores
+        self.offsets = np.cumsum([0] + [len(store) for store in stores])
+        self.count = int(self.offsets[-1])
+        self.has_embeddings = all(store.has_embeddings for store in stores)
+        # Splits leave tombstoned rows out; updates tombstone them in place
+        self.deleted = np.concatenate([store.deleted for store in stores]) if stores else np.zeros(0, dtype=bool)
+        self.n_deleted = int(self.deleted.sum())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _locate(self, i: int):
+        s = int(np.searchsorted(self.offsets, i, side="right")) - 1
+        return self.stores[s], int(i - self.offsets[s])
+
+    def text(self, i: int) -> str:
+        store, row = self._locate(i)
+        return store.text(row)
+
+    def __getitem__(self, i: int) -> dict:
+        store, row = self._locate(i)
+        return store[row]
+
+    def embeddings(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        which = np.searchsorted(self.offsets, ids, side="right") - 1
+        out = np.empty((len(ids), self.stores[0].dim), dtype=np.float32)
+        for s in np.unique(which):
+            mask = which == s
+            out[mask] = self.stores[s].embeddings(ids[mask] - self.offsets[s])
+        return out
+
+
+class ShardedLexicalIndex:
+    """
+    BM25 over every shard's lexical index, merged by score. Each shard is
+    scored with corpus-wide statistics (row count, average row length and
+    document frequencies summed over the shards), so a row scores as it
+    would in one index over all shard rows and the merged top k does not
+    depend on the shard count.
+    """
+
+    def __init__(self, indexes: List[LexicalIndex], offsets: np.ndarray):
+        self.indexes = indexes
+        self.offsets = offsets
+        self.count = sum(len(index) for index in indexes)
+        self.avgdl = sum(index.total_len for index in indexes) / self.count if self.count else 0.0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _stats(self, query: str) -> BM25Stats:
+        terms = self.indexes[0].term_ids(query)
+        doc_freqs = dict.fromkeys(terms, 0)
+        for index in self.indexes:
+            for term, df in index.doc_freqs(terms).items():
+                doc_freqs[term] += df
+        return BM25Stats(self.count, self.avgdl, doc_freqs)
+
+    def search_batch(self, queries: List[str], k: int, keep: np.ndarray = None) -> List[List[int]]:
+        results = []
+        for query in queries:
+            stats = self._stats(query)
+            rows, scores = [], []
+            for index, start, end in zip(self.indexes, self.offsets, self.offsets[1:]):
+                # A shard's keep slice also hides rows its lexical index covers past the pinned store
+                shard_keep = keep[start:end] if keep is not None else np.ones(end - start, dtype=bool)
+                r, s = index.search(query, k, shard_keep, stats=stats)
+                rows.append(r + start)
+                scores.append(s)
+            rows, scores = np.concatenate(rows), np.concatenate(scores)
+            results.append(rows[np.argsort(-scores, kind="stable")[:k]].tolist())
+        return results
+
+
+class ShardedRetrievar(Retrievar):
+    """
+    Retrievar over n_shards document-partitioned shards, each searched by
+    its own worker process so one query scans the shards in parallel.
+
+    The shards are split from the regular index and chunk store (see
+    split_into_shards) and kept in step with them by update_shards, which
+    routes new rows to their document's shard and tombstones deleted
+    ones; only a rebuild or compaction of the source (a new epoch) or a
+    different shard count triggers a new split. The query is encoded once
+    here; only the FAISS search runs in the workers. Their merged top
+    candidates then go through the same fusion, MMR and reranking as in
+    Retrievar. Chunk texts and vectors for those steps are read from the
+    shards' memory-mapped stores in this process.
+    """
+
+    def __init__(
+            self,
+            idx_path: Path,
+            store_path: Path,
+            chunks_path: Path,
+            shard_dir: Path,
+            n_shards: int,
+            threads_per_shard: int = 1,
+            max_segments: int = 8,
+            **kwargs
+    ):
+        self.shard_dir = shard_dir
+        self.n_shards = n_shards
+        self.threads_per_shard = threads_per_shard
+        # Segments per shard before update_shards merges them
+        self.max_segments = max_segments
+        self._pool: Optional[ShardPool] = None
+        self._retired: Optional[ShardPool] = None
+        super().__init__(idx_path, store_path, chunks_path, **kwargs)
+
+    def _sync_shards(self) -> dict:
+        meta = read_shards(self.shard_dir)
+        if meta is not None and meta.get("format") == SHARDS_FORMAT and meta["n_shards"] == self.n_shards:
+            if meta["source"] == source_state(self.idx_path, self.store_path):
+                return meta
+            meta = update_shards(self.idx_path, self.store_path, self.shard_dir, meta, max_segments=self.max_segments)
+            if meta is not None:
+                return meta
+        source = source_state(self.idx_path, self.store_path)
+        logger.info("Splitting %d chunks into %d shards...", source["ntotal"], self.n_shards)
+        return split_into_shards(self.idx_path, self.store_path, self.shard_dir, self.n_shards)
+
+    def _load(self):
+        meta = self._sync_shards()
+        pool = ShardPool(self.shard_dir, meta["shards"], self.threads_per_shard)
+        store = ShardedChunkStore([_open_shard_store(self.shard_dir, shard) for shard in meta["shards"]])
+        lexical = ShardedLexicalIndex(
+            [LexicalIndex.for_store(self.shard_dir / shard["name"] / SHARD_STORE_DIR) for shard in meta["shards"]],
+            store.offsets
+        )
+
+        # Searches still running on the previous pool keep using it; it is
+        # shut down on the next reload instead of now
+        if self._retired is not None:
+            self._retired.close()
+        self._retired, self._pool = self._pool, pool
+        # The epoch keys corpus-level caches (cross-encoder scores by row id).
+        # Sharded row ids move when rows are appended to a shard or the
+        # corpus is re-split, so it is the shard layout, not the source epoch.
+        self._snapshot = Snapshot(
+            pool, store, self.generation + 1, f"shards-{meta['layout']}",
+            ~store.deleted if store.n_deleted else None, lexical, meta["source"]["version"]
+        )
+
+    def reload(self):
+        """Update the shards and restart the workers if the source manifest changed."""
+        with timed(INDEXING_SECONDS, operation="reload"):
+            meta = read_shards(self.shard_dir)
+            if meta is not None and self._pool is not None and meta["source"] == source_state(self.idx_path, self.store_path):
+                logger.info("Retriever already up to date")
+                return
+            logger.info("Reloading sharded retriever...")
+            self._load()
+            logger.info("Loaded %d vectors in %d shards", self.idx.ntotal, self.n_shards)
+
+    def _dense_search(self, snap: Snapshot, query_vecs: np.ndarray, k: int, nprobe: int, ef_search: int):
+        # Tombstones are filtered by the workers
+        return snap.idx.search(query_vecs, k, nprobe=nprobe, ef_search=ef_search)
+
+    def close(self):
+        for pool in (self._retired, self._pool):
+            if pool is not None:
+                pool.close()
+        self._retired = self._pool = None
@@ -1,20 +1,141 @@
+from typing import Iterator, List, Tuple
+
+import numpy as np
 import tiktoken
 
 tokenizer = tiktoken.get_encoding("cl100k_base")
 
+# Indexed by token id: byte length (-1 = not looked up yet) and whether the
+# token ends a sentence. Filled lazily; bounded by the vocabulary size.
+_token_lengths = np.full(0, -1, dtype=np.int64)
+_token_breaks = np.zeros(0, dtype=bool)
+_SENTENCE_ENDS = (b".", b"?", b"!", b"\n")
+PAGE_SEPARATOR = "\n"
+
+
+def _lookup(tokens: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-token byte lengths and sentence-end flags; each distinct token is decoded once per process."""
+    global _token_lengths, _token_breaks
+    top = int(tokens.max()) + 1
+    if top > len(_token_lengths):
+        grow = top - len(_token_lengths)
+        _token_lengths = np.concatenate([_token_lengths, np.full(grow, -1, dtype=np.int64)])
+        _token_breaks = np.concatenate([_token_breaks, np.zeros(grow, dtype=bool)])
+
+    lengths = _token_lengths[tokens]
+    unknown = np.unique(tokens[lengths < 0])
+    if len(unknown):
+        for t in unknown.tolist():
+            raw = tokenizer.decode_single_token_bytes(t)
+            _token_lengths[t] = len(raw)
+            _token_breaks[t] = raw.rstrip(b" ").endswith(_SENTENCE_ENDS)
+        lengths = _token_lengths[tokens]
+    return lengths, _token_breaks[tokens]
+
+
+def _windows(
+        n: int,
+        chunksize: int,
+        overlap: int,
+        breaks: np.ndarray = None,
+) -> Iterator[Tuple[int, int]]:
+    start = 0
+    while start < n:
+        end = min(start + chunksize, n)
+        if breaks is None:
+            yield start, end
+            start += chunksize - overlap
+            continue
+
+        # Pull the end back to the last sentence end in the window's tail
+        if end < n:
+            lo = start + max(chunksize - overlap, 1)
+            hits = np.flatnonzero(breaks[lo:end])
+            if len(hits):
+                end = lo + int(hits[-1]) + 1
+        yield start, end
+        if end == n:
+            return
+
+        # Start the overlap at the first sentence start inside it
+        nxt = max(end - overlap, start + 1)
+        hits = np.flatnonzero(breaks[nxt:end - 1])
+        start = nxt + int(hits[0]) + 1 if len(hits) else nxt
+
+
+def chunk_pages(
+        pages: List[dict],
+        chunksize: int = 500,
+        overlap: int = 100,
+        across_pages: bool = False,
+        sentence_aware: bool = False,
+        num_threads: int = 1,
+) -> List[dict]:
+    """
+    Token-window chunking of a document's pages ({"page", "text"} dicts).
+
+    Pages are tokenized together, on num_threads threads via
+    encode_ordinary_batch when num_threads > 1 (the ingestion pipeline
+    already parses one document per process, so it keeps the default).
+    Windows are cut by slicing the page's utf-8 bytes at token byte
+    offsets, which gives the same text as decoding the window's tokens
+    without re-decoding anything.
+
+    across_pages lets windows run over page breaks (pages are joined with a
+    newline); each chunk records the first and last page it covers.
+    sentence_aware ends windows at the last sentence boundary within their
+    final `overlap` tokens when there is one.
+
+    Returns {"text", "page", "page_end"} dicts in document order.
+    """
+    texts = [p["text"] for p in pages]
+    if num_threads > 1:
+        token_lists = tokenizer.encode_ordinary_batch(texts, num_threads=num_threads)
+    else:
+        token_lists = [tokenizer.encode_ordinary(t) for t in texts]
+
+    if across_pages:
+        groups = [list(range(len(pages)))]
+    else:
+        groups = [[i] for i in range(len(pages))]
+    separator = tokenizer.encode_ordinary(PAGE_SEPARATOR)
+
+    chunks = []
+    for group in groups:
+        parts, page_of, raw = [], [], []
+        for n, i in enumerate(group):
+            tokens = token_lists[i]
+            text = pages[i]["text"].encode("utf-8")
+            if n < len(group) - 1:
+                tokens = tokens + separator
+                text += PAGE_SEPARATOR.encode("utf-8")
+            parts.append(np.array(tokens, dtype=np.int64))
+            page_of.append(np.full(len(tokens), pages[i]["page"], dtype=np.int64))
+            raw.append(text)
+
+        tokens = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        if not len(tokens):
+            continue
+        page_of = np.concatenate(page_of)
+        data = b"".join(raw)
+
+        lengths, breaks = _lookup(tokens)
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        for start, end in _windows(len(tokens), chunksize, overlap, breaks if sentence_aware else None):
+            chunks.append({
+                # errors="replace" matches tokenizer.decode for windows that split a character
+                "text": data[offsets[start]:offsets[end]].decode("utf-8", errors="replace"),
+                "page": int(page_of[start]),
+                "page_end": int(page_of[end - 1]),
+            })
+    return chunks
+
+
 def chunk_txt(
         txt:str,
         chunksize:int=500,
         overlap:int=100,
 )->list[str]:
-    tokens = tokenizer.encode(txt)
-    chunks = []
-
-    start = 0
-    while start < len(tokens):
-        end=start+chunksize
-        chunk_tokens=tokens[start:end]
-        chunk_txt=tokenizer.decode(chunk_tokens)
-        chunks.append(chunk_txt)
-        start+=chunksize-overlap
-    return chunks
\ No newline at end of file
+    return [c["text"] for c in chunk_pages([{"page": 0, "text": txt}], chunksize, overlap)]
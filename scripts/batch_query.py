@@ -0,0 +1,266 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from backend.app.config import settings
+from backend.app.services.retrieval import Retrievar
+from backend.app.services.sharding import ShardedRetrievar
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+INDEX_PATH = PROJECT_ROOT / "data" / "faiss" / "index.faiss"
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
+CHUNKS_PATH = PROJECT_ROOT / "data" / "processed" / "chunks.jsonl"
+SHARD_DIR = PROJECT_ROOT / "data" / "shards"
+PROMPT_PATH = PROJECT_ROOT / "backend" / "app" / "prompts" / "rag_prompt.txt"
+
+# Offline bulk retrieval / answering: questions stream in from a JSONL file
+# ({"question": ..., "id": optional}) and are searched a batch at a time
+# through Retrievar.search_batch (one encode call, one FAISS search, one MMR
+# pass and batched cross-encoder predicts per batch). With --answer, Gemini
+# is called concurrently under a rate limit while the next batch is being
+# retrieved. Output lines are written in input order; after every batch a
+# checkpoint records how far the input and output got, so an interrupted
+# run continues where it stopped.
+
+
+class RateLimiter:
+    """Spaces call starts at least 1 / rate seconds apart (no limit when rate is falsy)."""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def read_checkpoint(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def write_checkpoint(path: Path, checkpoint: dict):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(checkpoint, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def iter_batches(path: Path, skip_lines: int, batch_size: int) -> Iterator[Tuple[int, List[dict]]]:
+    """(input lines consumed so far, questions) per batch; blank lines are skipped."""
+    batch, line_no = [], 0
+    with path.open("r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if line_no <= skip_lines or not line.strip():
+                continue
+            record = json.loads(line)
+            if "question" not in record:
+                raise ValueError(f"{path}:{line_no}: missing 'question'")
+            batch.append({"id": record.get("id", line_no), "question": record["question"]})
+            if len(batch) >= batch_size:
+                yield line_no, batch
+                batch = []
+    if batch:
+        yield line_no, batch
+
+
+def make_retriever():
+    options = dict(
+        hybrid=settings.HYBRID_SEARCH,
+        rrf_k=settings.RRF_K,
+        ce_cache_size=settings.CE_CACHE_SIZE,
+        ce_skip_margin=settings.CE_SKIP_MARGIN,
+        ce_batch_size=settings.CE_BATCH_SIZE or None,
+        rescore_factor=settings.RESCORE_FACTOR,
+    )
+    if settings.RETRIEVAL_SHARDS > 0:
+        return ShardedRetrievar(
+            INDEX_PATH, STORE_PATH, CHUNKS_PATH,
+            shard_dir=SHARD_DIR,
+            n_shards=settings.RETRIEVAL_SHARDS,
+            threads_per_shard=settings.SHARD_THREADS,
+            max_segments=settings.INDEX_MAX_SEGMENTS,
+            **options
+        )
+    return Retrievar(INDEX_PATH, STORE_PATH, CHUNKS_PATH, **options)
+
+
+def make_rag(retriever):
+    # Imported here: search-only runs need neither the Gemini client nor its API key
+    from backend.app.services.rag import RAGService
+    return RAGService(
+        retriever,
+        PROMPT_PATH,
+        llm_base_url=settings.GEMINI_BASE_URL,
+        llm_timeout_s=settings.LLM_TIMEOUT_S,
+        llm_max_retries=settings.LLM_MAX_RETRIES,
+        llm_backoff_s=settings.LLM_BACKOFF_S,
+        context_max_tokens=settings.CONTEXT_MAX_TOKENS,
+        context_merge=settings.CONTEXT_MERGE_ADJACENT
+    )
+
+
+async def run(args, retriever, rag) -> dict:
+    checkpoint_path = args.checkpoint or args.output.with_name(args.output.name + ".checkpoint.json")
+    checkpoint = None if args.restart else read_checkpoint(checkpoint_path)
+    if checkpoint is not None:
+        if checkpoint["input"] != str(args.input.resolve()) or not args.output.exists():
+            raise SystemExit(f"{checkpoint_path} does not match {args.input} -> {args.output}; pass --restart to start over")
+        if checkpoint["index_version"] != retriever.version:
+            print(f"Note: the index changed since the checkpoint (version {checkpoint['index_version']} -> {retriever.version})")
+        # Lines past the checkpoint come from a batch that never finished
+        with args.output.open("r+b") as f:
+            f.truncate(checkpoint["output_bytes"])
+        print(f"Resuming after {checkpoint['queries']} queries ({checkpoint['input_lines']} input lines)")
+    elif args.output.exists() and not args.restart:
+        raise SystemExit(f"{args.output} exists without a checkpoint; pass --restart to overwrite it")
+    else:
+        checkpoint = {
+            "input": str(args.input.resolve()),
+            "input_lines": 0,
+            "output_bytes": 0,
+            "queries": 0,
+            "index_version": retriever.version,
+        }
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_bytes(b"")
+
+    loop = asyncio.get_running_loop()
+    limiter = RateLimiter(args.llm_rate)
+    slots = asyncio.Semaphore(args.llm_concurrency)
+    stats = {"queries": 0, "retrieval_s": 0.0, "llm_calls": 0, "llm_errors": 0}
+
+    def retrieve(questions: List[str]) -> List[List[dict]]:
+        start = time.perf_counter()
+        results = retriever.search_batch(
+            questions,
+            top_k=args.top_k,
+            use_mmr=not args.no_mmr,
+            use_ce=not args.no_ce,
+            ce_top_n=args.ce_top_n,
+            nprobe=args.nprobe,
+            ef_search=args.ef_search,
+            hybrid=args.hybrid,
+        )
+        stats["retrieval_s"] += time.perf_counter() - start
+        return results
+
+    async def answer(question: str, results: List[dict]) -> dict:
+        async with slots:
+            await limiter.wait()
+            stats["llm_calls"] += 1
+            try:
+                return {"answer": await rag.generate_async(question, results)}
+            except Exception as e:
+                stats["llm_errors"] += 1
+                return {"error": f"{type(e).__name__}: {e}"}
+
+    def output_record(item: dict, results: List[dict], answered: Optional[dict]) -> dict:
+        record = {
+            "id": item["id"],
+            "question": item["question"],
+            "results": [r if args.with_text else {k: v for k, v in r.items() if k != "text"} for r in results],
+        }
+        if answered is not None:
+            record.update(answered)
+        return record
+
+    start = time.perf_counter()
+    with args.output.open("ab") as out:
+
+        async def flush(pending):
+            input_lines, items, results, tasks = pending
+            answers = await asyncio.gather(*tasks) if tasks else [None] * len(items)
+            out.write(b"".join(
+                (json.dumps(output_record(item, res, ans), ensure_ascii=False) + "\n").encode("utf-8")
+                for item, res, ans in zip(items, results, answers)
+            ))
+            out.flush()
+            os.fsync(out.fileno())
+            stats["queries"] += len(items)
+            checkpoint.update(
+                input_lines=input_lines,
+                output_bytes=out.tell(),
+                queries=checkpoint["queries"] + len(items),
+                index_version=retriever.version,
+            )
+            write_checkpoint(checkpoint_path, checkpoint)
+            elapsed = time.perf_counter() - start
+            print(f"{checkpoint['queries']} queries done, {stats['queries'] / elapsed:.1f} q/s")
+
+        # Batch N's LLM calls run while batch N+1 is retrieved; batches are
+        # written strictly in order so the checkpoint is a plain prefix
+        pending = None
+        for input_lines, items in iter_batches(args.input, checkpoint["input_lines"], args.batch_size):
+            results = await loop.run_in_executor(None, retrieve, [item["question"] for item in items])
+            tasks = None
+            if rag is not None:
+                tasks = [asyncio.ensure_future(answer(item["question"], res)) for item, res in zip(items, results)]
+            if pending is not None:
+                await flush(pending)
+            pending = (input_lines, items, results, tasks)
+        if pending is not None:
+            await flush(pending)
+
+    seconds = time.perf_counter() - start
+    return {
+        "queries": stats["queries"],
+        "resumed_after": checkpoint["queries"] - stats["queries"],
+        "seconds": round(seconds, 3),
+        "qps": round(stats["queries"] / seconds, 2) if seconds else 0.0,
+        "retrieval_s": round(stats["retrieval_s"], 3),
+        "retrieval_qps": round(stats["queries"] / stats["retrieval_s"], 2) if stats["retrieval_s"] else 0.0,
+        "llm_calls": stats["llm_calls"],
+        "llm_errors": stats["llm_errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch retrieval (and answering) of questions from a JSONL file")
+    parser.add_argument("input", type=Path, help='JSONL with one {"question": ..., "id": ...} per line')
+    parser.add_argument("output", type=Path, help="JSONL with the results (and answers), in input order")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="default: <output>.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and overwrite output")
+    parser.add_argument("--batch-size", type=int, default=256, help="questions per search_batch call")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--no-mmr", action="store_true")
+    parser.add_argument("--no-ce", action="store_true", help="skip cross-encoder reranking")
+    parser.add_argument("--ce-top-n", type=int, default=30)
+    parser.add_argument("--nprobe", type=int, default=None)
+    parser.add_argument("--ef-search", type=int, default=None)
+    parser.add_argument("--hybrid", action=argparse.BooleanOptionalAction, default=None,
+                        help="fuse BM25 results (default: HYBRID_SEARCH)")
+    parser.add_argument("--with-text", action="store_true", help="include chunk texts in the output")
+    parser.add_argument("--answer", action="store_true", help="also generate an answer per question with the LLM")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="LLM calls in flight at once")
+    parser.add_argument("--llm-rate", type=float, default=None, help="max LLM calls started per second")
+    args = parser.parse_args()
+
+    retriever = make_retriever()
+    if retriever.idx is None:
+        raise SystemExit("No index found; run scripts/run_pipeline.py first")
+    rag = make_rag(retriever) if args.answer else None
+    try:
+        report = asyncio.run(run(args, retriever, rag))
+    finally:
+        retriever.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from backend.app.services.retrieval import Retrievar
+from backend.app.services.batching import QueryBatcher
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+INDEX_PATH = PROJECT_ROOT / "data" / "faiss" / "index.faiss"
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
+CHUNKS_PATH = PROJECT_ROOT / "data" / "processed" / "chunks.jsonl"
+
+QUERIES = [
+    "What is transformer architecture?",
+    "How does multi-head attention work?",
+    "What is residual learning?",
+    "How are GANs trained?",
+    "What is masked language modeling?",
+    "Which dataset was used for ImageNet classification?",
+    "What is dropout used for?",
+    "How does positional encoding work?",
+]
+
+
+def run(search, clients: int, requests_per_client: int) -> float:
+    def client(c):
+        for r in range(requests_per_client):
+            search(QUERIES[(c + r) % len(QUERIES)])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    return clients * requests_per_client / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search throughput with and without query micro-batching")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    retriever = Retrievar(INDEX_PATH, STORE_PATH, CHUNKS_PATH)
+    batcher = QueryBatcher(retriever, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+
+    # Warm up both models before timing
+    retriever.search(QUERIES[0])
+
+    print(f"{'clients':>8} {'direct qps':>12} {'batched qps':>12}")
+    for clients in args.clients:
+        direct = run(retriever.search, clients, args.requests)
+        batched = run(batcher.search, clients, args.requests)
+        print(f"{clients:>8} {direct:>12.1f} {batched:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
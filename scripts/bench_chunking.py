@@ -0,0 +1,74 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import time
+from pathlib import Path
+
+from backend.app.services.ingestion import extract_from_pdf
+from backend.app.utils import chunking
+from backend.app.utils.chunking import chunk_pages
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+RAW_PDF_DIR = PROJECT_ROOT / "data" / "raw_pdfs"
+
+
+def reference_chunk_txt(txt: str, chunksize: int = 500, overlap: int = 100) -> list:
+    """The original per-page implementation: encode, then decode every window."""
+    tokens = chunking.tokenizer.encode(txt)
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        chunks.append(chunking.tokenizer.decode(tokens[start:start + chunksize]))
+        start += chunksize - overlap
+    return chunks
+
+
+def timed(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunking throughput: per-page decode vs batched offset slicing")
+    parser.add_argument("--pdf-dir", type=Path, default=RAW_PDF_DIR)
+    parser.add_argument("--chunksize", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Extract once up front; only chunking is timed
+    docs = [extract_from_pdf(pdf) for pdf in sorted(args.pdf_dir.glob("*.pdf"))]
+    n_pages = sum(len(d) for d in docs)
+    n_mb = sum(len(p["text"].encode("utf-8")) for d in docs for p in d) / 1e6
+    print(f"{len(docs)} documents, {n_pages} pages, {n_mb:.1f} MB of text")
+
+    def reference():
+        return [[c for p in d for c in reference_chunk_txt(p["text"], args.chunksize, args.overlap)] for d in docs]
+
+    def batched(**options):
+        return lambda: [[c["text"] for c in chunk_pages(d, args.chunksize, args.overlap, **options)] for d in docs]
+
+    ref_s, ref = timed(reference, args.repeat)
+    print(f"{'reference':16s} {ref_s * 1000:8.1f} ms  {n_mb / ref_s:6.2f} MB/s  {sum(map(len, ref))} chunks")
+
+    for name, options in [
+        ("batched", {}),
+        ("across_pages", {"across_pages": True}),
+        ("sentence_aware", {"across_pages": True, "sentence_aware": True}),
+    ]:
+        s, out = timed(batched(**options), args.repeat)
+        line = f"{name:16s} {s * 1000:8.1f} ms  {n_mb / s:6.2f} MB/s  {sum(map(len, out))} chunks  {ref_s / s:5.2f}x"
+        if not options:
+            mismatches = sum(a != b for a, b in zip(ref, out))
+            line += f"  mismatched docs vs reference: {mismatches}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from backend.app.services.chunk_store import EMBEDDINGS_FILE, ChunkStoreWriter
+from backend.app.services.index import FaissIndexService, new_epoch
+from backend.app.services.manifest import write_index_state
+from backend.app.services.retrieval import Retrievar
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+VECTORS_PATH = PROJECT_ROOT / "data" / "embeddings" / "vectors.npy"
+
+# (label, index_type, rescore_factor)
+MODES = [
+    ("flat", "flat", 0),
+    ("fp16", "fp16", 0),
+    ("sq8", "sq8", 0),
+    ("fp16+rescore", "fp16", 4),
+    ("sq8+rescore", "sq8", 4),
+]
+
+
+def load_vectors(args) -> np.ndarray:
+    if args.synthetic:
+        # Clustered and anisotropic, closer to sentence embeddings than pure noise
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((64, args.dim)).astype("float32")
+        scale = rng.uniform(0.2, 1.0, size=args.dim).astype("float32")
+        vectors = centers[rng.integers(0, 64, size=args.synthetic)]
+        vectors += 0.5 * rng.standard_normal((args.synthetic, args.dim)).astype("float32")
+        vectors *= scale
+    else:
+        vectors = np.load(args.vectors).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, n: int) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    picks = vectors[rng.choice(len(vectors), size=n, replace=False)]
+    queries = picks + 0.1 * rng.standard_normal(picks.shape).astype("float32")
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def write_store(path: Path, vectors: np.ndarray):
+    # Keeps the float32 copy the rescoring modes read
+    with ChunkStoreWriter(path, dim=vectors.shape[1], with_embeddings=True) as writer:
+        for start in range(0, len(vectors), 65536):
+            batch = vectors[start:start + 65536]
+            writer.append([
+                {"doc_id": f"doc_{(start + i) // 50:06d}.pdf", "page": 0, "chunk_id": (start + i) % 50, "text": ""}
+                for i in range(len(batch))
+            ], batch)
+        writer.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per vector, recall@k and latency of float32, fp16 and sq8 storage")
+    parser.add_argument("--vectors", type=Path, default=VECTORS_PATH)
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of vectors.npy")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=None, help="override the shortlist factor of the rescoring modes")
+    parser.add_argument("--out", type=Path, default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    queries = make_queries(vectors, min(args.queries, len(vectors)))
+    n, dim = vectors.shape
+    print(f"Corpus {vectors.shape}, {len(queries)} queries, k={args.k}\n")
+
+    exact = faiss.IndexFlatIP(dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    del exact
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_compression_"))
+    results, build_s = [], {}
+    try:
+        store_path = workdir / "chunk_store"
+        write_store(store_path, vectors)
+        float_bytes = (store_path / EMBEDDINGS_FILE).stat().st_size / n
+
+        for label, index_type, factor in MODES:
+            if factor and args.rescore_factor is not None:
+                factor = args.rescore_factor
+            index_path = workdir / f"{index_type}.faiss"
+            if not index_path.exists():
+                start = time.perf_counter()
+                service = FaissIndexService(dim, index_type=index_type)
+                service.train(vectors)
+                service.add(vectors)
+                build_s[index_type] = time.perf_counter() - start
+                service.save(index_path)
+                write_index_state(index_path, new_epoch(), n)
+
+            retriever = Retrievar(index_path, store_path, None, hybrid=False, rescore_factor=factor)
+            latencies, hits = [], 0
+            for q, row in zip(queries, truth):
+                start = time.perf_counter()
+                res = retriever.search("", top_k=args.k, use_mmr=False, use_ce=False, query_vec=q)
+                latencies.append(time.perf_counter() - start)
+                found = {int(r["doc_id"][4:10]) * 50 + r["chunk_id"] for r in res}
+                hits += len(found & set(row.tolist()))
+
+            results.append({
+                "mode": label,
+                "index_type": index_type,
+                "rescore_factor": factor,
+                "build_s": build_s[index_type],
+                # Resident for every search; the float32 file is only paged in for the shortlist
+                "index_bytes_per_vector": index_path.stat().st_size / n,
+                "rescore_bytes_per_vector": float_bytes if factor else 0.0,
+                "recall": hits / truth.size,
+                "p50_ms": float(np.percentile(latencies, 50) * 1000),
+                "p95_ms": float(np.percentile(latencies, 95) * 1000),
+            })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'mode':<14} {'index B/vec':>11} {'+float B/vec':>12} {f'recall@{args.k}':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for r in results:
+        print(f"{r['mode']:<14} {r['index_bytes_per_vector']:>11.1f} {r['rescore_bytes_per_vector']:>12.1f} "
+              f"{r['recall']:>10.3f} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f}")
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
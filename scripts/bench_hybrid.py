@@ -0,0 +1,114 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import random
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.app.services.lexical_index import _term_ids, tokenize
+from backend.app.services.retrieval import Retrievar, reciprocal_rank_fusion
+from backend.app.services.index import search_index
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+INDEX_PATH = PROJECT_ROOT / "data" / "faiss" / "index.faiss"
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
+CHUNKS_PATH = PROJECT_ROOT / "data" / "processed" / "chunks.jsonl"
+
+# Acronyms, model names and symbols: tokens with a digit or an inner capital
+EXACT_TERM_RE = re.compile(r"\b(?=\w*(?:\d|[a-z][A-Z]|[A-Z]{2}))\w{3,}\b")
+
+
+def exact_term_queries(retriever: Retrievar, n: int, max_df: int, seed: int) -> list:
+    """
+    (query, relevant rows) pairs for rare exact terms sampled from the
+    corpus; the relevant rows are the live chunks containing the term.
+    """
+    store, lexical = retriever.store, retriever.lexical
+    rng = random.Random(seed)
+    rows = list(range(len(store)))
+    rng.shuffle(rows)
+
+    queries, seen = [], set()
+    for row in rows:
+        if store.deleted[row]:
+            continue
+        for term in EXACT_TERM_RE.findall(store.text(row)):
+            tokens = tokenize(term)
+            if len(tokens) != 1 or tokens[0] in seen:
+                continue
+            seen.add(tokens[0])
+            term_id = _term_ids(tokens, {})[0]
+            relevant = set()
+            for seg in lexical.segments:
+                postings = seg.postings(term_id)
+                if postings is not None:
+                    relevant.update(int(r) for r in postings[0] if not store.deleted[r])
+            if 0 < len(relevant) <= max_df:
+                queries.append((f"What is {term}?", relevant))
+            break
+        if len(queries) >= n:
+            break
+    return queries
+
+
+def recall(ranked: list, relevant: set, n: int) -> float:
+    return len(set(ranked[:n]) & relevant) / min(len(relevant), n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall of dense vs BM25 vs RRF-fused candidates on exact-term queries")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--max-df", type=int, default=5, help="only sample terms found in at most this many chunks")
+    parser.add_argument("--depths", type=int, nargs="+", default=[5, 10, 20, 40])
+    parser.add_argument("--rrf-k", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    retriever = Retrievar(INDEX_PATH, STORE_PATH, CHUNKS_PATH)
+    if retriever.lexical is None:
+        sys.exit("No lexical index; run scripts/build_lexical_index.py first")
+    snap = retriever._snapshot
+
+    queries = exact_term_queries(retriever, args.queries, args.max_df, args.seed)
+    print(f"{len(queries)} exact-term queries over {len(snap.store)} chunks")
+
+    texts = [q for q, _ in queries]
+    depth = max(args.depths)
+    start = time.perf_counter()
+    query_vecs = retriever.encode(texts)
+    _, dense = search_index(snap.idx, query_vecs, depth, keep=snap.keep)
+    dense_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lexical = snap.lexical.search_batch(texts, depth, keep=snap.keep)
+    lexical_s = time.perf_counter() - start
+
+    dense = [[int(i) for i in row if i >= 0] for row in dense]
+    fused = [reciprocal_rank_fusion([d, l], depth, k=args.rrf_k)[0] for d, l in zip(dense, lexical)]
+
+    results = {
+        "queries": len(queries),
+        "dense_ms_per_query": dense_s * 1000 / max(len(queries), 1),
+        "bm25_ms_per_query": lexical_s * 1000 / max(len(queries), 1),
+    }
+    for name, ranked in [("dense", dense), ("bm25", lexical), ("hybrid", fused)]:
+        for n in args.depths:
+            results[f"{name}_recall@{n}"] = float(np.mean([recall(r, rel, n) for r, (_, rel) in zip(ranked, queries)]))
+
+    for name in ("dense", "bm25", "hybrid"):
+        print(f"{name:8s} " + "  ".join(f"R@{n}={results[f'{name}_recall@{n}']:.3f}" for n in args.depths))
+    print(f"encode+dense {results['dense_ms_per_query']:.2f} ms/query, bm25 {results['bm25_ms_per_query']:.2f} ms/query")
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
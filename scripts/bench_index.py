@@ -0,0 +1,107 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import time
+import numpy as np
+import faiss
+from pathlib import Path
+
+from backend.app.services.index import FaissIndexService, search_params
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+VECTORS_PATH = PROJECT_ROOT / "data" / "embeddings" / "vectors.npy"
+
+# (index_type, build kwargs, sweep knob, sweep values)
+CONFIGS = [
+    ("ivf_flat", {}, "nprobe", [1, 4, 16, 64]),
+    ("ivf_pq", {}, "nprobe", [1, 4, 16, 64]),
+    ("hnsw", {}, "ef_search", [16, 32, 64, 128]),
+]
+
+
+def load_vectors(args) -> np.ndarray:
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((args.synthetic, args.dim)).astype("float32")
+    else:
+        vectors = np.load(args.vectors).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, n: int) -> np.ndarray:
+    # Perturbed corpus vectors behave like real queries: close, but not exact hits
+    rng = np.random.default_rng(1)
+    picks = vectors[rng.choice(len(vectors), size=n, replace=False)]
+    queries = picks + 0.1 * rng.standard_normal(picks.shape).astype("float32")
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def run(index, queries, k, params=None):
+    # One query per call, like Retrievar.search
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    start = time.perf_counter()
+    for i, q in enumerate(queries):
+        _, ids[i] = index.search(q.reshape(1, -1), k, params=params)
+    latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+    return ids, latency_ms
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k vs latency of ANN indexes against the flat baseline")
+    parser.add_argument("--vectors", type=Path, default=VECTORS_PATH)
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of vectors.npy")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--out", type=Path, default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    queries = make_queries(vectors, min(args.queries, len(vectors)))
+    dim = vectors.shape[1]
+    print(f"Corpus {vectors.shape}, {len(queries)} queries, k={args.k}\n")
+
+    results = []
+
+    start = time.perf_counter()
+    flat = FaissIndexService(dim)
+    flat.add(vectors)
+    flat_build = time.perf_counter() - start
+    truth, flat_ms = run(flat.index, queries, args.k)
+    results.append({"index": "flat", "knob": None, "value": None, "build_s": flat_build,
+                    "latency_ms": flat_ms, "recall": 1.0})
+
+    for index_type, kwargs, knob, values in CONFIGS:
+        start = time.perf_counter()
+        service = FaissIndexService(dim, index_type=index_type, **kwargs)
+        service.train(vectors)
+        service.add(vectors)
+        build_s = time.perf_counter() - start
+
+        for value in values:
+            params = search_params(service.index, **{knob: value})
+            found, latency_ms = run(service.index, queries, args.k, params=params)
+            results.append({"index": index_type, "knob": knob, "value": value, "build_s": build_s,
+                            "latency_ms": latency_ms, "recall": recall_at_k(found, truth)})
+
+    print(f"{'index':<10} {'knob':<14} {'build s':>8} {'ms/query':>9} {f'recall@{args.k}':>10}")
+    for r in results:
+        knob = f"{r['knob']}={r['value']}" if r["knob"] else "-"
+        print(f"{r['index']:<10} {knob:<14} {r['build_s']:>8.2f} {r['latency_ms']:>9.3f} {r['recall']:>10.3f}")
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.app.services.chunk_store import ChunkStore
+from backend.app.services.models import BACKENDS, get_embedder, get_reranker
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
+
+QUERIES = [
+    "What is transformer architecture?",
+    "How does multi-head attention work?",
+    "What is residual learning?",
+    "How are GANs trained?",
+    "What is masked language modeling?",
+    "Which dataset was used for ImageNet classification?",
+    "What is dropout used for?",
+    "How does positional encoding work?",
+]
+
+
+def load_passages(n: int) -> list:
+    if ChunkStore.exists(STORE_PATH):
+        store = ChunkStore(STORE_PATH)
+        step = max(1, len(store) // n)
+        return [store.text(i) for i in range(0, len(store), step)][:n]
+    # No corpus yet: fall back to the queries themselves, repeated
+    return [QUERIES[i % len(QUERIES)] + f" ({i})" for i in range(n)]
+
+
+def encode(model, texts, batch_size):
+    return model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+
+
+def timed(fn, repeat: int) -> float:
+    fn()  # warm-up
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def quality(ref_backend: str, backend: str, passages: list, ce_top_n: int) -> dict:
+    ref_emb, emb = get_embedder(backend=ref_backend), get_embedder(backend=backend)
+    a = encode(ref_emb, passages, 64)
+    b = encode(emb, passages, 64)
+    cos = np.sum(a * b, axis=1)
+
+    # Rerank the same shortlist with both cross-encoders and compare orders
+    ref_ce, ce = get_reranker(backend=ref_backend), get_reranker(backend=backend)
+    q = encode(ref_emb, QUERIES, 64)
+    top1, overlap, tau = [], [], []
+    for query, qv in zip(QUERIES, q):
+        shortlist = np.argsort(-(a @ qv))[:ce_top_n]
+        pairs = [(query, passages[i]) for i in shortlist]
+        ref_order = np.argsort(-np.asarray(ref_ce.predict(pairs)))
+        order = np.argsort(-np.asarray(ce.predict(pairs)))
+        top1.append(ref_order[0] == order[0])
+        overlap.append(len(set(ref_order[:5]) & set(order[:5])) / 5)
+        tau.append(kendall_tau(ref_order, order))
+
+    return {
+        "embedding_cosine_mean": float(cos.mean()),
+        "embedding_cosine_min": float(cos.min()),
+        "rerank_top1_agreement": float(np.mean(top1)),
+        "rerank_top5_overlap": float(np.mean(overlap)),
+        "rerank_kendall_tau": float(np.mean(tau)),
+    }
+
+
+def kendall_tau(order_a: np.ndarray, order_b: np.ndarray) -> float:
+    # Rank correlation between two orderings of the same items
+    rank_b = np.empty_like(order_b)
+    rank_b[order_b] = np.arange(len(order_b))
+    r = rank_b[order_a]
+    n = len(r)
+    if n < 2:
+        return 1.0
+    concordant = np.sum(np.sign(r[None, :] - r[:, None])[np.triu_indices(n, 1)])
+    return float(concordant / (n * (n - 1) / 2))
+
+
+def latency(backend: str, passages: list, batch_size: int, ce_top_n: int, repeat: int) -> dict:
+    emb, ce = get_embedder(backend=backend), get_reranker(backend=backend)
+    pairs = [(QUERIES[0], p) for p in passages[:ce_top_n]]
+
+    query_s = timed(lambda: encode(emb, QUERIES[:1], 1), repeat)
+    corpus_s = timed(lambda: encode(emb, passages, batch_size), repeat)
+    rerank_s = timed(lambda: ce.predict(pairs), repeat)
+    return {
+        "query_encode_ms": query_s * 1000,
+        "corpus_chunks_per_s": len(passages) / corpus_s,
+        f"rerank_{len(pairs)}_pairs_ms": rerank_s * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quality and speed of the ONNX / int8 inference backends vs PyTorch")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["torch", "torch_int8", "onnx", "onnx_int8"])
+    parser.add_argument("--reference", choices=BACKENDS, default="torch")
+    parser.add_argument("--passages", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--ce-top-n", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    passages = load_passages(args.passages)
+    print(f"{len(passages)} passages, {len(QUERIES)} queries")
+
+    results = {}
+    for backend in args.backends:
+        try:
+            r = latency(backend, passages, args.batch_size, args.ce_top_n, args.repeat)
+            if backend != args.reference:
+                r.update(quality(args.reference, backend, passages, args.ce_top_n))
+        except ImportError as e:
+            print(f"{backend:10s} skipped: {e}")
+            continue
+        results[backend] = r
+        print(f"{backend:10s} " + "  ".join(f"{k}={v:.3f}" for k, v in r.items()))
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import numpy as np
+
+from backend.app.services.retrieval import mmr, mmr_batch
+
+DIM = 384
+CANDIDATE_SIZES = [20, 50, 100, 200]
+TOP_K = 10
+REPEATS = 50
+BATCH = 32
+
+
+def mmr_reference(query_embedding, doc_embeddings, lambda_param=0.7, top_k=5):
+    # The original per-candidate Python loop, kept as the equivalence baseline
+    selected = []
+    candidates = list(range(len(doc_embeddings)))
+    relevance_scores = doc_embeddings @ query_embedding
+
+    first = int(np.argmax(relevance_scores))
+    selected.append(first)
+    candidates.remove(first)
+
+    while len(selected) < top_k and candidates:
+        mmr_scores = []
+        for c in candidates:
+            relevance = relevance_scores[c]
+            diversity = max(
+                doc_embeddings[c] @ doc_embeddings[s]
+                for s in selected
+            )
+            mmr_score = lambda_param * relevance - (1 - lambda_param) * diversity
+            mmr_scores.append((mmr_score, c))
+
+        _, best = max(mmr_scores, key=lambda x: x[0])
+        selected.append(best)
+        candidates.remove(best)
+
+    return selected
+
+
+def unit(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+def timed(fn, repeats=REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+
+    print("Equivalence check")
+    mismatches = 0
+    for trial in range(200):
+        n = int(rng.integers(1, 200))
+        docs = unit(rng.standard_normal((n, DIM)))
+        query = unit(rng.standard_normal(DIM))
+        k = int(rng.integers(1, 20))
+        if mmr(query, docs, top_k=k) != mmr_reference(query, docs, top_k=k):
+            mismatches += 1
+    print(f"  {mismatches} mismatches in 200 random trials")
+
+    batch_docs = unit(rng.standard_normal((BATCH, 100, DIM)))
+    batch_queries = unit(rng.standard_normal((BATCH, DIM)))
+    batched = mmr_batch(batch_queries, batch_docs, top_k=TOP_K)
+    single = [mmr(batch_queries[i], batch_docs[i], top_k=TOP_K) for i in range(BATCH)]
+    print(f"  batched == per-query: {batched == single}")
+
+    print(f"\nLatency per query (top_k={TOP_K})")
+    print(f"{'candidates':>10} {'loop ms':>10} {'numpy ms':>10} {f'batch/{BATCH} ms':>14}")
+    for n in CANDIDATE_SIZES:
+        docs = unit(rng.standard_normal((n, DIM)))
+        query = unit(rng.standard_normal(DIM))
+        loop_ms = timed(lambda: mmr_reference(query, docs, top_k=TOP_K), repeats=10)
+        numpy_ms = timed(lambda: mmr(query, docs, top_k=TOP_K))
+
+        docs_b = unit(rng.standard_normal((BATCH, n, DIM)))
+        queries_b = unit(rng.standard_normal((BATCH, DIM)))
+        batch_ms = timed(lambda: mmr_batch(queries_b, docs_b, top_k=TOP_K), repeats=10) / BATCH
+
+        print(f"{n:>10} {loop_ms:>10.3f} {numpy_ms:>10.3f} {batch_ms:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from backend.app.core.metrics import RERANK_PAIRS
+from backend.app.services.chunk_store import ChunkStoreWriter
+from backend.app.services.index import FaissIndexService, INDEX_TYPES, new_epoch
+from backend.app.services.manifest import write_index_state
+from backend.app.services.lexical_index import update_lexical_index
+from backend.app.services.retrieval import Retrievar
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Search modes replayed through Retrievar.search: (use_mmr, use_ce, hybrid)
+MODES = {
+    "dense": (False, False, False),
+    "mmr": (True, False, False),
+    "ce": (False, True, False),
+    "mmr_ce": (True, True, False),
+    "hybrid": (False, False, True),
+    "hybrid_mmr_ce": (True, True, True),
+}
+
+
+def memory_mb() -> dict:
+    # Current and peak resident set size from /proc (Linux); peak only elsewhere
+    out = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    out["rss_mb"] = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    out["peak_rss_mb"] = int(line.split()[1]) / 1024
+    except OSError:
+        import resource
+        out["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return out
+
+
+def reset_peak_rss():
+    # Linux >= 4.0: resets VmHWM so each run reports its own peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def synthetic_corpus(n: int, dim: int, dup_fraction: float, vocab: int, words: int, seed: int):
+    """
+    Unit vectors plus chunk texts. A dup_fraction of the chunks are near
+    duplicates of earlier ones: a slightly perturbed vector and the same
+    text with a few words swapped. Texts are bags of synthetic words drawn
+    from a per-document topic, so BM25 and the reranker see some structure.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+
+    n_dup = int(n * dup_fraction)
+    dups = rng.choice(np.arange(1, n), size=n_dup, replace=False) if n_dup else np.empty(0, dtype=np.int64)
+    sources = (rng.random(n_dup) * dups).astype(np.int64)
+    vectors[dups] = vectors[sources] + 0.05 * rng.standard_normal((n_dup, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+
+    lexicon = np.array([f"w{i}" for i in range(vocab)])
+    topics = rng.integers(0, vocab, size=(n // 50 + 1, 64))
+    texts = [
+        " ".join(lexicon[rng.choice(topics[i // 50], size=words)])
+        for i in range(n)
+    ]
+    for dup, source in zip(dups, sources):
+        tokens = texts[source].split()
+        for j in rng.integers(0, len(tokens), size=3):
+            tokens[j] = lexicon[rng.integers(0, vocab)]
+        texts[dup] = " ".join(tokens)
+    return vectors, texts
+
+
+def make_queries(vectors: np.ndarray, texts: list, n: int, seed: int):
+    # Perturbed corpus vectors and a few words of the source chunk
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.choice(len(vectors), size=min(n, len(vectors)), replace=False)
+    query_vecs = vectors[picks] + 0.1 * rng.standard_normal((len(picks), vectors.shape[1])).astype(np.float32)
+    faiss.normalize_L2(query_vecs)
+    query_texts = [" ".join(texts[i].split()[:6]) for i in picks]
+    return query_texts, query_vecs
+
+
+def write_store(path: Path, texts: list, chunks_per_doc: int = 50):
+    with ChunkStoreWriter(path, with_embeddings=False) as writer:
+        for start in range(0, len(texts), 65536):
+            writer.append([
+                {"doc_id": f"doc_{i // chunks_per_doc:06d}.pdf", "page": 0, "chunk_id": i % chunks_per_doc, "text": texts[i]}
+                for i in range(start, min(start + 65536, len(texts)))
+            ])
+        writer.commit()
+
+
+def build_index(path: Path, vectors: np.ndarray, index_type: str) -> float:
+    start = time.perf_counter()
+    service = FaissIndexService(vectors.shape[1], index_type=index_type)
+    service.train(vectors)
+    service.add(vectors)
+    build_s = time.perf_counter() - start
+    service.save(path)
+    write_index_state(path, new_epoch(), service.index.ntotal)
+    return build_s
+
+
+def replay(retriever: Retrievar, texts: list, vecs: np.ndarray, mode: str, top_k: int, ce_top_n: int, clients: int):
+    use_mmr, use_ce, hybrid = MODES[mode]
+
+    def one(i):
+        start = time.perf_counter()
+        res = retriever.search(
+            texts[i], top_k=top_k, use_mmr=use_mmr, use_ce=use_ce, ce_top_n=ce_top_n,
+            hybrid=hybrid, query_vec=vecs[i]
+        )
+        return time.perf_counter() - start, res
+
+    for i in range(min(5, len(texts))):
+        one(i)  # warm-up
+
+    # Latency one query at a time, throughput with concurrent clients
+    timed = [one(i) for i in range(len(texts))]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(one, range(len(texts))))
+    wall = time.perf_counter() - start
+
+    latencies = np.array([t for t, _ in timed]) * 1000
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "qps": len(texts) / wall,
+    }, [res for _, res in timed]
+
+
+def recall_at_k(results: list, truth: np.ndarray, chunks_per_doc: int = 50) -> float:
+    hits = 0
+    for res, row in zip(results, truth):
+        found = {int(r["doc_id"][4:10]) * chunks_per_doc + r["chunk_id"] for r in res}
+        hits += len(found & set(row.tolist()))
+    return hits / truth.size
+
+
+def agreement_at_k(results: list, reference: list) -> float:
+    """Mean share of each reference top-k that results also returned."""
+    shares = []
+    for res, ref in zip(results, reference):
+        if ref:
+            found = {(r["doc_id"], r["chunk_id"]) for r in res}
+            shares.append(len(found & {(r["doc_id"], r["chunk_id"]) for r in ref}) / len(ref))
+    return float(np.mean(shares)) if shares else 1.0
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(previous: dict, current: dict):
+    old = {(r["size"], r["index_type"], r["mode"]): r for r in previous["runs"]}
+    print(f"\nvs {previous['meta'].get('git_commit')} ({previous['meta'].get('timestamp')}):")
+    for r in current["runs"]:
+        base = old.get((r["size"], r["index_type"], r["mode"]))
+        if base is None:
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "qps", f"recall@{current['meta']['top_k']}"):
+            if key in base and key in r and base[key]:
+                deltas.append(f"{key} {(r[key] - base[key]) / base[key] * 100:+.1f}%")
+        print(f"  {r['size']:>8d} {r['index_type']:8s} {r['mode']:14s} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, QPS, memory and recall of Retrievar.search on synthetic corpora")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--dup-fraction", type=float, default=0.2, help="share of near-duplicate chunks")
+    parser.add_argument("--index-types", choices=INDEX_TYPES, nargs="+", default=["flat", "hnsw"])
+    parser.add_argument("--modes", choices=list(MODES), nargs="+", default=["dense", "mmr", "hybrid"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--ce-top-n", type=int, default=30)
+    parser.add_argument("--ce-batch-size", type=int,
+                        help="cascade the reranker in mini-batches of this size (reports agreement with full reranking)")
+    parser.add_argument("--ce-skip-margin", type=float,
+                        help="skip the reranker when the dense top-k leads by this margin (reports agreement with full reranking)")
+    parser.add_argument("--ce-cache-size", type=int, default=0,
+                        help="cross-encoder score cache entries (default off: replayed queries would all hit)")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--words", type=int, default=120, help="words per synthetic chunk")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="previous --out file to print relative changes against")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "faiss": faiss.__version__,
+            "cpus": os.cpu_count(),
+            "top_k": args.top_k,
+            "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        },
+        "runs": [],
+    }
+
+    for size in args.sizes:
+        workdir = Path(tempfile.mkdtemp(prefix="bench_retrieval_"))
+        try:
+            vectors, texts = synthetic_corpus(size, args.dim, args.dup_fraction, args.vocab, args.words, args.seed)
+            query_texts, query_vecs = make_queries(vectors, texts, args.queries, args.seed)
+
+            store_path = workdir / "chunk_store"
+            start = time.perf_counter()
+            write_store(store_path, texts)
+            store_s = time.perf_counter() - start
+            start = time.perf_counter()
+            update_lexical_index(store_path)
+            lexical_s = time.perf_counter() - start
+
+            # Ground truth: exact inner-product search over the same vectors
+            exact = faiss.IndexFlatIP(args.dim)
+            exact.add(vectors)
+            _, truth = exact.search(query_vecs, args.top_k)
+            del exact
+            print(f"\n{size} chunks ({args.dup_fraction:.0%} near-duplicates), dim {args.dim}: "
+                  f"store {store_s:.1f}s, lexical index {lexical_s:.1f}s")
+
+            for index_type in args.index_types:
+                index_path = workdir / f"{index_type}.faiss"
+                build_s = build_index(index_path, vectors, index_type)
+                retriever = Retrievar(
+                    index_path, store_path, None,
+                    ce_cache_size=args.ce_cache_size,
+                    ce_skip_margin=args.ce_skip_margin,
+                    ce_batch_size=args.ce_batch_size
+                )
+                # The cascade and the skip margin are heuristics: their
+                # reranker modes are checked against scoring every pair
+                reference = None
+                if args.ce_batch_size or args.ce_skip_margin is not None:
+                    reference = Retrievar(index_path, store_path, None, ce_cache_size=0)
+
+                for mode in args.modes:
+                    reset_peak_rss()
+                    pairs = {o: RERANK_PAIRS.value(outcome=o) for o in ("scored", "cached", "skipped")}
+                    try:
+                        metrics, found = replay(
+                            retriever, query_texts, query_vecs, mode, args.top_k, args.ce_top_n, args.clients
+                        )
+                    except ImportError as e:
+                        print(f"  {index_type:8s} {mode:14s} skipped: {e}")
+                        continue
+                    run = {
+                        "size": size,
+                        "index_type": index_type,
+                        "mode": mode,
+                        "index_build_s": build_s,
+                        "store_build_s": store_s,
+                        "lexical_build_s": lexical_s,
+                        **metrics,
+                        # Against exact top_k; MMR, CE and fusion trade some of it for diversity/precision
+                        f"recall@{args.top_k}": recall_at_k(found, truth),
+                        **memory_mb(),
+                        # Reranker pairs over the whole replay (warm-up, sequential and concurrent passes)
+                        **{f"ce_pairs_{o}": int(RERANK_PAIRS.value(outcome=o) - n) for o, n in pairs.items()},
+                    }
+                    use_mmr, use_ce, hybrid = MODES[mode]
+                    if reference is not None and use_ce:
+                        full = [
+                            reference.search(
+                                text, top_k=args.top_k, use_mmr=use_mmr, use_ce=True, ce_top_n=args.ce_top_n,
+                                hybrid=hybrid, query_vec=vec
+                            )
+                            for text, vec in zip(query_texts, query_vecs)
+                        ]
+                        run[f"ce_agreement@{args.top_k}"] = agreement_at_k(found[:len(full)], full)
+                    results["runs"].append(run)
+                    print(f"  {index_type:8s} {mode:14s} build={build_s:6.2f}s  "
+                          f"p50={run['p50_ms']:7.2f}ms  p95={run['p95_ms']:7.2f}ms  p99={run['p99_ms']:7.2f}ms  "
+                          f"qps={run['qps']:7.1f}  recall@{args.top_k}={run[f'recall@{args.top_k}']:.3f}  "
+                          f"peak_rss={run.get('peak_rss_mb', 0):.0f}MB"
+                          + (f"  ce_agreement={run[f'ce_agreement@{args.top_k}']:.3f}"
+                             if f"ce_agreement@{args.top_k}" in run else ""))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.out}")
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from backend.app.services.chunk_store import ChunkStore, ChunkStoreWriter
+from backend.app.services.index import FaissIndexService, INDEX_TYPES, new_epoch
+from backend.app.services.lexical_index import update_lexical_index
+from backend.app.services.manifest import write_index_state
+from backend.app.services.retrieval import Retrievar
+from backend.app.services.sharding import ShardedRetrievar
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+INDEX_PATH = PROJECT_ROOT / "data" / "faiss" / "index.faiss"
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
+
+
+def synthetic_corpus(root: Path, n: int, dim: int, index_type: str, chunks_per_doc: int, seed: int, vocab: int = 20000):
+    """
+    Random unit vectors in documents of chunks_per_doc chunks; vectors live
+    only in FAISS. Chunk texts are 60 words drawn from a per-document topic,
+    so BM25 document frequencies vary between shards.
+    """
+    rng = np.random.default_rng(seed)
+    index_path, store_path = root / "index.faiss", root / "chunk_store"
+    service = FaissIndexService(dim, index_type=index_type)
+    topics = rng.integers(0, vocab, size=(n // chunks_per_doc + 1, 32))
+    with ChunkStoreWriter(store_path, dim=dim, with_embeddings=False) as writer:
+        for start in range(0, n, 65536):
+            count = min(65536, n - start)
+            vectors = rng.standard_normal((count, dim)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            if start == 0:
+                service.train(vectors)
+            service.add(vectors)
+            writer.append([
+                {
+                    "doc_id": f"doc_{i // chunks_per_doc:06d}.pdf",
+                    "page": 0,
+                    "chunk_id": i % chunks_per_doc,
+                    "text": " ".join(f"w{w}" for w in rng.choice(topics[i // chunks_per_doc], size=60)),
+                }
+                for i in range(start, start + count)
+            ])
+        writer.commit()
+    update_lexical_index(store_path)
+    service.save(index_path)
+    write_index_state(index_path, new_epoch(), service.index.ntotal)
+    return index_path, store_path
+
+
+def hybrid_hits(retriever: Retrievar, query_texts: list, query_vecs: np.ndarray, top_k: int) -> list:
+    # Dense + BM25 fused by reciprocal rank, still without MMR / reranker
+    return [
+        [(r["doc_id"], r["chunk_id"]) for r in retriever.search(
+            text, top_k=top_k, use_mmr=False, use_ce=False, hybrid=True, query_vec=v
+        )]
+        for text, v in zip(query_texts, query_vecs)
+    ]
+
+
+def agreement(reference: list, hits: list) -> float:
+    return float(np.mean([len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(reference, hits)]))
+
+
+def run(retriever: Retrievar, query_vecs: np.ndarray, top_k: int, clients: int) -> dict:
+    # FAISS stage only: vectors are given, MMR / reranker / BM25 are off
+    def one(v):
+        start = time.perf_counter()
+        res = retriever.search("", top_k=top_k, use_mmr=False, use_ce=False, hybrid=False, query_vec=v)
+        return time.perf_counter() - start, [(r["doc_id"], r["chunk_id"]) for r in res]
+
+    for v in query_vecs[:5]:
+        one(v)  # warm-up
+
+    latencies = [one(v)[0] for v in query_vecs]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        results = list(pool.map(one, query_vecs))
+    wall = time.perf_counter() - start
+    return {
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        f"qps_{clients}_clients": len(query_vecs) / wall,
+        "hits": [hits for _, hits in results],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search latency and throughput vs number of retrieval shards")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="benchmark a random corpus of this many chunks instead of data/")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--threads-per-shard", type=int, default=1)
+    parser.add_argument("--out", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_sharding_"))
+    try:
+        if args.synthetic:
+            index_path, store_path = synthetic_corpus(workdir, args.synthetic, args.dim, args.index_type, 50, seed=0)
+        else:
+            index_path, store_path = INDEX_PATH, STORE_PATH
+        n_chunks = len(ChunkStore(store_path))
+        print(f"{n_chunks} chunks, {os.cpu_count()} CPUs, {args.queries} queries, top_k={args.top_k}")
+
+        base = Retrievar(index_path, store_path, None, hybrid=False)
+        rng = np.random.default_rng(1)
+        query_vecs = rng.standard_normal((args.queries, base.idx.d)).astype(np.float32)
+        query_vecs /= np.linalg.norm(query_vecs, axis=1, keepdims=True)
+        # A few words of random chunks, for the BM25 side of hybrid search
+        query_texts = [
+            " ".join(base.store.text(int(i)).split()[:4])
+            for i in rng.integers(0, n_chunks, size=args.queries)
+        ]
+
+        results = {"chunks": n_chunks, "cpus": os.cpu_count()}
+        reference = run(base, query_vecs, args.top_k, args.clients)
+        reference_hybrid = hybrid_hits(base, query_texts, query_vecs, args.top_k) if base.lexical is not None else None
+        results["in_process"] = {k: v for k, v in reference.items() if k != "hits"}
+        print(f"{'in-process':12s} " + "  ".join(f"{k}={v:.2f}" for k, v in results["in_process"].items()))
+
+        for n in args.shards:
+            retriever = ShardedRetrievar(
+                index_path, store_path, None,
+                shard_dir=workdir / f"shards_{n}",
+                n_shards=n,
+                threads_per_shard=args.threads_per_shard,
+                hybrid=False
+            )
+            try:
+                r = run(retriever, query_vecs, args.top_k, args.clients)
+                # Exact for flat indexes; ANN shards may differ slightly from one big index
+                r["agreement"] = agreement(reference["hits"], r.pop("hits"))
+                # BM25 is scored with corpus-wide statistics, so exact for flat indexes too
+                if reference_hybrid is not None:
+                    r["hybrid_agreement"] = agreement(
+                        reference_hybrid, hybrid_hits(retriever, query_texts, query_vecs, args.top_k)
+                    )
+            finally:
+                retriever.close()
+            results[f"shards_{n}"] = r
+            print(f"{f'{n} shard(s)':12s} " + "  ".join(f"{k}={v:.2f}" for k, v in r.items()))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
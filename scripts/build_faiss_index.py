@@ -1,24 +1,47 @@
+import argparse
 import numpy as np
 from pathlib import Path
 
 PROJECT_ROOT=Path(__file__).resolve().parents[1]
 
-from backend.app.services.index import FaissIndexService
+from backend.app.config import settings
+from backend.app.services.index import FaissIndexService, INDEX_TYPES, new_epoch
+from backend.app.services.manifest import write_index_state
 
 VECTORS_PATH = PROJECT_ROOT / "data" / "embeddings" / "vectors.npy"
 FAISS_DIR = PROJECT_ROOT / "data" / "faiss"
 INDEX_PATH = FAISS_DIR / "index.faiss"
 
 def main():
+    parser=argparse.ArgumentParser(description="Build the FAISS index from vectors.npy")
+    parser.add_argument("--index-type",choices=INDEX_TYPES,default=settings.INDEX_TYPE)
+    parser.add_argument("--nlist",type=int,default=settings.IVF_NLIST)
+    parser.add_argument("--pq-m",type=int,default=settings.PQ_M)
+    parser.add_argument("--hnsw-m",type=int,default=settings.HNSW_M)
+    parser.add_argument("--nprobe",type=int,default=settings.NPROBE)
+    parser.add_argument("--ef-search",type=int,default=settings.EF_SEARCH)
+    args=parser.parse_args()
+
     FAISS_DIR.mkdir(parents=True, exist_ok=True)
-    vectors=np.load(VECTORS_PATH)
+    vectors=np.load(VECTORS_PATH).astype("float32")
     print("Vectors Loaded ",vectors.shape)
 
     dim=vectors.shape[1]
-    index=FaissIndexService(dim=dim)
+    index=FaissIndexService(
+        dim=dim,
+        index_type=args.index_type,
+        nlist=args.nlist,
+        pq_m=args.pq_m,
+        hnsw_m=args.hnsw_m,
+        nprobe=args.nprobe,
+        ef_search=args.ef_search,
+    )
+    index.train(vectors)
     index.add(vectors)
     index.save(INDEX_PATH)
-    print("Index built and saved")
+    # A rebuilt index starts a new epoch, so running servers reload it in full
+    write_index_state(INDEX_PATH, new_epoch(), index.index.ntotal)
+    print(f"Index ({args.index_type}) built and saved")
 
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,35 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import shutil
+import time
+from pathlib import Path
+
+from backend.app.services.lexical_index import LEXICAL_DIR, LexicalIndex, update_lexical_index
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
+
+# /index-new keeps the lexical index up to date; this builds it for a store
+# that predates it (or was converted from metadata.jsonl) without waiting
+# for the next indexing job.
+
+def main():
+    parser=argparse.ArgumentParser(description="Build or catch up the BM25 lexical index of a chunk store")
+    parser.add_argument("--store",type=Path,default=STORE_PATH)
+    parser.add_argument("--rebuild",action="store_true",help="drop the existing lexical index first")
+    args=parser.parse_args()
+
+    if args.rebuild and (args.store / LEXICAL_DIR).exists():
+        shutil.rmtree(args.store / LEXICAL_DIR)
+
+    start=time.perf_counter()
+    added=update_lexical_index(args.store)
+    lexical=LexicalIndex.for_store(args.store)
+    print(f"Indexed {added} chunks in {time.perf_counter() - start:.1f}s "
+          f"({len(lexical)} total, {len(lexical.segments)} segment(s))")
+
+if __name__=="__main__":
+    main()
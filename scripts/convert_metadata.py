@@ -0,0 +1,33 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+from pathlib import Path
+from backend.app.services.chunk_store import convert_jsonl
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+METADATA_PATH = PROJECT_ROOT / "data" / "embeddings" / "metadata.jsonl"
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
+
+def main():
+    parser=argparse.ArgumentParser(description="Convert metadata.jsonl into a memory-mapped chunk store")
+    parser.add_argument("--metadata",type=Path,default=METADATA_PATH)
+    parser.add_argument("--store",type=Path,default=STORE_PATH)
+    parser.add_argument("--vectors",type=Path,default=None,
+                        help="vectors.npy to use when records carry no 'embedding' field")
+    parser.add_argument("--no-embeddings",action="store_true",
+                        help="keep only text and ids; search reads vectors from the FAISS index")
+    args=parser.parse_args()
+
+    count=convert_jsonl(
+        args.metadata,
+        args.store,
+        vectors_path=args.vectors,
+        with_embeddings=not args.no_embeddings
+    )
+    print(f"Converted {count} records into {args.store}")
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import json
+import random
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Minimal stand-in for the Gemini REST API. Point the app at it with
+#   GEMINI_BASE_URL=http://127.0.0.1:8001 GEMINI_API_KEY=fake uvicorn backend.app.main:app
+
+app = FastAPI(title="Fake LLM")
+config = {"latency": 1.0, "jitter": 0.5, "error_rate": 0.0, "token_delay": 0.05}
+
+ANSWER = "This is a canned answer from the fake LLM server (fake.pdf, 1)."
+
+
+def _response(text: str) -> dict:
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": len(text.split())},
+    }
+
+
+@app.post("/{version}/models/{model_action}")
+async def generate(version: str, model_action: str):
+    await asyncio.sleep(config["latency"] + random.uniform(0, config["jitter"]))
+
+    if random.random() < config["error_rate"]:
+        return JSONResponse(
+            status_code=503,
+            content={"error": {"code": 503, "message": "overloaded", "status": "UNAVAILABLE"}},
+        )
+
+    if model_action.endswith(":streamGenerateContent"):
+        return StreamingResponse(_stream_tokens(), media_type="text/event-stream")
+    return _response(ANSWER)
+
+
+async def _stream_tokens():
+    # One SSE event per word, like Gemini's ?alt=sse streaming
+    for word in ANSWER.split(" "):
+        yield f"data: {json.dumps(_response(word + ' '))}\r\n\r\n"
+        await asyncio.sleep(config["token_delay"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Gemini server with artificial latency")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=1.0, help="base seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.5, help="extra random seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="seconds between streamed tokens")
+    args = parser.parse_args()
+
+    config.update(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        token_delay=args.token_delay,
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
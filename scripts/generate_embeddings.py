@@ -3,17 +3,21 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import json
+import shutil
 import numpy as np
 from pathlib import Path
 from tqdm import tqdm
+from backend.app.config import settings
 from backend.app.services.embeddings import EmbeddingsService
+from backend.app.services.chunk_store import ChunkStoreWriter
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
 CHUNKS_PATH = PROJECT_ROOT / "data" / "processed" / "chunks.jsonl"
 EMBEDDING_DIR = PROJECT_ROOT / "data" / "embeddings"
 VECTORS_PATH = EMBEDDING_DIR / "vectors.npy"
-METADATA_PATH = EMBEDDING_DIR / "metadata.jsonl"
+STORE_PATH = EMBEDDING_DIR / "chunk_store"
+CACHE_DIR = EMBEDDING_DIR / "embedding_cache"
 
 def main():
     print(os.getcwd())
@@ -28,20 +32,25 @@ def main():
             metadata.append({
                 "doc_id":record["doc_id"],
                 "page":record["page"],
+                "page_end":record.get("page_end",record["page"]),
                 "chunk_id":record["chunk_id"],
+                "text":record["text"],
             })
         print(f"Loaded {len(texts)} chunks")
 
-        embedder=EmbeddingsService()
+        embedder=EmbeddingsService(cache_dir=CACHE_DIR)
         embeddings=embedder.embed_text(texts)
+        print(embedder.cache_summary())
 
         print("Embedding shape: ",embeddings.shape)
         np.save(VECTORS_PATH,embeddings)
 
-        with METADATA_PATH.open("w",encoding="utf-8") as f:
-            for m in metadata:
-                f.write(json.dumps(m)+"\n")
-        print("Embeddings+Metadata saved")
+        if STORE_PATH.exists():
+            shutil.rmtree(STORE_PATH)
+        with ChunkStoreWriter(STORE_PATH,dim=embeddings.shape[1],with_embeddings=settings.STORE_EMBEDDINGS) as writer:
+            writer.append(metadata,embeddings)
+            writer.commit()
+        print("Embeddings+Chunk store saved")
 
 if __name__=="__main__":
     main()
\ No newline at end of file
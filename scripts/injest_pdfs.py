@@ -5,7 +5,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import json
 from pathlib import Path
 from backend.app.services.ingestion import extract_from_pdf
-from backend.app.utils.chunking import chunk_txt
+from backend.app.config import settings
+from backend.app.utils.chunking import chunk_pages
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
@@ -26,18 +27,23 @@ def main():
     with OUT_PATH.open("w", encoding="utf-8") as f:
         for pdf_path in RAW_PDF_DIR.glob("*.pdf"):
             pages = extract_from_pdf(pdf_path)
+            chunks = chunk_pages(
+                pages,
+                chunksize=settings.CHUNK_SIZE,
+                overlap=settings.CHUNK_OVERLAP,
+                across_pages=settings.CHUNK_ACROSS_PAGES,
+                sentence_aware=settings.CHUNK_SENTENCE_AWARE,
+            )
 
-            for page in pages:
-                chunks = chunk_txt(page["text"])
-
-                for idx, chunk in enumerate(chunks):
-                    record = {
-                        "doc_id": pdf_path.name,
-                        "page": page["page"],
-                        "chunk_id": idx,
-                        "text": chunk
-                    }
-                    f.write(json.dumps(record) + "\n")
+            for idx, chunk in enumerate(chunks):
+                record = {
+                    "doc_id": pdf_path.name,
+                    "page": chunk["page"],
+                    "page_end": chunk["page_end"],
+                    "chunk_id": idx,
+                    "text": chunk["text"]
+                }
+                f.write(json.dumps(record) + "\n")
 
     print("Ingestion Complete")
 
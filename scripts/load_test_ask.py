@@ -0,0 +1,76 @@
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Fires concurrent /ask requests while probing /health, to check that slow
+# LLM calls no longer starve the rest of the API. Run the app against
+# scripts/fake_llm_server.py to control LLM latency.
+
+
+def post(url: str, body: dict):
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /ask load test with /health probing")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--question", default="What is transformer architecture?")
+    args = parser.parse_args()
+
+    health_latencies = []
+    done = threading.Event()
+
+    def probe_health():
+        while not done.is_set():
+            start = time.perf_counter()
+            urllib.request.urlopen(args.url + "/health", timeout=60).read()
+            health_latencies.append(time.perf_counter() - start)
+            time.sleep(0.1)
+
+    prober = threading.Thread(target=probe_health, daemon=True)
+    prober.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(
+            lambda _: post(args.url + "/ask", {"question": args.question, "top_k": 5}),
+            range(args.requests),
+        ))
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+
+    statuses = Counter(status for status, _ in results)
+    ok = [latency for status, latency in results if status == 200]
+    print(f"{args.requests} requests from {args.clients} clients in {elapsed:.1f}s")
+    print("Status codes:", dict(statuses))
+    print(f"/ask   p50={percentile(ok, 0.5) * 1000:.0f}ms p99={percentile(ok, 0.99) * 1000:.0f}ms")
+    print(f"/health p50={percentile(health_latencies, 0.5) * 1000:.0f}ms "
+          f"p99={percentile(health_latencies, 0.99) * 1000:.0f}ms max={max(health_latencies, default=0) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
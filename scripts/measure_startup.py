@@ -0,0 +1,95 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import subprocess
+import textwrap
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Each stage runs in a fresh interpreter so import caches and model copies
+# from one measurement cannot leak into the next
+PROBE = textwrap.dedent("""
+    import json, os, sys, time
+    sys.path.insert(0, {root!r})
+
+    def rss_mb():
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    out = {{"stage": {stage!r}}}
+    start = time.perf_counter()
+    from backend.app.main import app
+    out["import_s"] = time.perf_counter() - start
+    out["rss_after_import_mb"] = rss_mb()
+
+    if {stage!r} in ("warm_up", "shared"):
+        from backend.app.services.models import warm_up
+        t = time.perf_counter()
+        warm_up()
+        out["warm_up_s"] = time.perf_counter() - t
+        out["rss_after_warm_up_mb"] = rss_mb()
+
+    if {stage!r} == "shared":
+        # Retrieval and indexing must reuse the same weights, not load a second copy
+        from backend.app.api.ask import retriever
+        from backend.app.services.embeddings import EmbeddingsService
+        from backend.app.services.models import loaded_models
+        t = time.perf_counter()
+        retriever.encode(["what is attention?"])
+        EmbeddingsService().embed_text(["some chunk of text"], show_progress=False)
+        out["first_use_s"] = time.perf_counter() - t
+        out["rss_after_use_mb"] = rss_mb()
+        out["models_loaded"] = loaded_models()
+
+    print("RESULT " + json.dumps(out))
+""")
+
+
+def measure(stage: str) -> dict:
+    code = PROBE.format(root=str(PROJECT_ROOT), stage=stage)
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT, capture_output=True, text=True,
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{stage} probe failed:\n{proc.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="App import time and RSS, before and after loading models")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is reported")
+    parser.add_argument("--out", type=Path, help="write results as JSON (e.g. to compare two checkouts)")
+    args = parser.parse_args()
+
+    results = {}
+    for stage in ("import", "warm_up", "shared"):
+        runs = [measure(stage) for _ in range(args.repeat)]
+        results[stage] = min(runs, key=lambda r: r["import_s"])
+
+    for stage, r in results.items():
+        line = f"{stage:8s} import {r['import_s']:.2f}s rss {r['rss_after_import_mb']:.0f}MB"
+        if "warm_up_s" in r:
+            line += f" | warm-up {r['warm_up_s']:.2f}s rss {r['rss_after_warm_up_mb']:.0f}MB"
+        if "first_use_s" in r:
+            line += f" | first use {r['first_use_s']:.2f}s rss {r['rss_after_use_mb']:.0f}MB models {r['models_loaded']}"
+        print(line)
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
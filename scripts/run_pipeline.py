@@ -0,0 +1,52 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import shutil
+from pathlib import Path
+
+from backend.app.config import settings
+from backend.app.services.index import INDEX_TYPES
+from backend.app.services.incremental_indexing import index_new_pdfs
+from backend.app.services.manifest import drop_index
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+RAW_PDF_DIR = PROJECT_ROOT / "data" / "raw_pdfs"
+INDEX_PATH = PROJECT_ROOT / "data" / "faiss" / "index.faiss"
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
+INDEXED_FILES_PATH = PROJECT_ROOT / "data" / "indexed_files.json"
+
+# Single-pass replacement for injest_pdfs.py -> generate_embeddings.py ->
+# build_faiss_index.py: parse, chunk, embed and index in bounded batches.
+
+def main():
+    parser=argparse.ArgumentParser(description="Parse, chunk, embed and index PDFs in one streaming pass")
+    parser.add_argument("--rebuild",action="store_true",help="drop the existing index and chunk store first")
+    parser.add_argument("--index-type",choices=INDEX_TYPES,default=settings.INDEX_TYPE)
+    parser.add_argument("--workers",type=int,default=settings.INGEST_WORKERS)
+    parser.add_argument("--batch-size",type=int,default=settings.INGEST_BATCH_SIZE)
+    args=parser.parse_args()
+
+    settings.INDEX_TYPE=args.index_type
+    settings.INGEST_WORKERS=args.workers
+    settings.INGEST_BATCH_SIZE=args.batch_size
+
+    if args.rebuild:
+        drop_index(INDEX_PATH)
+        INDEXED_FILES_PATH.unlink(missing_ok=True)
+        if STORE_PATH.exists():
+            shutil.rmtree(STORE_PATH)
+
+    msg=index_new_pdfs(
+        raw_pdf_dir=RAW_PDF_DIR,
+        index_path=INDEX_PATH,
+        store_path=STORE_PATH,
+        indexed_files_path=INDEXED_FILES_PATH,
+        max_segments=settings.INDEX_MAX_SEGMENTS,
+    )
+    print(msg)
+
+if __name__=="__main__":
+    main()
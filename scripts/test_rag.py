@@ -6,12 +6,12 @@ from backend.app.services.retrieval import Retrievar
 from backend.app.services.rag import RAGService
 
 INDEX_PATH = PROJECT_ROOT / "data" / "faiss" / "index.faiss"
-METADATA_PATH = PROJECT_ROOT / "data" / "embeddings" / "metadata.jsonl"
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
 PROMPT_PATH = PROJECT_ROOT / "backend" / "app" / "prompts" / "rag_prompt.txt"
 CHUNKS_PATH = PROJECT_ROOT / "data" / "processed" / "chunks.jsonl"
 
 def main():
-    retriever=Retrievar(INDEX_PATH, METADATA_PATH,CHUNKS_PATH)
+    retriever=Retrievar(INDEX_PATH, STORE_PATH,CHUNKS_PATH)
     rag=RAGService(retriever, PROMPT_PATH)
 
     question = "What is transformer architecture?"
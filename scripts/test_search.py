@@ -5,11 +5,11 @@ PROJECT_ROOT=Path(__file__).resolve().parents[1]
 from backend.app.services.retrieval import Retrievar
 
 INDEX_PATH=PROJECT_ROOT/"data"/"faiss"/"index.faiss"
-METADATA_PATH = PROJECT_ROOT / "data" / "embeddings" / "metadata.jsonl"
+STORE_PATH = PROJECT_ROOT / "data" / "embeddings" / "chunk_store"
 CHUNKS_PATH = PROJECT_ROOT / "data" / "processed" / "chunks.jsonl"
 
 def main():
-    retriever=Retrievar(INDEX_PATH,METADATA_PATH,CHUNKS_PATH)
+    retriever=Retrievar(INDEX_PATH,STORE_PATH,CHUNKS_PATH)
     query="What is Embeddings?"
     res=retriever.search(query)
     for r in res: